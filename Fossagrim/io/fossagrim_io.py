@@ -1,20 +1,19 @@
-import matplotlib.pyplot as plt
 import openpyxl
 import pandas as pd
 import numpy as np
 import os
+import csv
+import zipfile
 import unittest
+from xml.etree import ElementTree
+from collections import OrderedDict
 
 from Fossagrim.utils.definitions import heureka_mandatory_standdata_keys, \
     heureka_standdata_keys, heureka_standdata_desc, \
     heureka_treatment_keys, heureka_treatment_desc, \
     fossagrim_standdata_keys, m3fub_to_m3sk, \
     translate_keys_from_fossagrim_to_heureka
-from Fossagrim.utils.monetization_parameters import \
-    parameters, variables_used_in_monetization, calculation_part1, resampled_section, \
-    money_value, cbo_flow, project_benefits, buffer, fossagrim_values, forest_owner_values
-
-import Fossagrim.plotting.misc_plots as fpp
+from Fossagrim.utils.monetization_parameters import parameters, variables_used_in_monetization, monetization_constants
 
 
 def example_gis_database():
@@ -64,7 +63,7 @@ def my_str_to_float(x):
     return a
 
 
-def get_row_index(table, key, item):
+def get_row_index(table, key, item, exact_match=False):
     """
     Returns the row index of the item
     :param table:
@@ -75,28 +74,294 @@ def get_row_index(table, key, item):
     :param item:
         str
         The name we are looking for
+    :param exact_match:
+        bool
+        If True, the row must be named exactly 'item', otherwise the first row that contains 'item' is returned
 
     :return:
     """
     for i, var in enumerate(table[key]):
-        if item in var:
+        if not isinstance(var, str):
+            continue
+        if (exact_match and item == var) or (not exact_match and item in var):
             return i
 
     return None
 
 
-def read_excel(filename, header, sheet_name):
+# Process wide cache of parsed Excel sheets, used by read_excel()
+# Each item is keyed on (absolute path, mtime, size, sheet name, header), so a modified workbook is
+# automatically parsed again. The least recently used tables are dropped when the total size exceeds
+# the byte budget
+_excel_cache = OrderedDict()
+_excel_cache_sizes = {}
+_excel_cache_max_bytes = 512 * 1024 ** 2
+
+
+def _excel_cache_key(filename, header, sheet_name):
+    filename = os.path.abspath(str(filename))
+    stat = os.stat(filename)
+    return filename, stat.st_mtime_ns, stat.st_size, sheet_name, header
+
+
+def _table_bytes(table):
     try:
-        table = pd.read_excel(filename, header=header, sheet_name=sheet_name, engine='openpyxl')
-    except PermissionError as err_msg:
-        print(err_msg)
-        return None
+        return int(table.memory_usage(index=True, deep=True).sum())
+    except (AttributeError, TypeError, ValueError):
+        return 0
+
+
+def _excel_cache_store(key, table):
+    nbytes = _table_bytes(table)
+    if nbytes > _excel_cache_max_bytes:
+        return
+    _excel_cache[key] = table
+    _excel_cache_sizes[key] = nbytes
+    _excel_cache.move_to_end(key)
+    while sum(_excel_cache_sizes.values()) > _excel_cache_max_bytes:
+        old_key, _ = _excel_cache.popitem(last=False)
+        _ = _excel_cache_sizes.pop(old_key)
+
+
+def clear_excel_cache(filename=None):
+    """
+    Removes parsed tables from the cache used by read_excel()
+
+    :param filename:
+        str
+        If given, only the tables read from this file are removed. Otherwise the whole cache is emptied
+    """
+    if filename is None:
+        _excel_cache.clear()
+        _excel_cache_sizes.clear()
+        return
+    filename = os.path.abspath(str(filename))
+    for key in [_key for _key in _excel_cache if _key[0] == filename]:
+        _ = _excel_cache.pop(key)
+        _ = _excel_cache_sizes.pop(key)
+
+
+def set_excel_cache_size(max_bytes):
+    """
+    Sets the byte budget of the cache used by read_excel(). A budget of 0 disables the cache
+
+    :param max_bytes:
+        int
+        Maximum total (deep) memory usage of the cached tables
+    """
+    global _excel_cache_max_bytes
+    _excel_cache_max_bytes = int(max_bytes)
+    while len(_excel_cache) > 0 and sum(_excel_cache_sizes.values()) > _excel_cache_max_bytes:
+        old_key, _ = _excel_cache.popitem(last=False)
+        _ = _excel_cache_sizes.pop(old_key)
+
 
+def _strip_keys(table):
     # Clean keys from trailing spaces or returns
     old_keys = list(table.keys())
-    table = table.rename(columns={_key: _key.strip() for _key in old_keys})
+    return table.rename(columns={_key: _key.strip() for _key in old_keys})
+
+
+def _cached_parse(filename, headers, use_cache=True):
+    # Returns a dictionary with the DataFrame of each sheet name in headers, parsed with the header row given by
+    # headers[sheet name]. Sheets that are not in the cache are parsed in one pass over the workbook, or None is
+    # returned if the file could not be opened
+    keys = {}
+    tables = {}
+    if use_cache and _excel_cache_max_bytes > 0:
+        for _sheet, _header in headers.items():
+            try:
+                keys[_sheet] = _excel_cache_key(filename, _header, _sheet)
+            except (OSError, TypeError):
+                # e.g. file like objects, or missing files which pandas will complain about below
+                break
+            if keys[_sheet] in _excel_cache:
+                _excel_cache.move_to_end(keys[_sheet])
+                tables[_sheet] = _excel_cache[keys[_sheet]].copy()
+
+    missing_sheets = [_sheet for _sheet in headers if _sheet not in tables]
+    if len(missing_sheets) > 0:
+        try:
+            with pd.ExcelFile(filename, engine='openpyxl') as workbook:
+                for _sheet in missing_sheets:
+                    tables[_sheet] = _strip_keys(workbook.parse(_sheet, header=headers[_sheet]))
+                    if _sheet in keys:
+                        _excel_cache_store(keys[_sheet], tables[_sheet].copy())
+        except PermissionError as err_msg:
+            print(err_msg)
+            return None
+
+    return {_sheet: tables[_sheet] for _sheet in headers}
+
+
+def read_excel(filename, header, sheet_name, use_cache=True):
+    """
+    Reads one sheet of an Excel file into a pandas DataFrame, and strips the column names from trailing
+    spaces and returns.
 
-    return table
+    Parsed sheets are kept in a process wide cache, so reading the same sheet of an unmodified file again
+    returns a copy of the cached table instead of parsing the workbook once more.
+    Use clear_excel_cache() to invalidate the cache explicitly.
+
+    :param filename:
+    :param header:
+    :param sheet_name:
+        str, int or list
+        When a list of sheet names is given, all sheets that are not already cached are parsed in one pass
+        over the workbook, and a dictionary with one DataFrame per sheet name is returned
+    :param use_cache:
+        bool
+        If False, the file is always parsed, and the result is not stored in the cache
+    :return:
+        panda DataFrame (or dict of DataFrames), or None if the file could not be opened
+    """
+    if sheet_name is None:
+        # pandas reads all sheets into a dictionary, which we don't cache
+        try:
+            parsed = pd.read_excel(filename, header=header, sheet_name=None, engine='openpyxl')
+        except PermissionError as err_msg:
+            print(err_msg)
+            return None
+        return {_sheet: _strip_keys(_table) for _sheet, _table in parsed.items()}
+
+    if isinstance(sheet_name, (list, tuple)):
+        return _cached_parse(filename, {_sheet: header for _sheet in sheet_name}, use_cache)
+    tables = _cached_parse(filename, {sheet_name: header}, use_cache)
+    if tables is None:
+        return None
+    return tables[sheet_name]
+
+
+def read_excel_sheets(filename, headers, use_cache=True):
+    """
+    Reads several sheets, with different header rows, of one Excel file, opening the workbook only once.
+    The tables are stored in the same cache as used by read_excel(), so later calls to read_excel() with the same
+    sheet name and header don't parse the file again. E.g.
+    > tables = read_excel_sheets(stand_file, {'data': 7, 'Forvaltning': 6})
+
+    :param filename:
+        str
+    :param headers:
+        dict
+        Header row (as used by read_excel()) of each sheet name to read
+    :param use_cache:
+        bool
+        If False, the file is always parsed, and the result is not stored in the cache
+    :return:
+        dict
+        DataFrame of each sheet name, or None if the file could not be opened
+    """
+    return _cached_parse(filename, dict(headers), use_cache)
+
+
+# Sheet names of workbooks, with the (modification time, size) of the file they were read from
+_sheet_names_cache = {}
+
+
+def workbook_sheet_names(filename):
+    """
+    Returns the names of the sheets in an Excel workbook. For xlsx files only xl/workbook.xml is read from the zip
+    archive, so it doesn't parse any sheet. The names are cached until the file is modified
+
+    :param filename:
+        str
+    :return:
+        list
+    """
+    filename = os.path.abspath(str(filename))
+    stat = os.stat(filename)
+    cached = _sheet_names_cache.get(filename, None)
+    if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return list(cached[1])
+
+    try:
+        with zipfile.ZipFile(filename) as archive:
+            root = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        # match on the local tag name, to support both the transitional and the strict name space
+        names = [_x.get('name') for _x in root.iter() if _x.tag.rsplit('}', 1)[-1] == 'sheet']
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError):
+        wb = openpyxl.load_workbook(filename, read_only=True)
+        names = list(wb.sheetnames)
+        wb.close()
+
+    _sheet_names_cache[filename] = ((stat.st_mtime_ns, stat.st_size), names)
+    return list(names)
+
+
+def normalize_stand_id(stand_id):
+    """
+    Returns the stand id in the form used to look up sheets in HeurekaSheetIndex, i.e. without the 'Avg Stand-'
+    prefix, with single spaces, and case folded
+    """
+    stand_id = ' '.join(str(stand_id).split())
+    if stand_id.startswith('Avg Stand-'):
+        stand_id = stand_id[len('Avg Stand-'):]
+    return stand_id.casefold()
+
+
+class HeurekaSheetIndex:
+    """
+    Index of the sheets in a Heureka results file, built from the sheet names only, see workbook_sheet_names().
+    Sheets named '<stand id> PRES' and '<stand id> BAU' (including the combined sheets, e.g.
+    '<project> Combined Stands Spruce-and-Pine BAU') are indexed by the normalized stand id, so that looking up a
+    stand that has no results is cheap, and doesn't depend on the 'Avg Stand-' prefix. E.g.
+    > index = HeurekaSheetIndex(result_file)
+    > index.find('Avg Stand-FHF24-0047-1', 'PRES')
+    'FHF24-0047-1 PRES'
+
+    :param filename:
+        str
+        Name of Heureka results file
+    """
+    cases = ['PRES', 'BAU']
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.sheet_names = workbook_sheet_names(filename)
+        self._sheets = set(self.sheet_names)
+        # normalized stand id -> {'stand_id': stand id as used in the first sheet name, <case>: sheet name}
+        self._stands = OrderedDict()
+        for sheet_name in self.sheet_names:
+            parts = sheet_name.rsplit(' ', 1)
+            if len(parts) < 2 or parts[1].upper() not in self.cases:
+                continue
+            entry = self._stands.setdefault(normalize_stand_id(parts[0]), {'stand_id': parts[0].strip()})
+            entry.setdefault(parts[1].upper(), sheet_name)
+
+    def __contains__(self, sheet_name):
+        return sheet_name in self._sheets
+
+    def find(self, stand_id, case):
+        """
+        Returns the name of the sheet with the results of the given stand and case ('PRES' or 'BAU'), or None
+        """
+        return self._stands.get(normalize_stand_id(stand_id), {}).get(case.upper(), None)
+
+    def find_pair(self, stand_id):
+        """
+        Returns the names of the PRES and BAU sheets of the given stand, or None if any of them are missing
+        """
+        entry = self._stands.get(normalize_stand_id(stand_id), {})
+        if all(_case in entry for _case in self.cases):
+            return tuple(entry[_case] for _case in self.cases)
+        return None
+
+    def stand_ids(self, combined=None):
+        """
+        Returns the stand ids that have both PRES and BAU sheets, in the order of the sheets
+
+        :param combined:
+            bool
+            If True, only the combined sheets are returned, if False, the combined sheets are left out
+        """
+        result = []
+        for entry in self._stands.values():
+            if not all(_case in entry for _case in self.cases):
+                continue
+            if combined is not None and combined != (' Combined' in ' {}'.format(entry['stand_id'])):
+                continue
+            result.append(entry['stand_id'])
+        return result
 
 
 def write_csv_file(write_to_file, default_keys, default_desc, append=False, **kwargs):
@@ -125,59 +390,256 @@ def write_csv_file(write_to_file, default_keys, default_desc, append=False, **kw
         The value of each key is used when writing the 'write_to_file' file
     :return:
     """
-    if len(default_keys) != len(default_desc):
-        raise IOError('The lists of keys and descriptions must be of same length')
+    if append and len(kwargs) == 0:
+        return
 
-    # overwrite any existing file, and create the header.
-    if not append:
-        with open(write_to_file, 'w') as f:
-            f.write(';'.join(default_desc) + '\n')
-            f.write(';'.join(default_keys) + '\n')
+    with HeurekaCsvWriter(write_to_file, default_keys, default_desc, append=append) as writer:
+        # only write data if given
+        if len(kwargs) > 0:
+            writer.write_row(**kwargs)
 
-    # arrange the data from kwargs
-    data = [''] * len(default_keys)
-    for key in kwargs:
-        if key not in default_keys:
-            print('WARNING: key "{}" not found in accepted default keys'.format(key))
-            continue
-        this_data = kwargs[key]
-        if isinstance(this_data, float):
-            this_string = '{:.2f}'.format(this_data)
+
+def _csv_string(value):
+    if isinstance(value, float):
+        return '{:.2f}'.format(value)
+    else:
+        return str(value)
+
+
+class HeurekaCsvWriter:
+    """
+    Writes semicolon separated data files whose first line contains a description, and second line the key names,
+    and then one line of data per stand (or treatment), e.g. the StandData.csv files used by Heureka.
+
+    The file is opened once, and the data lines are buffered and written in bulk, so it is much faster than
+    calling write_csv_file() once per stand. Use it as a context manager, e.g.
+    > with HeurekaCsvWriter(write_to_file, heureka_standdata_keys, heureka_standdata_desc) as writer:
+    >     writer.write_row(StandId='FHF24-0047-1', ProdArea=1.2)
+    >     writer.write_table(table)
+
+    :param write_to_file:
+        Name of csv file to write data to
+    :param default_keys:
+        list
+        List of key names that the csv file must include, eg. heureka_standdata_keys
+    :param default_desc:
+        list
+        List of descriptions that the csv file can include, eg. heureka_standdata_desc
+    :param append:
+        bool
+        if True, the data are appended to an existing output file without creating a header
+    :param buffer_size:
+        int
+        Number of data lines that are buffered before they are written to file
+    """
+    def __init__(self, write_to_file, default_keys, default_desc, append=False, buffer_size=1000):
+        if len(default_keys) != len(default_desc):
+            raise IOError('The lists of keys and descriptions must be of same length')
+
+        self.write_to_file = write_to_file
+        self.default_keys = default_keys
+        self.buffer_size = buffer_size
+        # column of each key, using the first occurrence like list.index() does
+        self.key_columns = {}
+        for i, key in enumerate(default_keys):
+            self.key_columns.setdefault(key, i)
+        self._buffer = []
+
+        if append:
+            self._file = open(write_to_file, 'a')
         else:
-            this_string = str(this_data)
-        data[default_keys.index(key)] = this_string
+            # overwrite any existing file, and create the header.
+            self._file = open(write_to_file, 'w')
+            self._file.write(';'.join(default_desc) + '\n')
+            self._file.write(';'.join(default_keys) + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _known_keys(self, keys):
+        known_keys = []
+        for key in keys:
+            if key not in self.key_columns:
+                print('WARNING: key "{}" not found in accepted default keys'.format(key))
+                continue
+            known_keys.append(key)
+        return known_keys
+
+    def write_row(self, **kwargs):
+        """
+        Adds one line of data, where each keyword must be one of the default keys.
+        Floats are written with two decimals
+
+        :param kwargs:
+            keyword arguments, e.g. StandId='FHF24-0047-1', ProdArea=1.2
+        """
+        data = [''] * len(self.default_keys)
+        for key in self._known_keys(list(kwargs.keys())):
+            data[self.key_columns[key]] = _csv_string(kwargs[key])
+        self.write_line(';'.join(data) + '\n')
+
+    def write_table(self, table):
+        """
+        Adds one line of data for each row in the table, where each column name must be one of the default keys.
+        Floats are written with two decimals
+
+        :param table:
+            pandas DataFrame
+        """
+        n_rows = len(table)
+        data = np.full((n_rows, len(self.default_keys)), '', dtype=object)
+        for key in self._known_keys(list(table.keys())):
+            column = table[key]
+            if column.dtype.kind == 'f':
+                strings = ['{:.2f}'.format(_x) for _x in column.to_numpy()]
+            else:
+                strings = [_csv_string(_x) for _x in column.to_numpy(dtype=object)]
+            data[:, self.key_columns[key]] = strings
+        self.write_lines([';'.join(_row) + '\n' for _row in data])
+
+    def write_line(self, line):
+        """
+        Adds one line, which is already formatted as a semicolon separated string, ending with a line break
+        """
+        self._buffer.append(line)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_lines(self, lines):
+        self._buffer.extend(lines)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if len(self._buffer) > 0:
+            self._file.write(''.join(self._buffer))
+            self._buffer = []
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+
+def _read_csv_header(_in):
+    """
+    Reads the two header lines (descriptors and column names) of a StandData.csv / Treatment.csv file
+    from an open file handle, without their line endings
+    """
+    descriptors = _in.readline().rstrip('\r\n').split(';')
+    keys = _in.readline().rstrip('\r\n').split(';')
+    return descriptors, keys
+
+
+def _read_csv_body(_in, keys, chunksize=None):
+    """
+    Reads the data lines of a StandData.csv / Treatment.csv file, with the file handle positioned after
+    the header lines. Columns are typed by pandas, so columns with only numbers are int64 or float64 (with NaN
+    for empty cells), while columns containing text are object columns.
+    Returns a DataFrame, or an iterator over DataFrames with chunksize lines each if chunksize is given
+    """
+    kwargs = dict(sep=';', header=None, names=list(range(len(keys))), keep_default_na=False, na_values=[''],
+                  quoting=csv.QUOTE_NONE, low_memory=False, chunksize=chunksize)
+    try:
+        return pd.read_csv(_in, **kwargs)
+    except pd.errors.EmptyDataError:
+        empty = pd.DataFrame({_j: pd.Series([], dtype=object) for _j in range(len(keys))})
+        return empty if chunksize is None else iter([empty])
+
 
-    # append the data
-    if len(kwargs) > 0:  # only write data if given
-        with open(write_to_file, 'a') as f:
-            f.write(';'.join(data) + '\n')
+def _csv_column_to_values(column):
+    """
+    Converts a column as read by _read_csv_body() to a list of values, the same way my_str_to_float() converts
+    single values, i.e. integer valued numbers become int, other numbers float, and text (including empty cells)
+    is kept as str
+    """
+    if column.dtype.kind in 'iu':
+        return column.tolist()
+    if column.dtype.kind == 'f':
+        numbers = column.to_numpy()
+        values = numbers.astype(object)
+        is_int = np.isfinite(numbers)
+        is_int[is_int] = numbers[is_int] == np.floor(numbers[is_int])
+        values[is_int] = numbers[is_int].astype(np.int64).tolist()
+        values[np.isnan(numbers)] = ''
+        return values.tolist()
+    # Text columns are usually few, e.g. the stand ID, and are converted value by value
+    return [my_str_to_float(_x) if isinstance(_x, str) else
+            ('' if _x != _x else my_str_to_float(_x)) for _x in column]
+
+
+def _csv_column_to_frame_column(column):
+    """
+    Converts a column as read by _read_csv_body() to a typed DataFrame column, where text columns that only
+    contain numbers (e.g. because of a 'nan' entry) are converted to float64
+    """
+    if column.dtype.kind != 'O':
+        return column
+    numbers = pd.to_numeric(column, errors='coerce')
+    texts = column.notna() & numbers.isna() & \
+        ~column.astype(str).str.strip().str.lower().isin(['nan', '+nan', '-nan'])
+    if texts.any():
+        return column.fillna('')
+    return numbers.astype(float)
 
 
-def read_csv_file(read_from_file):
+def read_csv_file(read_from_file, as_frame=False):
     """
     Reads a typical StandData.csv file that is used as input to Heureka
     :param read_from_file:
+    :param as_frame:
+        bool
+        If True, the data is returned as a DataFrame with typed columns, where columns with only numbers are
+        int64 or float64 (with NaN for empty cells), and columns with text are object columns of strings
     :return:
     dictionary with each column header as keys, and the data for each stand as a list of values for
     that specific column, and also the list of descriptors, which makes it easy to use the output to
     write a new/append to csv file
+    The line endings are stripped from the last column header and the last descriptor, so they can be passed
+    directly to write_csv_file() or HeurekaCsvWriter, which add their own line endings
+    If as_frame is True, a DataFrame is returned instead of the dictionary
     """
-
     with open(read_from_file, 'r') as _in:
-        for i, line in enumerate(_in.readlines()):
-            split_line = line.split(';')
-            if i == 0:
-                descriptors = split_line
-            elif i == 1:
-                out = {_key: [] for _key in split_line}
-            else:
-                for j, val in enumerate(split_line):
-                    out[list(out.keys())[j]].append(my_str_to_float(val))
+        descriptors, keys = _read_csv_header(_in)
+        body = _read_csv_body(_in, keys)
 
+    if as_frame:
+        out = pd.DataFrame({_key: _csv_column_to_frame_column(body[_j]) for _j, _key in enumerate(keys)},
+                           index=body.index)
+        return out, descriptors
+
+    out = {_key: _csv_column_to_values(body[_j]) for _j, _key in enumerate(keys)}
     return out, descriptors
 
 
-def read_raw_heureka_results(filename, sheet_name, read_only_these_variables=None, verbose=False):
+def iter_csv_stands(read_from_file, chunksize=10000):
+    """
+    Generator that reads a typical StandData.csv file, as read_csv_file(), but yields one stand (line) at a time,
+    so that large aggregated files can be processed without holding all stands in memory.
+    The file is read in chunks of chunksize lines.
+
+    :param read_from_file:
+    :param chunksize:
+        int
+    :return:
+        yields a dictionary with the column headers as keys and the values of this stand,
+        converted with the same rules as in read_csv_file()
+    """
+    with open(read_from_file, 'r') as _in:
+        _, keys = _read_csv_header(_in)
+        for chunk in _read_csv_body(_in, keys, chunksize=chunksize):
+            columns = [_csv_column_to_values(chunk[_j]) for _j in range(len(keys))]
+            for row in zip(*columns):
+                yield dict(zip(keys, row))
+
+
+def read_raw_heureka_results(filename, sheet_name, read_only_these_variables=None, verbose=False,
+                             exact_match=False, use_sidecar=False, streaming=False):
     """
     Read heureka results as exported from Heureka (by simply copying a simulation result and pasting it
     into an empty sheet in Excel) and returns the data in a transposed DataFrame with one line for each period (5 years)
@@ -191,48 +653,396 @@ def read_raw_heureka_results(filename, sheet_name, read_only_these_variables=Non
     :param verbose:
         bool
         creates qc plot(s)
+    :param exact_match:
+        bool
+        If True, each variable is read from the row with exactly the same name. Otherwise, the first row
+        whose name contains the variable name is used (e.g. 'Year' can be read from 'Mean Year of Birth' if that
+        row comes first)
+    :param use_sidecar:
+        bool
+        If True, the raw results are read from a compact binary sidecar file next to the results file, which
+        is (re)built automatically when the results file has changed. See read_raw_heureka_tables()
+    :param streaming:
+        bool
+        If True, the sheet is read with a low memory, read-only, openpyxl reader that stops as soon as all
+        variables in read_only_these_variables are found. See stream_raw_heureka_table().
+        Implies exact_match
     :return:
         panda DataFrame
+        Numerical variables are returned as float64 columns, other variables (e.g. 'Treatment') as object columns.
+        The units of each variable are stored in the attrs dictionary
 
     """
-    table = read_excel(filename, 0, sheet_name)
-    # Some treatments in Heureka break the default periods of 5 years into smaller sub-periods, we choose to remove
-    # these from the returned dataframe
+    if use_sidecar:
+        table = read_raw_heureka_tables(filename, [sheet_name])[sheet_name]
+    elif streaming:
+        table = stream_raw_heureka_table(filename, sheet_name, read_only_these_variables)
+        exact_match = True
+    else:
+        table = read_excel(filename, 0, sheet_name)
+    return arrange_raw_heureka_table(table, filename, sheet_name, read_only_these_variables, verbose=verbose,
+                                     exact_match=exact_match)
+
+
+def read_raw_heureka_results_from_sheets(filename, sheet_names, read_only_these_variables=None, verbose=False,
+                                         exact_match=False, use_sidecar=False, streaming=False):
+    """
+    Same as read_raw_heureka_results(), but reads several sheets of the same Heureka results file in one
+    pass over the workbook, instead of parsing the whole workbook once per sheet
+
+    :param filename:
+    :param sheet_names:
+        list
+        List of names of sheets that contains raw results from different Heureka simulations
+    :param read_only_these_variables:
+       list
+       If provided, only the variables (given by name) contained in this list are read
+    :param verbose:
+        bool
+        creates qc plot(s)
+    :param exact_match:
+        bool
+        See read_raw_heureka_results()
+    :param use_sidecar:
+        bool
+        See read_raw_heureka_results()
+    :param streaming:
+        bool
+        See read_raw_heureka_results()
+    :return:
+        dict
+        Dictionary with sheet name as key, and the panda DataFrame returned by read_raw_heureka_results() as value
+    """
+    # remove duplicates, but keep the order
+    sheet_names = list(dict.fromkeys(sheet_names))
+    if use_sidecar:
+        tables = read_raw_heureka_tables(filename, sheet_names)
+    elif streaming:
+        tables = stream_raw_heureka_tables(filename, sheet_names, read_only_these_variables)
+        exact_match = True
+    else:
+        tables = read_excel(filename, 0, sheet_names)
+    if tables is None:
+        return None
+    return {
+        _sheet: arrange_raw_heureka_table(
+            tables[_sheet], filename, _sheet, read_only_these_variables, verbose=verbose, exact_match=exact_match)
+        for _sheet in sheet_names}
+
+
+# Strings that pandas.read_excel() by default reads as NaN
+_pandas_na_strings = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA',
+    'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+
+def stream_raw_heureka_table(filename, sheet_name, read_only_these_variables=None):
+    """
+    Reads a raw Heureka results sheet row by row, using a read-only openpyxl workbook, which doesn't build the
+    styles and cell objects of the whole sheet like read_excel() does.
+    When read_only_these_variables is given, only those rows (and the 'Year' row) are kept, and the
+    reading stops as soon as all of them are found.
+
+    :param filename:
+        str
+        Name of file with Heureka results
+    :param sheet_name:
+    :param read_only_these_variables:
+        list
+        Names of the variables to read. Variables are matched by their exact name
+    :return:
+        panda DataFrame
+        The same (but possibly fewer rows) as read_excel(filename, 0, sheet_name), so it can be passed on to
+        arrange_raw_heureka_table()
+    """
+    return stream_raw_heureka_tables(filename, [sheet_name], read_only_these_variables)[sheet_name]
+
+
+def stream_raw_heureka_tables(filename, sheet_names, read_only_these_variables=None):
+    """
+    Same as stream_raw_heureka_table(), but reads several sheets while opening the workbook only once
+
+    :return:
+        dict
+        Dictionary with sheet name as key, and the raw table as value
+    """
+    if read_only_these_variables is None:
+        wanted = None
+    else:
+        wanted = set(read_only_these_variables) | {'Year'}
+
+    tables = {}
+    wb = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+    try:
+        for sheet_name in sheet_names:
+            rows = wb[sheet_name].iter_rows(values_only=True)
+            header = next(rows, ())
+            columns = []
+            for _i, _key in enumerate(header):
+                columns.append('Unnamed: {}'.format(_i) if _key is None else str(_key).strip())
+            if 'Variable' not in columns:
+                tables[sheet_name] = pd.DataFrame(columns=columns)
+                continue
+            var_i = columns.index('Variable')
+
+            found = set()
+            data = []
+            for row in rows:
+                variable = row[var_i] if len(row) > var_i else None
+                if not isinstance(variable, str):
+                    continue
+                if wanted is not None:
+                    if (variable not in wanted) or (variable in found):
+                        continue
+                    found.add(variable)
+                # empty cells, and text that pandas interprets as missing values (e.g. 'None'), are returned as NaN
+                data.append([np.nan if (_x is None) or (isinstance(_x, str) and _x in _pandas_na_strings) else _x
+                             for _x in row[:len(columns)]] + [np.nan] * (len(columns) - len(row)))
+                if (wanted is not None) and (len(found) == len(wanted)):
+                    break
+            tables[sheet_name] = pd.DataFrame(data, columns=columns)
+    finally:
+        wb.close()
+
+    return tables
+
+
+def results_sidecar_file(filename):
+    """
+    Returns the name of the sidecar file that caches the raw sheets of a Heureka results file
+    e.g. "FHF24-0047 v02 Heureka results.xlsx" -> "FHF24-0047 v02 Heureka results cache.npz"
+    """
+    return '{} cache.npz'.format(os.path.splitext(str(filename))[0])
+
+
+def _file_sha1(filename):
+    import hashlib
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 ** 2), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _raw_table_to_arrays(table):
+    """
+    Splits a raw Heureka table, as read by read_excel(), into arrays that can be stored in a .npz file
+    without pickling. The first three columns (e.g. category, variable name and unit) are stored as strings,
+    the periods as a float matrix, and rows containing text (e.g. 'Treatment') as an extra string matrix
+    """
+    lead = table.iloc[:, :3].to_numpy(dtype=object)
+    periods = table.iloc[:, 3:].to_numpy(dtype=object)
+    values = pd.to_numeric(pd.Series(periods.ravel()), errors='coerce').to_numpy(dtype='float64').reshape(
+        periods.shape)
+    is_text = np.isnan(values) & ~pd.isna(periods)
+    text_rows = np.flatnonzero(np.any(is_text, axis=1))
+    return {
+        'columns': np.array([str(_x) for _x in table.keys()], dtype=str),
+        'lead': np.array([['' if pd.isna(_x) else str(_x) for _x in _row] for _row in lead], dtype=str),
+        'lead_missing': np.asarray(pd.isna(lead), dtype=bool),
+        'values': values,
+        'text_rows': text_rows,
+        'text': np.array([[str(_x) for _x in periods[_i]] for _i in text_rows], dtype=str).reshape(
+            len(text_rows), periods.shape[1]),
+        'is_text': is_text[text_rows]
+    }
+
+
+def _raw_table_from_arrays(arrays):
+    """
+    Inverse of _raw_table_to_arrays()
+    """
+    lead = arrays['lead'].astype(object)
+    lead[arrays['lead_missing']] = np.nan
+    periods = arrays['values'].astype(object)
+    for _j, _i in enumerate(arrays['text_rows']):
+        periods[_i, arrays['is_text'][_j]] = arrays['text'][_j][arrays['is_text'][_j]]
+    return pd.DataFrame(np.concatenate([lead, periods], axis=1), columns=list(arrays['columns']))
+
+
+def _read_results_sidecar(filename):
+    """
+    Reads the sidecar file of a Heureka results file, if it exists and is still valid
+
+    :return:
+        dict
+        Dictionary with sheet name as key, and the raw table as value. Empty if there is no valid sidecar file
+    """
+    sidecar_file = results_sidecar_file(filename)
+    if not os.path.isfile(sidecar_file):
+        return {}
     try:
-        year_row = get_row_index(table, 'Variable', 'Year')
+        with np.load(sidecar_file, allow_pickle=False) as data:
+            arrays = {_key: data[_key] for _key in data.files}
+    except (OSError, ValueError) as err_msg:
+        print('WARNING, could not read {}: {}'.format(os.path.basename(sidecar_file), err_msg))
+        return {}
+
+    stat = os.stat(filename)
+    if (int(arrays['source_mtime_ns']) != stat.st_mtime_ns) or (int(arrays['source_size']) != stat.st_size):
+        # The file has been touched, e.g. by OneDrive, check if the content has changed too
+        if str(arrays['source_sha1']) != _file_sha1(filename):
+            return {}
+
+    tables = {}
+    for _i, _sheet in enumerate(arrays['sheets']):
+        tables[str(_sheet)] = _raw_table_from_arrays(
+            {_key.split('/', 1)[1]: arrays[_key] for _key in arrays if _key.startswith('{}/'.format(_i))})
+    return tables
+
+
+def _write_results_sidecar(filename, tables):
+    sidecar_file = results_sidecar_file(filename)
+    stat = os.stat(filename)
+    arrays = {
+        'sheets': np.array(list(tables.keys()), dtype=str),
+        'source_mtime_ns': np.array(stat.st_mtime_ns),
+        'source_size': np.array(stat.st_size),
+        'source_sha1': np.array(_file_sha1(filename))
+    }
+    for _i, _sheet in enumerate(tables):
+        for _key, _value in _raw_table_to_arrays(tables[_sheet]).items():
+            arrays['{}/{}'.format(_i, _key)] = _value
+    # write to a temporary file first, so an interrupted write can't leave a corrupt sidecar file
+    tmp_file = '{}.tmp'.format(sidecar_file)
+    with open(tmp_file, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp_file, sidecar_file)
+
+
+def read_raw_heureka_tables(filename, sheet_names):
+    """
+    Reads the raw sheets of a Heureka results file through a sidecar file, "<filename> cache.npz", placed next to
+    the results file, which holds each sheet as float arrays (plus the variable names, units and treatments).
+    Sheets that are not found in the sidecar file are parsed from the results file, and added to the sidecar file.
+    The sidecar file is rebuilt when the results file has been modified (i.e. the modification time or size has
+    changed, and the content hash differs from the one stored in the sidecar file)
+
+    :param filename:
+        str
+        Name of file with Heureka results
+    :param sheet_names:
+        list
+        List of sheet names to read
+    :return:
+        dict
+        Dictionary with sheet name as key, and the raw table, as read by read_excel(filename, 0, sheet_name),
+        as value
+    """
+    tables = _read_results_sidecar(filename)
+    missing_sheets = [_sheet for _sheet in sheet_names if _sheet not in tables]
+    if len(missing_sheets) > 0:
+        parsed = read_excel(filename, 0, missing_sheets)
+        if parsed is None:
+            return None
+        tables.update(parsed)
+        try:
+            _write_results_sidecar(filename, tables)
+        except OSError as err_msg:
+            print('WARNING, could not write sidecar file for {}: {}'.format(os.path.basename(filename), err_msg))
+    return {_sheet: tables[_sheet] for _sheet in sheet_names}
+
+
+def _raw_heureka_row_indexes(variables, names, exact_match):
+    """
+    Returns the row index of each name in names, using an index of the variable names that is built once
+
+    :param variables:
+        list
+        Names in the 'Variable' column of a raw Heureka table
+    :param names:
+        list
+        Names to look up
+    :param exact_match:
+        bool
+        See get_row_index()
+    :return:
+        list of int (or None when not found)
+    """
+    first_row = {}
+    for i, var in enumerate(variables):
+        if isinstance(var, str) and var not in first_row:
+            first_row[var] = i
+    if exact_match:
+        return [first_row.get(_name, None) for _name in names]
+
+    # In substring mode, a name is found at the first row containing it, which is either an earlier
+    # row with a longer name, or the row with the exact same name
+    unique_names = list(first_row.keys())
+    unique_rows = list(first_row.values())
+    rows = []
+    for _name in names:
+        row = first_row.get(_name, None)
+        for var, i in zip(unique_names, unique_rows):
+            if row is not None and i >= row:
+                break
+            if _name in var:
+                row = i
+                break
+        rows.append(row)
+    return rows
+
+
+def arrange_raw_heureka_table(table, filename, sheet_name, read_only_these_variables=None, verbose=False,
+                              exact_match=False):
+    """
+    Transposes one raw Heureka result table, as read by read_excel(), into a DataFrame with one line for
+    each period (5 years). See read_raw_heureka_results()
+
+    :param table:
+        panda DataFrame
+        Raw Heureka results, as read by read_excel(filename, 0, sheet_name)
+        The variable names are in the 'Variable' column, the units in the third column, and the results
+        for each period in the fourth and following columns
+    :param filename:
+        str
+        Name of the file the table was read from, used to locate the QC_plots folder
+    :param sheet_name:
+    :param read_only_these_variables:
+    :param verbose:
+    :param exact_match:
+    :return:
+        panda DataFrame
+    """
+    try:
+        variables = list(table['Variable'])
     except KeyError as error:
         print('Variable Year not in file! ', error)
         return None
 
-    five_years = [np.mod(float(this_year), 5) == 0 for this_year in table.iloc[year_row, 3:]]
-    # print(table.iloc[year_row, 3:][five_years])
+    # Some treatments in Heureka break the default periods of 5 years into smaller sub-periods, we choose to remove
+    # these from the returned dataframe
+    year_row = _raw_heureka_row_indexes(variables, ['Year'], exact_match)[0]
+    if year_row is None:
+        print('Variable Year not in file! ')
+        return None
+    years = np.asarray(table.iloc[year_row, 3:].values, dtype='float64')
+    five_years = np.mod(years, 5) == 0
+
+    names = list(dict.fromkeys([_var for _var in variables if isinstance(_var, str)]))
+    if read_only_these_variables is not None:
+        names = [_var for _var in names if _var in read_only_these_variables]
+    rows = _raw_heureka_row_indexes(variables, names, exact_match)
+
+    # Select all requested rows and periods in one block, and convert it to floats in one step
+    block = table.iloc[rows, 3:].iloc[:, five_years]
+    raw_values = block.to_numpy(dtype=object)
+    values = pd.to_numeric(pd.Series(raw_values.ravel()), errors='coerce').to_numpy(dtype='float64').reshape(
+        raw_values.shape)
+    # rows containing text (e.g. the 'Treatment' row) are kept as they are
+    is_text = np.any(np.isnan(values) & ~pd.isna(raw_values), axis=1)
+
     data_dict = {}
-    unit_dict = {}
-    for variable in list(table['Variable']):
-        if read_only_these_variables is not None:
-            if variable not in read_only_these_variables:
-                continue
-        row_i = get_row_index(table, 'Variable', variable)
-        data_dict[variable] = table.iloc[row_i, 3:][five_years]
-        unit_dict[variable] = table.iloc[row_i, 2]
+    for j, variable in enumerate(names):
+        data_dict[variable] = raw_values[j] if is_text[j] else values[j]
+    unit_dict = {variable: table.iloc[row_i, 2] for variable, row_i in zip(names, rows)}
 
     if verbose:
+        import Fossagrim.plotting.misc_plots as fpp
         qc_plot_dir = os.path.join(os.path.split(filename)[0], 'QC_plots')
         fpp.plot_raw_data(data_dict, sheet_name, 'Raw Data', qc_plot_dir)
 
-        # fig, ax = plt.subplots(figsize=(12, 12))
-        # _x = data_dict['Year']
-        # for key, _y in data_dict.items():
-        #     if key in ['Year', 'Treatment', 'Unit']:
-        #         continue
-        #     ax.plot(_x, _y, label=key)
-        # ax.set_title('Raw Heureka {}'.format(sheet_name))
-        # ax.set_xlabel('Year')
-        # ax.grid(True)
-        # ax.legend()
-        # fig.savefig(os.path.join(qc_plot_dir, 'raw_heureka_{}.png'.format(sheet_name)))
-
-    result = pd.DataFrame(data=data_dict)
+    result = pd.DataFrame(data=data_dict, index=block.columns)
     result.attrs = unit_dict
     return result
 
@@ -272,7 +1082,86 @@ def combine_raw_heureka_results(filename, sheet_name, function, variables, verbo
     return function(**_variables)
 
 
-def rearrange_raw_heureka_results(filename, sheet_names, combine_sheets, monetization_file=None, verbose=False):
+def write_rearranged_results(filename, blocks, sheet_name=None, overwrite=False, create_sheets=None):
+    """
+    Writes rearranged (and combined) Heureka results to one sheet of an Excel file, where each block of results
+    is written as a table starting on row 3, with the name of the block in row 1.
+    All blocks are written with one load and one save of the workbook.
+
+    :param filename:
+        str
+        Name of Excel file to write to
+    :param blocks:
+        list
+        List of (<NAME OF BLOCK>, <pandas DataFrame>, <START COLUMN>) tuples, where the start column begins at 0
+    :param sheet_name:
+        str
+        Name of sheet to write to, default 'Rearranged results'
+    :param overwrite:
+        bool
+        If True, an existing sheet is replaced by an empty sheet (at the same position in the workbook) before writing,
+        so that no old data is left in the sheet. If False, the blocks are written on top of any existing data
+    :param create_sheets:
+        list
+        If given, a new Excel file is created with these (empty) sheets, replacing any existing file
+    """
+    if sheet_name is None:
+        sheet_name = 'Rearranged results'
+
+    if create_sheets is not None:
+        writer = pd.ExcelWriter(filename, engine='openpyxl')
+        for _sheet in create_sheets:
+            writer.book.create_sheet(_sheet)
+    else:
+        writer = pd.ExcelWriter(filename, mode='a', if_sheet_exists='overlay', engine='openpyxl')
+
+    with writer:
+        if overwrite and sheet_name in writer.book.sheetnames:
+            target_index = writer.book.index(writer.book[sheet_name])
+            del writer.book[sheet_name]
+            writer.book.create_sheet(sheet_name, target_index)
+        for header, table, start_col in blocks:
+            table.to_excel(writer, sheet_name=sheet_name, startcol=start_col, startrow=2)
+        if len(blocks) > 0:
+            ws = writer.book[sheet_name]
+            for header, table, start_col in blocks:
+                ws.cell(1, start_col + 1).value = header
+
+
+# Policies for existing output files, see allow_overwrite()
+overwrite_policies = ['ask', 'never', 'always']
+
+
+def allow_overwrite(filename, overwrite='ask'):
+    """
+    Decides if a file can be written, when it may already exist
+
+    :param filename:
+        str
+    :param overwrite:
+        str
+        Policy used when the file already exists:
+        'ask': the user is asked (only for interactive use),
+        'never': the existing file is kept,
+        'always': the existing file is overwritten
+    :return:
+        bool
+        True if the file doesn't exist, or it can be overwritten
+    """
+    if overwrite not in overwrite_policies:
+        raise ValueError('Unknown overwrite policy {}, use one of {}'.format(overwrite, ', '.join(overwrite_policies)))
+    if not os.path.isfile(filename):
+        return True
+    print("WARNING {} already exists.".format(os.path.split(filename)[-1]))
+    if overwrite == 'ask':
+        _ans = input("Do you want to overwrite? Y/[N]:")
+        return _ans.upper() == 'Y'
+    return overwrite == 'always'
+
+
+def rearrange_raw_heureka_results(filename, sheet_names, combine_sheets, monetization_file=None, verbose=False,
+                                  use_sidecar=False, streaming=False, overwrite=False, monetization_kwargs=None,
+                                  overwrite_monetization_file='ask'):
     """
 
     :param filename:
@@ -295,68 +1184,67 @@ def rearrange_raw_heureka_results(filename, sheet_names, combine_sheets, monetiz
     :param verbose:
         bool
         creates qc plot(s)
+    :param use_sidecar:
+        bool
+        If True, the raw results are read through the sidecar file. See read_raw_heureka_tables()
+    :param streaming:
+        bool
+        If True, the raw results are read with the low memory reader. See stream_raw_heureka_tables()
+    :param overwrite:
+        bool
+        If True, an existing 'Rearranged results' sheet is replaced, including removal of all old data in it
+    :param monetization_kwargs:
+        dict
+        Dictionary of kwargs as returned by get_kwargs_from_stand(). If given, the complete monetization file is
+        built in one pass by build_monetization_file(), so there is no need to call modify_monetization_file()
+    :param overwrite_monetization_file:
+        str
+        Policy used when the monetization file already exists, 'ask', 'never' or 'always', see allow_overwrite()
     :return:
     """
-    from openpyxl import load_workbook
-
     result_sheet_name = 'Rearranged results'
 
     rearrange_result_file = False
 
     # Test if the excel file with Heureka results already contain Rearranged results
-    wb = load_workbook(filename)
-    if result_sheet_name in wb.sheetnames:
-        print("WARNING the sheet '{}' already exists in {}. Remove it before trying again.".format(
+    sheet_exists = result_sheet_name in workbook_sheet_names(filename)
+    if sheet_exists and not overwrite:
+        print("WARNING the sheet '{}' already exists in {}. Remove it, or use overwrite=True, before trying again.".format(
             result_sheet_name,
             os.path.basename(filename)))
-        # TODO
-        # The data in the old sheet is not removed before overwriting, so old data can hang on also after 'over writing'
-        # This needs to be fixed before allowing for overwrite
-        # _ans = input("Do you want to overwrite that sheet? Y/[N]:")
-        # if _ans.upper() == 'Y':
-        #     rearrange_result_file = True
     else:
         rearrange_result_file = True
 
     write_monetization_file = False
     if monetization_file is not None:
-        if os.path.isfile(monetization_file):
-            print("WARNING monetization file {} already exists.".format(
-                os.path.split(monetization_file)[-1]))
-            _ans = input("Do you want to overwrite? Y/[N]:")
-            if _ans.upper() == 'Y':
-                write_monetization_file = True
-        else:
-            write_monetization_file = True
+        write_monetization_file = allow_overwrite(monetization_file, overwrite_monetization_file)
+
+    # Read all raw sheets, both the ones to rearrange and the ones to combine, in one pass over the workbook
+    all_sheet_names = list(sheet_names)
+    if combine_sheets is not None:
+        for this_combined_result in list(combine_sheets.keys()):
+            # sheet names are found in positions 0, 2, 4, ... in the list
+            all_sheet_names += combine_sheets[this_combined_result][::2]
+    raw_tables = read_raw_heureka_results_from_sheets(
+        filename, all_sheet_names, read_only_these_variables=variables_used_in_monetization,
+        use_sidecar=use_sidecar, streaming=streaming)
+    if verbose:
+        import Fossagrim.plotting.misc_plots as fpp
+        for sheet_name in sheet_names:
+            fpp.plot_raw_data(raw_tables[sheet_name], sheet_name, 'Raw Data',
+                              os.path.join(os.path.split(filename)[0], 'QC_plots'))
 
-        if write_monetization_file:
-            # Create empty monetization file
-            writer = pd.ExcelWriter(monetization_file, engine='xlsxwriter')
-            wb = writer.book
-            for _sheet in [result_sheet_name, 'Parameters', 'Monetization']:
-                ws = wb.add_worksheet(_sheet)
-            writer.close()
+    # The rearranged and combined tables are collected, and written to file at the end
+    result_blocks = []
+    monetization_blocks = []
 
     start_cols = []
     for i, sheet_name in enumerate(sheet_names):
-        table = read_raw_heureka_results(
-            filename,
-            sheet_name,
-            read_only_these_variables=variables_used_in_monetization,
-            verbose=verbose)
+        table = raw_tables[sheet_name]
         this_start_col = i * (len(list(table.keys())) + 2)
-        if rearrange_result_file:
-            with pd.ExcelWriter(filename, mode='a', if_sheet_exists='overlay', engine='openpyxl') as writer:
-                table.to_excel(writer, sheet_name=result_sheet_name, startcol=this_start_col, startrow=2)
+        result_blocks.append((sheet_name, table, this_start_col))
         start_cols.append(this_start_col)
 
-    if rearrange_result_file:
-        wb = load_workbook(filename)
-        ws = wb[result_sheet_name]
-        for i, header in enumerate(sheet_names):
-            ws.cell(1, start_cols[i] + 1).value = header
-        wb.save(filename)
-
     if combine_sheets is not None:
         last_start_col = start_cols[-1]
         # All the tables to be combined need to have the same (name and numbers) of columns
@@ -369,7 +1257,7 @@ def rearrange_raw_heureka_results(filename, sheet_names, combine_sheets, monetiz
                     # On position 1, 3, 5, ... the fractions are stored
                     fractions.append(sheet_name)
                     continue
-                tables.append(read_raw_heureka_results(filename, sheet_name, variables_used_in_monetization))
+                tables.append(raw_tables[sheet_name])
             combined_dict = {}
             for key in list(tables[0].keys()):
                 if key == 'Treatment':
@@ -385,31 +1273,24 @@ def rearrange_raw_heureka_results(filename, sheet_names, combine_sheets, monetiz
 
             # Start writing the combined table
             this_start_col = last_start_col + (i + 1) * (len(list(combined_table.keys())) + 2)
-            if rearrange_result_file:
-                with pd.ExcelWriter(filename, mode='a', if_sheet_exists='overlay', engine='openpyxl') as writer:
-                    combined_table.to_excel(writer, sheet_name=result_sheet_name, startcol=this_start_col, startrow=2)
-
-            if rearrange_result_file:
-                wb = load_workbook(filename)
-                ws = wb[result_sheet_name]
-                ws.cell(1, this_start_col + 1).value = this_combined_result
-                wb.save(filename)
-
-            if write_monetization_file:
-                _start_col = 0 + (i + 0) * (len(list(combined_table.keys())) + 2)
-                with pd.ExcelWriter(monetization_file, mode='a', if_sheet_exists='overlay',
-                                    engine='openpyxl') as writer:
-                    combined_table.to_excel(writer, sheet_name=result_sheet_name, startcol=_start_col, startrow=2)
-
-                wb = load_workbook(monetization_file)
-                ws = wb[result_sheet_name]
-                ws.cell(1, _start_col + 1).value = this_combined_result
-                wb.save(monetization_file)
+            result_blocks.append((this_combined_result, combined_table, this_start_col))
+
+            _start_col = 0 + (i + 0) * (len(list(combined_table.keys())) + 2)
+            monetization_blocks.append((this_combined_result, combined_table, _start_col))
 
             if verbose:
                 qc_plot_dir = os.path.join(os.path.split(filename)[0], 'QC_plots')
                 fpp.plot_raw_data(combined_dict, this_combined_result, 'Combined', qc_plot_dir)
 
+    if rearrange_result_file:
+        write_rearranged_results(filename, result_blocks, result_sheet_name, overwrite=sheet_exists)
+
+    if write_monetization_file and monetization_kwargs is not None:
+        build_monetization_file(monetization_file, monetization_blocks, result_sheet_name, **monetization_kwargs)
+    elif write_monetization_file:
+        write_rearranged_results(monetization_file, monetization_blocks, result_sheet_name,
+                                 create_sheets=[result_sheet_name, 'Parameters', 'Monetization'])
+
     return write_monetization_file
 
 
@@ -487,13 +1368,104 @@ def load_heureka_results(filename, header, sheet_name=None, year_key=None, data_
         output_years.append(table[key][year_index])
         output_data.append(table[key][data_index])
 
-    return np.array(output_years), np.array(output_data)
+    return np.array(output_years), np.array(output_data)
+
+
+def _translate_to_int(key, column):
+    """
+    Converts a column of the Fossagrim table to int, value by value only when the whole column can not be converted
+    """
+    if column.dtype.kind in 'iu':
+        return column
+    if column.dtype.kind == 'f' and np.isfinite(column.to_numpy()).all():
+        return column.astype(np.int64)
+    values = []
+    for value in column:
+        try:
+            value = int(value)
+        except ValueError as err_msg:
+            print('For key {}: {}'.format(key, err_msg))
+        values.append(value)
+    return pd.Series(values, index=column.index, dtype=object)
+
+
+def arrange_export_of_stands(table, extra_keywords_list=None, unique_id=None):
+    """
+    Collects, translates, and converts, the Fossagrim data of all stands in the table into a format
+    that can be used by heureka, using column operations on the whole table
+
+    :param table:
+        pandas DataFrame
+        Table with data as read in 'export_fossagrim_stand_to_heureka'
+        Each row contains one stand
+    :param extra_keywords_list:
+        list
+        List of non-default keywords from heureka_standdata_keys that we want to add
+    :param unique_id:
+        str
+        When not None, this string is passed on to the "<_project_name> Averaged stand data.csv" file and stored in
+        column "UserDefinedVariable8" (column DA when opened in Excel) for each averaged stand.
+        It is used as an identifier in the Woods platform to allow us to separate between different versions
+
+    :return:
+        pandas DataFrame
+        One row per stand, with the heureka keys as column names, that can be written with HeurekaCsvWriter.write_table
+    """
+    key_translation = translate_keys_from_fossagrim_to_heureka()
+    species_codes = {'Gran': 'G', 'Furu': 'T', 'Bjørk': 'B'}
+    table = table.reset_index(drop=True)
+    n_stands = len(table)
+
+    if extra_keywords_list is None:
+        extra_keywords_list = []
+
+    out = {}
+    for key in heureka_mandatory_standdata_keys + extra_keywords_list:
+        if key in key_translation:
+            # Use the translated keyword to extract data from the Fossagrim table
+            column = table[key_translation[key]]
+        else:
+            column = pd.Series([''] * n_stands, dtype=object)
+
+        # Now do the conversion from Fossagrim data and units to Heureka compatible data and units
+        if key == 'CountyCode':
+            column = pd.Series([13] * n_stands, dtype=np.int64)
+        if key in ['InventoryYear', 'SoilMoistureCode', 'VegetationType', 'Peat']:
+            column = _translate_to_int(key, column)
+        if key == 'ProdArea':
+            column = column * 0.1  # from daa to ha
+        if key == 'SiteIndexSpecies':
+            unknown = ~column.isin(list(species_codes.keys()))
+            if unknown.any():
+                raise NotImplementedError('Species "{}" is not recognized as either Gran or Furu'.format(
+                    column[unknown].iloc[0]))
+            column = column.map(species_codes).astype(object)
+        if key == 'V':
+            column = column * 10. * m3fub_to_m3sk  # m3fub/daa to m3sk/ha
+        if key == 'N':
+            # the number of trees is not rounded to int before it is converted
+            column = column * 10.  # trees/mål to trees/ha
+        if key == 'PlantDensity':
+            column = column * 10.  # plants/daa to plants/ha
+        if key == 'PropPine':
+            column = table['Furu'] / table['Total']
+        if key == 'PropSpruce':
+            column = table['Gran'] / table['Total']
+        if key == 'PropBirch':
+            column = table['Lauv'] / table['Total']
+        if key == 'StandId':
+            column = table['Fossagrim ID']
+        if key == 'UniqueID':
+            column = pd.Series([unique_id] * n_stands, dtype=object)
+        out[key] = column.reset_index(drop=True)
+
+    return pd.DataFrame(out)
 
 
 def arrange_export_of_one_stand(row_index, table, extra_keywords_list=None, unique_id=None):
     """
     Utility function that collects, translates, and converts, the Fossagrim data into a format
-    that can be used by heureka
+    that can be used by heureka. See arrange_export_of_stands() for exporting many stands at once.
     :param row_index:
         int
         row index (beginning at 0) of table which we want to export
@@ -514,57 +1486,8 @@ def arrange_export_of_one_stand(row_index, table, extra_keywords_list=None, uniq
         dict
         Dictionary of keyword: value pairs that can be used by 'write_csv_file'
     """
-    key_translation = translate_keys_from_fossagrim_to_heureka()
-    keyword_arguments = {}
-
-    if extra_keywords_list is None:
-        extra_keywords_list = []
-
-    # loop over all mandatory keywords that heureka needs as input
-    for key in heureka_mandatory_standdata_keys + extra_keywords_list:
-        keyword_arguments[key] = ''  # Give every mandatory key a default empty value at first
-        if key in list(key_translation.keys()):
-            # Use the translated keyword to extract data from the Fossagrim table. NO CONVERSION YET!
-            keyword_arguments[key] = table[key_translation[key]][row_index]
-
-    # Now do the conversion from Fossagrim data and units to Heureka compatible data and units
-    for key, value in list(keyword_arguments.items()):
-        if key in ['CountyCode']:
-            keyword_arguments[key] = 13
-        if key in ['InventoryYear', 'N', 'SoilMoistureCode', 'VegetationType', 'Peat']:
-            try:
-                keyword_arguments[key] = int(value)
-            except ValueError as err_msg:
-                print('For key {}: {}'.format(key, err_msg))
-        if key == 'ProdArea':
-            keyword_arguments[key] = value * 0.1  # from daa to ha
-        if key == 'SiteIndexSpecies':
-            if value == 'Gran':
-                keyword_arguments[key] = 'G'
-            elif value == 'Furu':
-                keyword_arguments[key] = 'T'
-            elif value == 'Bjørk':
-                keyword_arguments[key] = 'B'
-            else:
-                raise NotImplementedError('Species "{}" is not recognized as either Gran or Furu'.format(value))
-        if key == 'V':
-            keyword_arguments[key] = value * 10. * m3fub_to_m3sk  # m3fub/daa to m3sk/ha
-        if key == 'N':
-            keyword_arguments[key] = value * 10.  # trees/mål to trees/ha
-        if key == 'PlantDensity':
-            keyword_arguments[key] = value * 10.  # plants/daa to plants/ha
-        if key == 'PropPine':
-            keyword_arguments[key] = table['Furu'][row_index] / table['Total'][row_index]
-        if key == 'PropSpruce':
-            keyword_arguments[key] = table['Gran'][row_index] / table['Total'][row_index]
-        if key == 'PropBirch':
-            keyword_arguments[key] = table['Lauv'][row_index] / table['Total'][row_index]
-        if key == 'StandId':
-            keyword_arguments[key] = table['Fossagrim ID'][row_index]
-        if key == 'UniqueID':
-            keyword_arguments[key] = unique_id
-
-    return keyword_arguments
+    stands = arrange_export_of_stands(table.iloc[[row_index]], extra_keywords_list, unique_id=unique_id)
+    return {_key: stands[_key].iloc[0] for _key in stands.keys()}
 
 
 def average_over_stands(average_over, table, stand_id_key, average_name, verbose=False):
@@ -599,93 +1522,86 @@ def average_over_stands(average_over, table, stand_id_key, average_name, verbose
     from Fossagrim.utils.definitions import fossagrim_keys_to_sum_over as keys_to_sum_over
     from Fossagrim.utils.definitions import fossagrim_keys_to_most_of as keys_to_most_of
 
-    # create a new empty DataFrame that should hold the average values
-    avg_table = pd.DataFrame(columns=[_key.strip() for _key in list(table.keys())])
+    keys = list(table.keys())
+    stripped_keys = [_key.strip() for _key in keys]
+    table = table.reset_index(drop=True)
 
+    # Map each stand to the groups it belongs to. A stand can be in several groups, so the exploded Series has one
+    # entry per (stand, group), indexed by the row of the stand
+    stand_groups = {}
     for avg_group in average_over:
         if verbose:
             print('Averaging group {}, which contains stands {}'.format(avg_group, average_over[avg_group]))
-        # extract the row indexes over which the average is calculated for this group
-        average_ind = []
-        for i, stand_id in enumerate(table[stand_id_key]):
-            if stand_id in average_over[avg_group]:
-                average_ind.append(i)
-
-        if len(average_ind) == 0:
+        for stand_id in dict.fromkeys(average_over[avg_group]):
+            stand_groups.setdefault(stand_id, []).append(avg_group)
+    group = table[stand_id_key].map(lambda _x: stand_groups.get(_x, np.nan)).explode().dropna()
+    found = set(group)
+    for avg_group in average_over:
+        if avg_group not in found:
             print('WARNING, no match for average group {}'.format(avg_group))
-            continue
-
-        this_row_of_data = []
-        # continue using the above indexes to calculate the average values
-        total_area = np.sum(table['Prod.areal'][average_ind])
-        # for key in fossagrim_standdata_keys:
-        for key in list(table.keys()):
-            if key.strip() in ['Fossagrim ID', 'Bestand']:
-                this_data = '{}{}'.format(average_name, avg_group)
-                if verbose:
-                    print(' {}: {}'.format(key, this_data))
-                this_row_of_data.append(this_data)
-            elif key.strip() in keys_to_sum_over:
-                this_column = [my_float(_x) for _x in table[key][average_ind]]  # Try to avoid strings with ',' instead of '.' in floats
-                this_data = np.sum(this_column)
-                # this_data = np.sum(table[key][average_ind])
-                if verbose:
-                    print(' Sum over: {}: {}'.format(key, this_data))
-                this_row_of_data.append(this_data)
-            elif key.strip() in keys_to_average_over:
-                this_column = [my_float(_x) for _x in table[key][average_ind]]
-                this_area_column = [my_float(_x) for _x in table['Prod.areal'][average_ind]]
-                if verbose:
-                    print('Average over:', key)
-                    print(' Data: ', this_column)
-                    print(' Sum:', np.sum(this_column))
-                this_data = np.sum(np.array(this_area_column) * np.array(this_column)) / total_area
-                # this_data = np.sum(table['Prod.areal'][average_ind] * table[key][average_ind]) / total_area
-                if verbose:
-                    print(' Average over:{}: {}'.format(key, this_data))
-                this_row_of_data.append(this_data)
-            elif key.strip() in keys_to_most_of:
-                # An area weighted 'most of' calculation
-                this_data = table[key][average_ind].array
-                area_weighted_average = np.sum(this_data * table['Prod.areal'][average_ind]) / total_area
-                # index of original data closest to the average
-                ind = np.argmin((this_data - area_weighted_average) ** 2)
-                if verbose:
-                    print(' Most of: {}: {}'.format(key, this_data[ind]))
-                this_row_of_data.append(this_data[ind])
-            else:
-                # for other parameters, just copy the first selected stand
-                this_data = table[key][average_ind[0]]
-                if verbose:
-                    print(' Copy first: {}: {}'.format(key, this_data))
-                this_row_of_data.append(this_data)
-
-        avg_table.loc[len(avg_table)] = this_row_of_data
-
-        # for key in fossagrim_standdata_keys:
-        #     if key in ['Fossagrim ID', 'Bestand']:
-        #         avg_table[key] = [average_name]
-        #     elif key in keys_to_sum_over:
-        #         avg_table[key] = np.sum(table[key][average_ind])
-        #     elif key in keys_to_average_over:
-        #         avg_table[key] = np.sum(table['Prod.areal'][average_ind] * table[key][average_ind]) / total_area
-        #     elif key in keys_to_most_of:
-        #         # An area weighted 'most of' calculation
-        #         this_data = table[key][average_ind]
-        #         area_weighted_average = np.sum(this_data * table['Prod.areal'][average_ind]) / total_area
-        #         # index of original data closest to the average
-        #         ind = np.argmin((this_data - area_weighted_average)**2)
-        #         avg_table[key] = this_data[ind]
-        #     else:
-        #         # for other parameters, just copy the first selected stand
-        #         avg_table[key] = [table[key][average_ind[0]]]
+    groups = [_x for _x in average_over if _x in found]
+    if len(groups) == 0:
+        return pd.DataFrame(columns=stripped_keys)
+
+    selected = table.loc[group.index].reset_index(drop=True)
+    group = group.reset_index(drop=True)
+
+    def as_floats(_key):
+        # Try to avoid strings with ',' instead of '.' in floats
+        column = selected[_key]
+        if column.dtype.kind in 'iufb':
+            return column.astype(float)
+        return column.map(my_float).astype(float)
+
+    def group_sum(_x):
+        # Sum of each group, which is NaN when any value of the group is missing, like np.sum()
+        return _x.groupby(group).sum().where(~_x.isna().groupby(group).any())
+
+    area = as_floats('Prod.areal')
+    # the total area skips missing areas, like pandas' sum of the area column
+    total_area = area.groupby(group).sum()
+
+    results = {}
+    methods = {}
+    for key, stripped in zip(keys, stripped_keys):
+        if stripped in ['Fossagrim ID', 'Bestand']:
+            methods[key] = ''
+            results[key] = pd.Series(['{}{}'.format(average_name, _x) for _x in groups], index=groups)
+        elif stripped in keys_to_sum_over:
+            methods[key] = 'Sum over: '
+            results[key] = group_sum(as_floats(key))
+        elif stripped in keys_to_average_over:
+            methods[key] = 'Average over:'
+            results[key] = group_sum(as_floats(key) * area) / total_area
+        elif stripped in keys_to_most_of:
+            # An area weighted 'most of' calculation, which picks the first stand of each group whose value is
+            # closest to the area weighted average of the group
+            methods[key] = 'Most of: '
+            values = selected[key]
+            area_weighted_average = (values * selected['Prod.areal']).groupby(group).sum() / total_area
+            distance = (values - area_weighted_average.reindex(group).to_numpy()) ** 2
+            closest = distance.astype(float).groupby(group).idxmin()
+            results[key] = pd.Series(values[closest].to_numpy(), index=closest.index)
+        else:
+            # for other parameters, just copy the first selected stand
+            methods[key] = 'Copy first: '
+            first = selected.groupby(group, sort=False).head(1)
+            results[key] = pd.Series(first[key].to_numpy(), index=group[first.index].to_numpy())
 
+    avg_table = pd.DataFrame({_i: results[_key].reindex(groups).to_numpy() for _i, _key in enumerate(keys)})
+    avg_table.columns = stripped_keys
+    if verbose:
+        for _i, avg_group in enumerate(groups):
+            print('Group {}'.format(avg_group))
+            for key, stripped in zip(keys, stripped_keys):
+                print(' {}{}: {}'.format(methods[key], key, avg_table[stripped].iloc[_i]))
     return avg_table
 
 
 def export_fossagrim_stand_to_heureka(read_from_file, write_to_file, this_stand_only=None, average_over=None,
                                       stand_id_key=None,
-                                      header=None, sheet_name=None, average_name=None, verbose=False, unique_id=None):
+                                      header=None, sheet_name=None, average_name=None, verbose=False, unique_id=None,
+                                      table=None):
     """
     Load a 'typical' Fossagrim stand data file (Bestandsutvalg) and writes an output file which Heureka can use
     See https://www.heurekaslu.se/wiki/Import_of_stand_register for description of parameters used by Heureka
@@ -714,6 +1630,10 @@ def export_fossagrim_stand_to_heureka(read_from_file, write_to_file, this_stand_
         When not None, this string is passed on to the "<_project_name> Averaged stand data.csv" file and stored in
         column "UserDefinedVariable8" (column DA when opened in Excel) for each averaged stand.
         It is used as an identifier in the Woods platform to allow us to separate between different versions
+    :param table:
+        pd.DataFrame
+        Stand data already read from read_from_file (e.g. by projects_new.Project), in which case the file is not
+        read again
 
     :return:
     """
@@ -724,12 +1644,12 @@ def export_fossagrim_stand_to_heureka(read_from_file, write_to_file, this_stand_
     if header is None:
         header = 7
 
-    table = read_excel(read_from_file, header, sheet_name)
+    if table is None:
+        table = read_excel(read_from_file, header, sheet_name)
     if table is None:
         print('WARNING, stands could not be loaded from {}'.format(read_from_file))
         return None
 
-    append = False
     notes = [''] * len(table[stand_id_key])
 
     if (average_over is not None) and isinstance(average_over, dict):  # export averaged stands
@@ -739,7 +1659,8 @@ def export_fossagrim_stand_to_heureka(read_from_file, write_to_file, this_stand_
             'Area weighted average for {} of stands {}'.format(_key, ', '.join([str(_x) for _x in average_over[_key]]))
             for _key in list(average_over.keys())]
 
-    number_of_stands_written = 0
+    # select the stands to export
+    export_ind = []
     for i, stand_id in enumerate(table[stand_id_key]):
         if table['Bonitering\ntreslag'][i] in ['Uproduktiv', '-']:  # or np.isnan(table['HovedNr'][i]):
             if verbose:
@@ -751,6 +1672,10 @@ def export_fossagrim_stand_to_heureka(read_from_file, write_to_file, this_stand_
             continue
         if verbose:
             print('Attempting to write {} to {}'.format(stand_id, write_to_file))
+        export_ind.append(i)
+
+    number_of_stands_written = len(export_ind)
+    if number_of_stands_written > 0:
         # get the data from the fossagrim table arranged for writing in heureka format
         if unique_id is not None:
             extra_keywords_list = ['PlantDensity', 'UserDefinedVariable2_RotationPeriod',
@@ -758,17 +1683,10 @@ def export_fossagrim_stand_to_heureka(read_from_file, write_to_file, this_stand_
         else:
             extra_keywords_list = ['PlantDensity', 'UserDefinedVariable2_RotationPeriod',
                                    'UserDefinedVariable3_ThinningYear']
-        keyword_arguments = arrange_export_of_one_stand(i, table, extra_keywords_list, unique_id=unique_id)
-        write_csv_file(
-            write_to_file,
-            heureka_standdata_keys,
-            heureka_standdata_desc,
-            append=append,
-            Note=notes[i],
-            **keyword_arguments
-        )
-        number_of_stands_written += 1
-        append = True
+        stands = arrange_export_of_stands(table.iloc[export_ind], extra_keywords_list, unique_id=unique_id)
+        stands.insert(0, 'Note', [notes[_i] for _i in export_ind])
+        with HeurekaCsvWriter(write_to_file, heureka_standdata_keys, heureka_standdata_desc) as writer:
+            writer.write_table(stands)
 
     if number_of_stands_written == 0:
         print('WARNING: No stands written to {}'.format(write_to_file))
@@ -817,14 +1735,6 @@ def export_fossagrim_treatment(read_from_file, write_to_file, this_stand_only=No
     if table is None:
         return None
 
-    # write to file, but only header lines
-    write_csv_file(
-        write_to_file,
-        heureka_treatment_keys,
-        heureka_treatment_desc,
-        append=False
-    )
-
     notes = [''] * len(table[stand_id_key])
 
     if (average_over is not None) and isinstance(average_over, dict):  # export averaged stands
@@ -834,39 +1744,36 @@ def export_fossagrim_treatment(read_from_file, write_to_file, this_stand_only=No
             'Area weighted average for {} of stands {}'.format(_key, ', '.join([str(_x) for _x in average_over[_key]]))
             for _key in list(average_over.keys())]
 
-    for i, stand_id in enumerate(table[stand_id_key]):
-        if (table['Bonitering\ntreslag'][i] in ['Uproduktiv', '-']):  # or np.isnan(table['HovedNr'][i]):
-            continue
-        if (this_stand_only is not None) and (this_stand_only != stand_id):
-            continue
-        # Write the final felling at year 0 with subsequent planting
-        write_csv_file(
-            write_to_file, heureka_treatment_keys, heureka_treatment_desc, append=True,
-            StandId=table['Fossagrim ID'][i], Year=0,
-            Treatment='FinalFelling', Note=notes[i]
-        )
-        write_csv_file(
-            write_to_file, heureka_treatment_keys, heureka_treatment_desc, append=True,
-            StandId=table['Fossagrim ID'][i], Year=2,
-            Treatment='Planting', PlantDensity=table['Plantetetthet'][i] * 10., Note=notes[i]
-        )
-        # write the thinning
-        write_csv_file(
-            write_to_file, heureka_treatment_keys, heureka_treatment_desc, append=True,
-            StandId=table['Fossagrim ID'][i], Year=table['Tynnings år'][i],
-            Treatment='Thinning', Note=notes[i]
-        )
-        # And the next final felling with subsequent planting
-        write_csv_file(
-            write_to_file, heureka_treatment_keys, heureka_treatment_desc, append=True,
-            StandId=table['Fossagrim ID'][i], Year=table['Rotasjonsperiode'][i],
-            Treatment='FinalFelling', Note=notes[i]
-        )
-        write_csv_file(
-            write_to_file, heureka_treatment_keys, heureka_treatment_desc, append=True,
-            StandId=table['Fossagrim ID'][i], Year=table['Rotasjonsperiode'][i] + 2,
-            Treatment='Planting', PlantDensity=table['Plantetetthet'][i] * 10., Note=notes[i]
-        )
+    # the header lines are written when the file is opened
+    with HeurekaCsvWriter(write_to_file, heureka_treatment_keys, heureka_treatment_desc) as writer:
+        for i, stand_id in enumerate(table[stand_id_key]):
+            if (table['Bonitering\ntreslag'][i] in ['Uproduktiv', '-']):  # or np.isnan(table['HovedNr'][i]):
+                continue
+            if (this_stand_only is not None) and (this_stand_only != stand_id):
+                continue
+            # Write the final felling at year 0 with subsequent planting
+            writer.write_row(
+                StandId=table['Fossagrim ID'][i], Year=0,
+                Treatment='FinalFelling', Note=notes[i]
+            )
+            writer.write_row(
+                StandId=table['Fossagrim ID'][i], Year=2,
+                Treatment='Planting', PlantDensity=table['Plantetetthet'][i] * 10., Note=notes[i]
+            )
+            # write the thinning
+            writer.write_row(
+                StandId=table['Fossagrim ID'][i], Year=table['Tynnings år'][i],
+                Treatment='Thinning', Note=notes[i]
+            )
+            # And the next final felling with subsequent planting
+            writer.write_row(
+                StandId=table['Fossagrim ID'][i], Year=table['Rotasjonsperiode'][i],
+                Treatment='FinalFelling', Note=notes[i]
+            )
+            writer.write_row(
+                StandId=table['Fossagrim ID'][i], Year=table['Rotasjonsperiode'][i] + 2,
+                Treatment='Planting', PlantDensity=table['Plantetetthet'][i] * 10., Note=notes[i]
+            )
 
 
 def read_fossagrim_treatment(
@@ -899,7 +1806,7 @@ def read_fossagrim_treatment(
     return [thinning_year, final_felling_year, plant_density]
 
 
-def get_active_forests_from_stand(stand_file, stand_id_key=None, header=None, sheet_name=None):
+def get_active_forests_from_stand(stand_file, stand_id_key=None, header=None, sheet_name=None, table=None):
     """
     Reads the stand file ("Bestandsutvalg") and finds out which forest stands are active and should be included,
     their (dominant) wood species, and their respective active area and the
@@ -908,6 +1815,9 @@ def get_active_forests_from_stand(stand_file, stand_id_key=None, header=None, sh
     :param stand_id_key:
     :param header:
     :param sheet_name:
+    :param table:
+        pd.DataFrame
+        Stand data already read from stand_file, in which case the file is not read again
     :return:
     """
     if stand_id_key is None:
@@ -917,7 +1827,8 @@ def get_active_forests_from_stand(stand_file, stand_id_key=None, header=None, sh
     if header is None:
         header = 7
 
-    table = read_excel(stand_file, header, sheet_name)
+    if table is None:
+        table = read_excel(stand_file, header, sheet_name)
     if table is None:
         print('WARNING, stands could not be loaded from {}'.format(stand_file))
         return None
@@ -1017,7 +1928,7 @@ def get_kwargs_from_stand_OLD(stand_file, project_settings_file, project_tag):
     return kwargs, combine_fractions
 
 
-def get_kwargs_from_stand(stand_file, project_settings_file, project_tag):
+def get_kwargs_from_stand(stand_file, project_settings_file, project_tag, link_settings=True):
     """
     Extracts necessary information from stand_file and project_settings_file to feed modify_monetization_file()
     :param stand_file:
@@ -1029,6 +1940,12 @@ def get_kwargs_from_stand(stand_file, project_settings_file, project_tag):
     :param project_tag:
         str
         Name tag that identifies the current project, e.g. "FHF23-007"
+    :param link_settings:
+        bool
+        If True, the project settings are returned as links to the project settings file, so that the monetization
+        file follows changes in the project settings.
+        If False, the values of the project settings are returned, as needed by the monetization model in
+        Fossagrim.utils.monetization_model
     :return:
         dict, list
         kwargs: Dictionary of kwargs needed by modify_monetization_file()
@@ -1084,6 +2001,9 @@ def get_kwargs_from_stand(stand_file, project_settings_file, project_tag):
         raise TypeError(error)
 
     for _key in list(_kwarg_direct_keys.keys()):
+        if not link_settings:
+            kwargs[_key] = p_tabl[_key][i]
+            continue
         # kwargs[_key] = "='C:\\Users\\marte\\OneDrive - Fossagrim AS\\Prosjektskoger\\[ProjectForestsSettings – WIP.xlsx]Settings'!${}${}".format(
         #     _kwarg_direct_keys[_key], i+3)  # +3 because 2 header lines and python starts counting at 0
         # Using the absolut path makes the linking works easier, but makes it difficult to share the file
@@ -1101,84 +2021,48 @@ def get_kwargs_from_stand(stand_file, project_settings_file, project_tag):
     return kwargs, combine_fractions
 
 
-def modify_monetization_file(write_to_file, **_kwargs):
-    from openpyxl.workbook.defined_name import DefinedName
-
-    with pd.ExcelWriter(write_to_file, mode='a', if_sheet_exists='overlay', engine='openpyxl') as writer:
-        parameters.to_excel(
-            writer, sheet_name='Parameters', startcol=0, startrow=1, index=False, header=False)
-        calculation_part1.to_excel(
-            writer, sheet_name='Monetization', startcol=0, startrow=0, index=False, header=False)
-        resampled_section.to_excel(
-            writer, sheet_name='Monetization', startcol=24, startrow=0, index=False, header=False)
-        money_value.to_excel(
-            writer, sheet_name='Monetization', startcol=30, startrow=1, index=False, header=False)
-        cbo_flow.to_excel(
-            writer, sheet_name='Monetization', startcol=35, startrow=1, index=False, header=False)
-        project_benefits.to_excel(
-            writer, sheet_name='Monetization', startcol=39, startrow=1, index=False, header=False)
-        buffer.to_excel(
-            writer, sheet_name='Monetization', startcol=49, startrow=2, index=False, header=False)
-        fossagrim_values.to_excel(
-            writer, sheet_name='Monetization', startcol=55, startrow=1, index=False, header=False)
-        forest_owner_values.to_excel(
-            writer, sheet_name='Monetization', startcol=66, startrow=1, index=False, header=False)
-
-    # Modify monetization file with constants kwargs
-    wb = openpyxl.load_workbook(write_to_file)
-
-    ws = wb['Monetization']
-    ws['F1'].value = _kwargs['Position of total area'] / 10.  # from mål to Ha
-    ws['AF3'].value = _kwargs['Position of Batch 1 total volume']
-    ws['AG3'].value = _kwargs['Position of Batch 2 total volume']
-    ws['AI3'].value = _kwargs['Position of Batch 1 total volume'] + _kwargs['Position of Batch 2 total volume'] + \
-                      _kwargs['Position of passive forest total volume']
-    ws['AF5'].value = _kwargs['Batch 1 start date']
-    ws['AG6'].value = _kwargs['Batch 2 delay']
-    ws['AF8'].value = _kwargs['Root net']
-    ws['AN4'].value = _kwargs['Contract length']
-    ws['AO4'].value = _kwargs['Rent']
-    ws['AP4'].value = _kwargs['Price growth']
-    ws['AX4'].value = _kwargs['Buffer']
-    ws['AY4'].value = _kwargs['Reserve years']
-    ws['BH8'].value = _kwargs['Net price']
-    ws['BI8'].value = _kwargs['Gross price']
-    ws['BP3'].value = _kwargs['NIBOR 10yr']
-
-    wb.save(write_to_file)
+# Position (start column, start row) of each template block in the Monetization sheet
+def _monetization_template_blocks():
+    from Fossagrim.utils.monetization_parameters import calculation_part1, resampled_section, money_value, \
+        cbo_flow, project_benefits, buffer, fossagrim_values, forest_owner_values
+    return [
+        (calculation_part1, 0, 0),
+        (resampled_section, 24, 0),
+        (money_value, 30, 1),
+        (cbo_flow, 35, 1),
+        (project_benefits, 39, 1),
+        (buffer, 49, 2),
+        (fossagrim_values, 55, 1),
+        (forest_owner_values, 66, 1)
+    ]
 
-    style_monetization_file(write_to_file)
 
-    # Create defined name (name manager) using openpyxl
-    wb = openpyxl.load_workbook(write_to_file)
-    hpap = openpyxl.workbook.defined_name.DefinedName("hpap", attr_text='Parameters!$B$2')
-    wb.defined_names.add(hpap)
-    hsawn = openpyxl.workbook.defined_name.DefinedName("hsawn", attr_text='Parameters!$B$3')
-    wb.defined_names.add(hsawn)
-    sfsawn = openpyxl.workbook.defined_name.DefinedName("SFsawn", attr_text='Parameters!$B$4')
-    wb.defined_names.add(sfsawn)
-    sfpp = openpyxl.workbook.defined_name.DefinedName("SFpp", attr_text='Parameters!$B$5')
-    wb.defined_names.add(sfpp)
-    sffuel = openpyxl.workbook.defined_name.DefinedName("SFfuel", attr_text='Parameters!$B$6')
-    wb.defined_names.add(sffuel)
-    p = openpyxl.workbook.defined_name.DefinedName("p", attr_text='Parameters!$B$7')
-    wb.defined_names.add(p)
-    pp = openpyxl.workbook.defined_name.DefinedName("pp", attr_text='Parameters!$B$8')
-    wb.defined_names.add(pp)
-    pf = openpyxl.workbook.defined_name.DefinedName("pf", attr_text='Parameters!$B$9')
-    wb.defined_names.add(pf)
-    psfuel = openpyxl.workbook.defined_name.DefinedName("psfuel", attr_text='Parameters!$B$10')
-    wb.defined_names.add(psfuel)
-    k = openpyxl.workbook.defined_name.DefinedName("k", attr_text='Parameters!$B$11')
-    wb.defined_names.add(k)
-    wb.save(write_to_file)
+# Names (name manager) defined in the monetization file
+monetization_defined_names = {
+    'hpap': 'Parameters!$B$2',
+    'hsawn': 'Parameters!$B$3',
+    'SFsawn': 'Parameters!$B$4',
+    'SFpp': 'Parameters!$B$5',
+    'SFfuel': 'Parameters!$B$6',
+    'p': 'Parameters!$B$7',
+    'pp': 'Parameters!$B$8',
+    'pf': 'Parameters!$B$9',
+    'psfuel': 'Parameters!$B$10',
+    'k': 'Parameters!$B$11'
+}
 
 
-def style_monetization_file(write_to_file):
-    from openpyxl.styles import NamedStyle
-    from openpyxl.styles import PatternFill
-    from openpyxl.styles import Alignment
-    from openpyxl.styles import Font
+def monetization_styles():
+    """
+    Returns the styling of the Monetization sheet as a list of (list of cell ranges, style) pairs, which are applied in
+    the given order. Each style is a dictionary with one or more of the keys:
+        'number_format': str
+        'fill': hex color string, or None for no fill
+        'border': 'thin'
+        'bold': bool
+        'merge': bool, merges each cell range, and centers (and bolds) its content
+    Used by both style_monetization_file() and build_monetization_file()
+    """
     from Fossagrim.utils.definitions import standard_colors as scrs
 
     colors = {
@@ -1196,64 +2080,244 @@ def style_monetization_file(write_to_file):
         scrs['cbo_1'].replace('#', ''): ['AJ1:AM110']
     }
 
-    # Create named styles
-    date_style = NamedStyle(name='date_style', number_format='YYYY-MM-DD')
+    styles = [
+        (['AF5', 'AG5', 'AK4', 'AL4'], {'number_format': 'YYYY-MM-DD'}),
+        (['AF4', 'AG4', 'AH4', 'AI4', 'AK3', 'AL3', 'AM3', 'AO4', 'AP4', 'AQ4', 'AX4', 'BM2', 'BP3'],
+         {'number_format': '0.0%'}),
+        (['BK8:BK108', 'BT8:BT108'], {'number_format': '0.0%'}),
+        (['BQ7:BS108'], {'number_format': 'kr #, ##0'})
+    ]
+    for color in list(colors.keys()):
+        styles.append((colors[color], {'fill': color}))
+    styles += [
+        (['A5', 'B5', 'F1', 'F2', 'AF3', 'AG3', 'AI3', 'AF5', 'AF8', 'AG6', 'AN4', 'AO4', 'AP4',
+          'AQ4', 'AT4', 'AX4', 'AY4', 'BH8', 'BI8', 'BP3'], {'fill': None, 'border': 'thin'}),
+        (['C8:C50', 'P8:P50', 'H4:W5', 'BH9:BI50', 'BO6:BT50', 'BO2:BO2', 'BQ3:BR3'], {'border': 'thin'}),
+        (['BP7:BR7'], {'bold': True}),
+        (['H1:O1', 'P1:Q1', 'R1:W1', 'Y1:AB1', 'AC1:AD1',
+          'H4:K4', 'L4:O4', 'BG4:BL4', 'BO2:BT2', 'BQ3:BQ5', 'BR3:BT5'], {'merge': True})
+    ]
+    return styles
+
+
+def _apply_monetization_styles(ws):
+    """
+    Applies monetization_styles() to an openpyxl worksheet
+    """
+    from openpyxl.styles import PatternFill
+    from openpyxl.styles import Alignment
+    from openpyxl.styles import Font
+
     no_fill = openpyxl.styles.PatternFill(fill_type=None)
-    no_side = openpyxl.styles.Side(border_style=None)
     side = openpyxl.styles.Side(border_style='thin')
-    no_border = openpyxl.styles.borders.Border(left=no_side, right=no_side, top=no_side, bottom=no_side)
     all_border = openpyxl.styles.borders.Border(left=side, right=side, top=side, bottom=side)
 
+    for ranges, style in monetization_styles():
+        for rng in ranges:
+            if style.get('merge', False):
+                ws.merge_cells(rng)
+                ws[rng.split(':')[0]].alignment = Alignment(horizontal='center', vertical='center')
+                ws[rng.split(':')[0]].font = Font(bold=True)
+                continue
+            cells = ws[rng] if ':' in rng else ((ws[rng],),)
+            for my_row in cells:
+                for my_cell in my_row:
+                    if style.get('number_format') == 'YYYY-MM-DD':
+                        my_cell.style = 'date_style'
+                    elif 'number_format' in style:
+                        my_cell.number_format = style['number_format']
+                    if 'fill' in style:
+                        my_cell.fill = no_fill if style['fill'] is None else \
+                            PatternFill(patternType='solid', fgColor=style['fill'])
+                    if 'border' in style:
+                        my_cell.border = all_border
+                    if style.get('bold', False):
+                        my_cell.font = Font(bold=True)
+
+
+def _add_monetization_content(writer, **_kwargs):
+    """
+    Writes the template blocks, constants, styles and defined names of the monetization file, using an open
+    pandas ExcelWriter (with the openpyxl engine) of an existing monetization file
+    """
+    from openpyxl.workbook.defined_name import DefinedName
+    from openpyxl.styles import NamedStyle
+
+    parameters.to_excel(
+        writer, sheet_name='Parameters', startcol=0, startrow=1, index=False, header=False)
+    for template, start_col, start_row in _monetization_template_blocks():
+        template.to_excel(
+            writer, sheet_name='Monetization', startcol=start_col, startrow=start_row, index=False, header=False)
+
+    # Modify monetization file with constants kwargs
+    wb = writer.book
+    ws = wb['Monetization']
+    for _pos, value in monetization_constants(**_kwargs).items():
+        ws[_pos].value = value
+
+    if 'date_style' not in wb.named_styles:
+        wb.add_named_style(NamedStyle(name='date_style', number_format='YYYY-MM-DD'))
+    _apply_monetization_styles(ws)
+
+    # Create defined name (name manager) using openpyxl
+    for name, attr_text in monetization_defined_names.items():
+        wb.defined_names.add(DefinedName(name, attr_text=attr_text))
+
+
+def modify_monetization_file(write_to_file, **_kwargs):
+    """
+    Adds the monetization calculations to an existing monetization file, which contains the sheets
+    'Rearranged results', 'Parameters' and 'Monetization'. The file is loaded and saved once.
+    See build_monetization_file() to create a new monetization file in one pass
+
+    :param write_to_file:
+        str
+        Full path name of monetization file
+    :param _kwargs:
+        Dictionary of kwargs as returned by get_kwargs_from_stand()
+    """
+    with pd.ExcelWriter(write_to_file, mode='a', if_sheet_exists='overlay', engine='openpyxl') as writer:
+        _add_monetization_content(writer, **_kwargs)
+
+
+def style_monetization_file(write_to_file):
+    from openpyxl.styles import NamedStyle
+
+    # Create named styles
+    date_style = NamedStyle(name='date_style', number_format='YYYY-MM-DD')
+
     wb = openpyxl.load_workbook(write_to_file)
 
     # add the styles
     wb.add_named_style(date_style)
 
     ws = wb['Monetization']
+    _apply_monetization_styles(ws)
 
-    for _pos in ['AF5', 'AG5', 'AK4', 'AL4']:
-        ws[_pos].style = 'date_style'
-    for _pos in ['AF4', 'AG4', 'AH4', 'AI4', 'AK3', 'AL3', 'AM3', 'AO4', 'AP4', 'AQ4', 'AX4', 'BM2', 'BP3']:
-        ws[_pos].number_format = '0.0%'
-    for _row in np.arange(8, 109):
-        ws['BK{}'.format(_row)].number_format = '0.0%'
-        ws['BT{}'.format(_row)].number_format = '0.0%'
-    for _row in np.arange(7, 109):
-        ws['BQ{}'.format(_row)].number_format = 'kr #, ##0'
-        ws['BR{}'.format(_row)].number_format = 'kr #, ##0'
-        ws['BS{}'.format(_row)].number_format = 'kr #, ##0'
+    wb.save(write_to_file)
 
-    for color in list(colors.keys()):
-        for my_pos in colors[color]:
-            for my_row in ws[my_pos]:
-                for my_cell in my_row:
-                    my_cell.fill = PatternFill(patternType='solid', fgColor=color)
 
-    for my_cell_pos in ['A5', 'B5', 'F1', 'F2', 'AF3', 'AG3', 'AI3', 'AF5', 'AF8', 'AG6', 'AN4', 'AO4', 'AP4',
-                        'AQ4', 'AT4', 'AX4', 'AY4', 'BH8', 'BI8', 'BP3']:
-        ws[my_cell_pos].fill = no_fill
-        ws[my_cell_pos].border = all_border
+def _cell_to_row_col(cell):
+    """
+    Returns zero indexed (row, column) of an Excel cell position, e.g. 'B3' -> (2, 1)
+    """
+    from openpyxl.utils.cell import coordinate_to_tuple
+    row, col = coordinate_to_tuple(cell)
+    return row - 1, col - 1
 
-    for rng in ['C8:C50', 'P8:P50', 'H4:W5', 'BH9:BI50', 'BO6:BT50', 'BO2:BO2', 'BQ3:BR3']:
-        for my_row in ws[rng]:
-            for my_cell in my_row:
-                my_cell.border = all_border
 
-    for rng in ['BP7:BR7']:
-        for my_row in ws[rng]:
-            for my_cell in my_row:
-                my_cell.font = Font(bold=True)
+def _range_to_cells(rng):
+    """
+    Returns zero indexed (first row, first column, last row, last column) of an Excel range, e.g. 'A1:B3'
+    """
+    first, last = (rng.split(':') + [rng])[:2]
+    return _cell_to_row_col(first) + _cell_to_row_col(last)
 
-    for rng in ['H1:O1', 'P1:Q1', 'R1:W1', 'Y1:AB1', 'AC1:AD1',
-                'H4:K4', 'L4:O4', 'BG4:BL4', 'BO2:BT2', 'BQ3:BQ5', 'BR3:BT5']:
-        ws.merge_cells(rng)
-        ws[rng.split(':')[0]].alignment = Alignment(horizontal='center', vertical='center')
-        ws[rng.split(':')[0]].font = Font(bold=True)
 
-    wb.save(write_to_file)
+def build_monetization_file(write_to_file, blocks, sheet_name=None, **_kwargs):
+    """
+    Creates a complete monetization file in one pass using xlsxwriter, with the sheets 'Rearranged results',
+    'Parameters' and 'Monetization', i.e. the same file as created by rearrange_raw_heureka_results() followed
+    by modify_monetization_file().
+    Since xlsxwriter does not support named styles, dates are formatted directly with the 'YYYY-MM-DD' format
+
+    :param write_to_file:
+        str
+        Full path name of monetization file, an existing file is overwritten
+    :param blocks:
+        list
+        List of (<NAME OF BLOCK>, <pandas DataFrame>, <START COLUMN>) tuples with the combined results that are
+        written to the 'Rearranged results' sheet. See write_rearranged_results()
+    :param sheet_name:
+        str
+        Name of sheet with rearranged results, default 'Rearranged results'
+    :param _kwargs:
+        Dictionary of kwargs as returned by get_kwargs_from_stand()
+    """
+    if sheet_name is None:
+        sheet_name = 'Rearranged results'
+
+    # Collect all cell values of the Monetization sheet
+    values = {}
+    for template, start_col, start_row in _monetization_template_blocks():
+        for _i, row in enumerate(template.itertuples(index=False)):
+            for _j, value in enumerate(row):
+                values[(start_row + _i, start_col + _j)] = value
+    for _pos, value in monetization_constants(**_kwargs).items():
+        values[_cell_to_row_col(_pos)] = value
+
+    # Collect the style of each cell, and the merged ranges
+    cell_styles = {}
+    merges = []
+    for ranges, style in monetization_styles():
+        for rng in ranges:
+            first_row, first_col, last_row, last_col = _range_to_cells(rng)
+            if style.get('merge', False):
+                merges.append((first_row, first_col, last_row, last_col))
+                top_left = cell_styles.setdefault((first_row, first_col), {})
+                top_left.update({'align': 'center', 'valign': 'vcenter', 'bold': True})
+                continue
+            for _r in range(first_row, last_row + 1):
+                for _c in range(first_col, last_col + 1):
+                    cell_styles.setdefault((_r, _c), {}).update(style)
+
+    with pd.ExcelWriter(write_to_file, engine='xlsxwriter') as writer:
+        wb = writer.book
+        for _sheet in [sheet_name, 'Parameters', 'Monetization']:
+            wb.add_worksheet(_sheet)
+
+        for header, table, start_col in blocks:
+            table.to_excel(writer, sheet_name=sheet_name, startcol=start_col, startrow=2)
+        for header, table, start_col in blocks:
+            wb.get_worksheet_by_name(sheet_name).write(0, start_col, header)
+
+        parameters.to_excel(
+            writer, sheet_name='Parameters', startcol=0, startrow=1, index=False, header=False)
+
+        formats = {}
+
+        def get_format(_style):
+            if _style is None:
+                return None
+            properties = {}
+            if 'number_format' in _style:
+                properties['num_format'] = _style['number_format']
+            if _style.get('fill') is not None:
+                properties['pattern'] = 1
+                properties['fg_color'] = '#' + _style['fill']
+            if 'border' in _style:
+                properties['border'] = 1
+            for _key in ['bold', 'align', 'valign']:
+                if _key in _style:
+                    properties[_key] = _style[_key]
+            _key = tuple(sorted(properties.items()))
+            if _key not in formats:
+                formats[_key] = wb.add_format(properties)
+            return formats[_key]
+
+        ws = wb.get_worksheet_by_name('Monetization')
+        merged_cells = set()
+        for first_row, first_col, last_row, last_col in merges:
+            value = values.get((first_row, first_col), '')
+            ws.merge_range(first_row, first_col, last_row, last_col,
+                           '' if value is None else value, get_format(cell_styles[(first_row, first_col)]))
+            merged_cells.update((_r, _c) for _r in range(first_row, last_row + 1)
+                                for _c in range(first_col, last_col + 1))
+
+        for _pos in sorted(set(values) | set(cell_styles)):
+            if _pos in merged_cells:
+                continue
+            value = values.get(_pos, '')
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                value = ''
+            ws.write(_pos[0], _pos[1], value, get_format(cell_styles.get(_pos)))
+
+        for name, attr_text in monetization_defined_names.items():
+            wb.define_name(name, '={}'.format(attr_text))
 
 
 def qc_plots(monetization_file, project_tag, plot_dir=None):
+    import matplotlib.pyplot as plt
     from Fossagrim.utils.definitions import standard_colors as scrs
     from Fossagrim.utils.definitions import standard_linestyles as sls
     from Fossagrim.utils.definitions import standard_linewidths as slw
@@ -1381,7 +2445,7 @@ def qc_plots(monetization_file, project_tag, plot_dir=None):
     # farmed_offsets()
 
 
-def get_nature_and_climate_effect(result_file, stand_id, average_years=None, verbose=False):
+def get_nature_and_climate_effect(result_file, stand_id, average_years=None, verbose=False, use_sidecar=False):
     """
     Calculates the difference in predefined climate and nature parameters, between PRES and BAU,
     and integrates the result over the given number of years
@@ -1393,6 +2457,9 @@ def get_nature_and_climate_effect(result_file, stand_id, average_years=None, ver
     :param average_years:
          int
          Number of years to calculate the integrated effect over
+    :param use_sidecar:
+        bool
+        If True, the raw results are read through the sidecar file. See read_raw_heureka_tables()
     """
     if average_years is None:
         average_years = 30
@@ -1405,8 +2472,16 @@ def get_nature_and_climate_effect(result_file, stand_id, average_years=None, ver
     pres = None
     bau = None
 
+    # Look up the sheets in the sheet index, so that a stand without results doesn't cost a parse of the workbook
+    index = HeurekaSheetIndex(result_file)
+    pres_sheet = index.find(stand_id, 'PRES')
+    bau_sheet = index.find(stand_id, 'BAU')
+    if pres_sheet is None or bau_sheet is None:
+        print('No PRES and BAU sheets for stand {} in {}'.format(stand_id, os.path.basename(result_file)))
+        return None, None, None
+
     try:
-        pres = read_raw_heureka_results(result_file, '{} {}'.format(stand_id, 'PRES'), verbose=verbose)
+        pres = read_raw_heureka_results(result_file, pres_sheet, verbose=verbose, use_sidecar=use_sidecar)
         if pres is None:
             raise ValueError('Missing Year variable')
     except ValueError as error:
@@ -1414,7 +2489,7 @@ def get_nature_and_climate_effect(result_file, stand_id, average_years=None, ver
         return None, None, None
 
     try:
-        bau = read_raw_heureka_results(result_file, '{} {}'.format(stand_id, 'BAU'), verbose=verbose)
+        bau = read_raw_heureka_results(result_file, bau_sheet, verbose=verbose, use_sidecar=use_sidecar)
         if bau is None:
             raise ValueError('Missing Year variable')
     except ValueError as error:
@@ -1460,6 +2535,156 @@ def get_nature_and_climate_effect(result_file, stand_id, average_years=None, ver
     return c_diff, d_diff, r_diff
 
 
+# Effects used by get_nature_and_climate_effects() and integrated_effects(), as the weight of each Heureka variable
+# in the difference PRES - BAU
+nature_and_climate_effects = OrderedDict([
+    ('Carbon effect', {'Total Carbon Stock (dead wood, soil, trees, stumps and roots)': 1., 'Soil Carbon Stock': -1.}),
+    ('Dead wood effect', {'Dead Standing Trees >=20cm': 1., 'Downed Deadwood >=20cm': 1.}),
+    ('Recreation effect', {'Recreation Index After': 1.})
+])
+
+
+def get_nature_and_climate_effects(result_file, stand_ids=None, average_years=None, use_sidecar=False):
+    """
+    Same as get_nature_and_climate_effect(), but for many stands at once. The PRES and BAU sheets of all stands are
+    read in one pass over the results file, and only the variables that are needed are kept
+
+    :param result_file:
+         str
+         Name of excel file that contain the "raw" Heureka results
+    :param stand_ids:
+        list
+        Stand ids to calculate the effects for. If None, all stands with a PRES and a BAU sheet are used
+    :param average_years:
+         int
+         Number of years to calculate the integrated effect over
+    :param use_sidecar:
+        bool
+        If True, the raw results are read through the sidecar file. See read_raw_heureka_tables()
+    :return:
+        pd.DataFrame
+        One row per stand id, with the columns 'Carbon effect', 'Dead wood effect' and 'Recreation effect'.
+        Effects that can not be calculated (missing sheets or variables) are NaN.
+        Use .to_numpy() to get the stands x effects array
+    """
+    if average_years is None:
+        average_years = 30
+    effects = integrated_effects(result_file, [average_years], stand_ids=stand_ids, use_sidecar=use_sidecar)
+    return effects[average_years].rename_axis(columns=None)
+
+
+def integrated_effects(result_file, windows=None, stand_ids=None, metrics=None, integration=None,
+                       use_sidecar=False):
+    """
+    Integrates the difference between PRES and BAU of the nature and climate effects over several windows
+    (number of years) at once. The sheets are read once, and the cumulative integral of each stand and effect is
+    calculated once, so each window is just a look-up in the cumulative arrays.
+
+    :param result_file:
+         str
+         Name of excel file that contain the "raw" Heureka results
+    :param windows:
+        list
+        Number of years to integrate the effects over, default [10, 30, 50, 100]. Windows longer than the simulation
+        are integrated over the whole simulation
+    :param stand_ids:
+        list
+        Stand ids to calculate the effects for. If None, all stands with a PRES and a BAU sheet are used
+    :param metrics:
+        list
+        Names of effects in nature_and_climate_effects, or names of Heureka variables, whose difference is integrated.
+        Default is all the effects in nature_and_climate_effects
+    :param integration:
+        str
+        'periods' (default): the sum over the first floor(window / 5) periods, as in get_nature_and_climate_effect()
+        'trapezoid': the trapezoidal integral (in units of value times years) of the annual series, resampled
+        following the rotations by utils.interpolate.resample_heureka_tables()
+    :param use_sidecar:
+        bool
+        If True, the raw results are read through the sidecar file. See read_raw_heureka_tables()
+    :return:
+        pd.DataFrame
+        One row per stand id, and one column per (window, metric). Effects that can not be calculated (missing
+        sheets or variables) are NaN. Use result[window] to get the effects of one window, and
+        result.to_numpy().reshape(len(stand_ids), len(windows), len(metrics)) to get the stands x windows x metrics
+        cube
+    """
+    if windows is None:
+        windows = [10, 30, 50, 100]
+    if metrics is None:
+        metrics = list(nature_and_climate_effects.keys())
+    if integration is None:
+        integration = 'periods'
+    if integration not in ['periods', 'trapezoid']:
+        raise ValueError('Unknown integration {}, use periods or trapezoid'.format(integration))
+    weights = [nature_and_climate_effects.get(_metric, {_metric: 1.}) for _metric in metrics]
+    variables = list(dict.fromkeys([_x for _weights in weights for _x in _weights]))
+    if integration == 'trapezoid':
+        # the years and treatments are needed to resample the periods following the rotations
+        variables += ['Year', 'Treatment']
+
+    index = HeurekaSheetIndex(result_file)
+    if stand_ids is None:
+        stand_ids = index.stand_ids()
+    sheet_pairs = {}
+    for stand_id in stand_ids:
+        sheet_pairs[stand_id] = index.find_pair(stand_id)
+        if sheet_pairs[stand_id] is None:
+            print('WARNING No PRES and BAU results for stand {} in {}'.format(stand_id, os.path.basename(result_file)))
+    found = list(dict.fromkeys([_x for _x in sheet_pairs.values() if _x is not None]))
+
+    sheets = [_x for _pair in found for _x in _pair]
+    tables = {}
+    if len(sheets) > 0:
+        tables = read_raw_heureka_results_from_sheets(
+            result_file, sheets, read_only_these_variables=variables, exact_match=True,
+            use_sidecar=use_sidecar, streaming=not use_sidecar)
+    step = 5.  # Heureka runs the simulation using timesteps which are 5 years long
+    if integration == 'trapezoid':
+        from Fossagrim.utils.interpolate import resample_heureka_tables
+        step = 1.
+        tables = resample_heureka_tables({_x: _table for _x, _table in tables.items() if _table is not None})
+
+    # The difference PRES - BAU of each (stand, metric, time step), zero after the end of the shortest simulation
+    n_steps = max([len(_x) for _x in tables.values() if _x is not None] + [1])
+    diff = np.zeros((len(found), len(metrics), n_steps))
+    for _i, pair in enumerate(found):
+        pres, bau = [tables.get(_x, None) for _x in pair]
+        for _j, _weights in enumerate(weights):
+            if pres is None or bau is None or not all(_x in pres and _x in bau for _x in _weights):
+                diff[_i, _j] = np.nan
+                continue
+            for variable, weight in _weights.items():
+                _x = weight * (np.asarray(pres[variable].values, dtype=float) -
+                               np.asarray(bau[variable].values, dtype=float))
+                _n = min(len(pres), len(bau))
+                diff[_i, _j, :_n] += _x[:_n]
+
+    # Cumulative integral at the end of each time step, starting with 0. at the start of the simulation
+    cumulative = np.zeros(diff.shape[:2] + (n_steps + 1,))
+    if integration == 'periods':
+        cumulative[..., 1:] = np.cumsum(diff, axis=-1)
+        positions = [min(np.floor(_w / step), n_steps) for _w in windows]
+    else:
+        # the annual series are values at the start of each year, so the integral is known up to the last year
+        cumulative[..., 2:] = np.cumsum(0.5 * (diff[..., 1:] + diff[..., :-1]) * step, axis=-1)
+        positions = [min(_w / step, n_steps - 1) + 1 for _w in windows]
+    # linear interpolation between the steps, for windows that are not a whole number of steps
+    below = np.floor(positions).astype(int)
+    above = np.minimum(below + 1, n_steps)
+    fraction = np.asarray(positions) - below
+    effects = cumulative[..., below] * (1. - fraction) + cumulative[..., above] * fraction
+
+    # Rows are returned in the order of the given stand ids, including any duplicates
+    rows = {_x: _i for _i, _x in enumerate(found)}
+    result = np.full((len(stand_ids), len(windows), len(metrics)), np.nan)
+    for _i, stand_id in enumerate(stand_ids):
+        if sheet_pairs[stand_id] is not None:
+            result[_i] = effects[rows[sheet_pairs[stand_id]]].T
+    columns = pd.MultiIndex.from_product([list(windows), list(metrics)], names=['Window', 'Metric'])
+    return pd.DataFrame(result.reshape(len(stand_ids), -1), index=list(stand_ids), columns=columns)
+
+
 def get_carbon_effect(result_file, stand_id,
                       average_years=None,
                       variable="Total Carbon Stock (dead wood, soil, trees, stumps and roots)",
@@ -1487,6 +2712,7 @@ def get_carbon_effect(result_file, stand_id,
         Integrated effect of chosen parameter (variable) over <average_years> years for the given forest stand
         (project_tag) and wood_species
     """
+    import Fossagrim.plotting.misc_plots as fpp
     if average_years is None:
         average_years = 30
     try:
@@ -1539,12 +2765,9 @@ def collect_all_stand_data(
     if out_file is None:
         raise IOError('Name of output file must be given')
 
-    # Creates a new Heureka compatible csv file for storing the data
-    if not dry_run:
-        write_csv_file(out_file, heureka_standdata_keys, heureka_standdata_desc, append=False)
-
     file_list = Path(base_dir).rglob('*Averaged stand data.csv')
-    with open(out_file, 'a') as _out:  # append
+    # Creates a new Heureka compatible csv file for storing the data, except in a dry run
+    with HeurekaCsvWriter(out_file, heureka_standdata_keys, heureka_standdata_desc, append=dry_run) as _out:
         for stand_file in file_list:
             print('Working on {}'.format(stand_file.name))
             # see if there is a related Heureka results file
@@ -1554,30 +2777,164 @@ def collect_all_stand_data(
             else:
                 continue
 
-            with open(stand_file, 'r') as _in:
-                for line in _in.readlines():
-                    split_line = line.split(';')
-                    if 'FHF' in split_line[0]:
-                        print('  Searching for stand id: {}'.format(split_line[0]))
-                        carbon_effect, dead_wood_effect, recreation_effect = get_nature_and_climate_effect(
-                            heureka_result_file,
-                            split_line[0]
-                        )
-                        if carbon_effect is None:
-                            alt_stand_id = split_line[0].replace('Avg Stand-', '')
-                            print('  Searching for alternative stand id: {}'.format(alt_stand_id))
-                            carbon_effect, dead_wood_effect, recreation_effect = get_nature_and_climate_effect(
-                                heureka_result_file,
-                                alt_stand_id
-                            )
-                        print('  ', carbon_effect)
-                        split_line[101] = my_str(carbon_effect)
-                        split_line[102] = my_str(dead_wood_effect)
-                        split_line[103] = my_str(recreation_effect)
-                        if not dry_run:
-                            _out.write(';'.join(split_line))
-                        else:
-                            print('   - Dry run')
+            lines = _collect_stand_lines(str(stand_file), heureka_result_file, verbose=True)
+            if not dry_run:
+                _out.write_lines(lines)
+            else:
+                print('   - Dry run')
+
+
+def _collect_stand_lines(stand_file, heureka_result_file, verbose=False, average_years=None):
+    """
+    Returns the lines of the averaged stand data file, which belong to Fossagrim stands, with the nature and climate
+    effects of each stand filled in, as used by collect_all_stand_data()
+    """
+    with open(stand_file, 'r') as _in:
+        lines = [_line.split(';') for _line in _in.readlines()]
+    lines = [_line for _line in lines if 'FHF' in _line[0]]
+    if verbose:
+        print('  Searching for {} stand ids'.format(len(lines)))
+    effects = get_nature_and_climate_effects(heureka_result_file, [_line[0] for _line in lines],
+                                             average_years=average_years)
+    for split_line, effect in zip(lines, effects.to_numpy()):
+        if verbose:
+            print('  ', split_line[0], effect[0])
+        split_line[101:104] = [my_str(None if np.isnan(_x) else _x) for _x in effect]
+    return [';'.join(_line) for _line in lines]
+
+
+def file_fingerprint(filename, previous=None):
+    """
+    Returns the modification time, size and SHA1 of the file. The SHA1 is only calculated when the modification time
+    or size differs from the previous fingerprint
+    """
+    stat = os.stat(filename)
+    if previous is not None and previous['mtime_ns'] == stat.st_mtime_ns and previous['size'] == stat.st_size:
+        return previous
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': _file_sha1(filename)}
+
+
+# Version of the lines stored in the manifest file of update_all_stand_data(). Increase it when
+# _collect_stand_lines() changes, so that the lines of all projects are collected again
+stand_data_version = 1
+
+
+def update_all_stand_data(out_file, base_dir=None, manifest_file=None, n_processes=None, average_years=None,
+                          verbose=False):
+    """
+    Same as collect_all_stand_data(), but only the projects whose averaged stand data file or Heureka results file
+    has changed since the last run are processed. The collected lines of each project are stored in a manifest file,
+    together with the modification time, size and SHA1 of the two files, and the parameters of the nature and climate
+    effects. The projects that have to be processed are processed in a pool of processes.
+
+    A project that fails, e.g. because of a corrupt workbook, is skipped with a warning, and the lines of its last
+    successful run are kept. It is processed again on the next run.
+
+    The output file is rewritten on each run, with the projects in sorted order of the stand data file names, so the
+    result doesn't depend on which projects were processed in this run
+
+    :param out_file:
+        str
+        Full file name of output file
+    :param base_dir:
+        Path to directory where Heureka modelling results are stored (in sub folders of base_dir)
+    :param manifest_file:
+        str
+        Full file name of the manifest file. Default is "<out_file> manifest.json"
+    :param n_processes:
+        int
+        Number of processes used. If None, the projects are processed in this process
+    :param average_years:
+        int
+        Number of years to integrate the nature and climate effects over, see get_nature_and_climate_effects()
+    :param verbose:
+        bool
+    :return:
+        list
+        Stand data files that were successfully processed in this run
+    """
+    import json
+    from pathlib import Path
+    from concurrent.futures import ProcessPoolExecutor
+
+    if base_dir is None:
+        base_dir = "C:\\Users\\marte\\OneDrive - Fossagrim AS\\Prosjektskoger"
+    if manifest_file is None:
+        manifest_file = '{} manifest.json'.format(os.path.splitext(str(out_file))[0])
+    # The stored lines are only valid for the same effects, and are collected again when any of these change
+    params = json.loads(json.dumps({
+        'version': stand_data_version, 'effects': nature_and_climate_effects, 'average_years': average_years}))
+
+    manifest = {}
+    if os.path.isfile(manifest_file):
+        try:
+            with open(manifest_file, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as err_msg:
+            print('WARNING, could not read {}: {}'.format(os.path.basename(manifest_file), err_msg))
+
+    new_manifest = {}
+    to_process = []
+    for stand_file in sorted(str(_x) for _x in Path(base_dir).rglob('*Averaged stand data.csv')):
+        heureka_result_file = stand_file.replace('Averaged stand data.csv', 'Heureka results.xlsx')
+        if not os.path.isfile(heureka_result_file):
+            continue
+        previous = manifest.get(stand_file, {})
+        entry = {
+            'stand_file': file_fingerprint(stand_file, previous.get('stand_file')),
+            'result_file': file_fingerprint(heureka_result_file, previous.get('result_file')),
+            'params': params
+        }
+        if ('lines' in previous) and previous.get('params') == params and \
+                all(entry[_key]['sha1'] == previous[_key]['sha1'] for _key in ['stand_file', 'result_file']):
+            entry['lines'] = previous['lines']
+        else:
+            to_process.append((stand_file, heureka_result_file))
+        new_manifest[stand_file] = entry
+
+    if verbose:
+        print('{} of {} projects have changed'.format(len(to_process), len(new_manifest)))
+    results = {}
+    if n_processes is None or len(to_process) < 2:
+        for stand_file, heureka_result_file in to_process:
+            try:
+                results[stand_file] = _collect_stand_lines(stand_file, heureka_result_file,
+                                                           average_years=average_years)
+            except Exception as error:
+                results[stand_file] = error
+    else:
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            futures = {_x[0]: executor.submit(_collect_stand_lines, *_x, average_years=average_years)
+                       for _x in to_process}
+            for stand_file, future in futures.items():
+                try:
+                    results[stand_file] = future.result()
+                except Exception as error:
+                    results[stand_file] = error
+
+    processed = []
+    for stand_file, lines in results.items():
+        if isinstance(lines, Exception):
+            print('WARNING, skipping {}: {}: {}'.format(os.path.basename(stand_file), type(lines).__name__, lines))
+            # keep the lines of the last successful run, with their fingerprints, so the project is tried again
+            if 'lines' in manifest.get(stand_file, {}):
+                new_manifest[stand_file] = manifest[stand_file]
+            else:
+                _ = new_manifest.pop(stand_file)
+        else:
+            new_manifest[stand_file]['lines'] = lines
+            processed.append(stand_file)
+
+    with HeurekaCsvWriter(out_file, heureka_standdata_keys, heureka_standdata_desc) as _out:
+        for stand_file in new_manifest:
+            _out.write_lines(new_manifest[stand_file]['lines'])
+
+    # write to a temporary file first, so an interrupted write can't leave a corrupt manifest file
+    tmp_file = '{}.tmp'.format(manifest_file)
+    with open(tmp_file, 'w') as f:
+        json.dump(new_manifest, f)
+    os.replace(tmp_file, manifest_file)
+    return processed
 
 
 def collect_all_stand_data_OLD(
@@ -1602,6 +2959,7 @@ def collect_all_stand_data_OLD(
     if base_dir is None:
         base_dir = "C:\\Users\\marte\\OneDrive - Fossagrim AS\\Prosjektskoger"
 
+    import matplotlib.pyplot as plt
     if dry_run:
         # Create axes for plotting nothing
         fig, ax = plt.subplots()
@@ -1826,6 +3184,7 @@ class TestCases(unittest.TestCase):
         # wb.save(f)
 
     def test_get_carbon_effect(self):
+        import matplotlib.pyplot as plt
         # result_file = "C:\\Users\\marte\\OneDrive - Fossagrim AS\\Prosjektskoger\\FHF24-0016 Margrete Folsland\\FHF24-0016 Heureka results.xlsx"
         # project_tag = "FHF24-0016"
         # wood_species = "Pine"
@@ -1861,6 +3220,7 @@ class TestCases(unittest.TestCase):
                                dry_run=False)
 
     def test_read_rearranged_results(self):
+        import Fossagrim.plotting.misc_plots as fpp
         filename = "C:\\Users\\marte\\OneDrive - Fossagrim AS\\Prosjektskoger\\FHF24-0047 Åmli\\FHF24-0047 v02 Heureka results.xlsx"
         result = read_rearranged_heureka_results(filename)
         fpp.plot_raw_data(result['FHF24-0047 v02 Spruce BAU'], 'XXX', 'test',
@@ -10,6 +10,9 @@ import pandas as pd
 import numpy as np
 import os
 import unittest
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
 
 default_parameters = ['Total CO2 stock', 'Volume large deadwood', 'Mean age (before)',
                       'Mean age (after)', 'Recreation index']
@@ -22,37 +25,145 @@ def collect_data(parameters: list, descs: list):
     pass
 
 
+def _scan_directory(path, heureka_input, heureka_output):
+    """
+    Lists one directory, and returns the (input file, output file) pairs in it, and its sub directories.
+    Links to directories are not followed, so that a link back up the tree doesn't make the scan loop forever
+    """
+    names = set()
+    sub_dirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    sub_dirs.append(entry.path)
+                elif entry.is_file():
+                    names.add(entry.name)
+    except OSError as error:
+        # e.g. no permission, or a folder that was removed (by OneDrive) during the scan
+        print('WARNING could not scan {}: {}'.format(path, error))
+        return [], []
+
+    pairs = []
+    for name in names:
+        if name.endswith(heureka_input):
+            output_name = name[:-len(heureka_input)] + heureka_output
+            if output_name in names:
+                pairs.append((os.path.join(path, name), os.path.join(path, output_name)))
+    return pairs, sub_dirs
+
+
 class TraverseDirectory:
     """
     An iterator function that should return the fundamental input and output functions of Fossagrims Heureka modeling
 
+    The directory tree is scanned with os.scandir(), where the sub directories are scanned concurrently in a thread
+    pool, without following links to directories, and only input files that have an output file next to them are returned, sorted by the input file name.
+    With a loader, the next <prefetch> pairs of files are loaded in a thread pool while the current pair is used, e.g.
+    > for stand_file, result_file, sheet_names in TraverseDirectory(base_dir, loader=load_sheet_names, prefetch=4):
+    >     ...
+
     :param base_dir:
+    :param heureka_input:
+        str
+        End of the names of the input files
+    :param heureka_output:
+        str
+        End of the names of the output files, replacing heureka_input in the input file name
+    :param n_threads:
+        int
+        Number of threads used to scan the directory tree
+    :param loader:
+        function
+        If given, loader(input_file, output_file) is called for each pair of files, and the iterator returns
+        (input_file, output_file, loader result)
+    :param prefetch:
+        int
+        Number of pairs of files that are loaded ahead of the current pair, when a loader is given
     :return:
     """
     def __init__(self,
                  base_dir: str,
                  heureka_input='Averaged stand data.csv',
                  heureka_output='Heureka results.xlsx',
-                 verbose=False):
-        from pathlib import Path
+                 verbose=False,
+                 n_threads=8,
+                 loader=None,
+                 prefetch=2):
         self.base_dir = base_dir
         self.heureka_input = heureka_input
         self.heureka_output = heureka_output
         self.verbose = verbose
-        self.file_list = Path(base_dir).rglob('*' + heureka_input)
+        self.n_threads = n_threads
+        self.loader = loader
+        self.prefetch = max(int(prefetch), 1)
+        self._pairs = None
+        self._loading = deque()
+        self._executor = None
+
+    def scan(self):
+        """
+        Returns all (input file, output file) pairs in the directory tree, sorted by the input file name
+        """
+        pairs = []
+        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            pending = {executor.submit(_scan_directory, self.base_dir, self.heureka_input, self.heureka_output)}
+            while len(pending) > 0:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _pairs, sub_dirs = future.result()
+                    pairs.extend(_pairs)
+                    pending |= {executor.submit(_scan_directory, _dir, self.heureka_input, self.heureka_output)
+                                for _dir in sub_dirs}
+        if self.verbose:
+            print('Found {} Heureka result files in {}'.format(len(pairs), self.base_dir))
+        return [(Path(_x), _y) for _x, _y in sorted(pairs)]
+
+    def _fill(self):
+        # Keep <prefetch> loads running ahead of the consumer
+        while len(self._pairs) > 0 and len(self._loading) < self.prefetch:
+            input_file, output_file = self._pairs.popleft()
+            self._loading.append(
+                (input_file, output_file, self._executor.submit(self.loader, input_file, output_file)))
+
+    def close(self):
+        """
+        Stops the prefetching, needed only when the iteration is stopped before the end
+        """
+        if self._executor is not None:
+            for _, _, future in self._loading:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._loading.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        this_input_file = next(self.file_list)
-        this_output_file = str(this_input_file).replace(self.heureka_input, self.heureka_output)
-        if os.path.isfile(this_output_file):
-            if self.verbose:
-                print(' Heureka result file exists')
-        else:
-            return None, None
-        return this_input_file, this_output_file
+        if self._pairs is None:
+            self._pairs = deque(self.scan())
+        if self.loader is None:
+            if len(self._pairs) == 0:
+                raise StopIteration
+            return self._pairs.popleft()
+
+        if self._executor is None and len(self._pairs) > 0:
+            self._executor = ThreadPoolExecutor(max_workers=self.prefetch)
+        if self._executor is not None:
+            self._fill()
+        if len(self._loading) == 0:
+            self.close()
+            raise StopIteration
+        input_file, output_file, future = self._loading.popleft()
+        self._fill()
+        return input_file, output_file, future.result()
 
 
 class TestCases(unittest.TestCase):
@@ -4,22 +4,10 @@ import pandas as pd
 import os
 import unittest
 
-from bokeh.plotting import figure, show
-from bokeh.layouts import row, column
-from bokeh.models import (ColumnDataSource, Select,
-                          CustomJS, CustomJSTransform, LinearColorMapper)
-from bokeh.models import PanTool,WheelZoomTool, ResetTool, SaveTool, CrosshairTool, HoverTool, ColorBar, LogColorMapper
-from bokeh.models import (DataTable, NumberFormatter, SelectEditor, StringEditor, StringFormatter,
-                          IntEditor, TableColumn, CheckboxEditor, Div)
-from bokeh.io import output_file
-
-import Fossagrim.utils.projects as fup
 import Fossagrim.io.fossagrim_io as fio
 
 markers = ['o', 'v', '^', '<', '>', 's', 'p', 'P', '*', 'X', 'D']
 
-output_file('C:\\Users\marte\Documents\plot.html')
-
 def find_first_index(table, key, value):
     found = False
     i = None
@@ -40,6 +28,8 @@ def find_first_index(table, key, value):
 
 
 def plot_plant_density():
+    import Fossagrim.utils.projects as fup
+
     projects = ['FHF23-0{}'.format(_x) for _x in ['03', '04', '05', '06', '07', '08', '09', '10', '12']]
     spruce_sis = [];
     pine_sis = [];
@@ -117,7 +107,7 @@ def plot_raw_data(data_dict, data_tag, my_title, qc_plot_dir):
 
 def plot_from_heureka_results(result_file, sheets, params=None, ax=None, x_key='Year',
                               diff_sheets=False, barchart=False, year_zero=None,
-                              save_plot_to=None,  **kwargs):
+                              save_plot_to=None, use_sidecar=False, **kwargs):
     """
     Flexible plot of data stored in typical "Heureka results.xlsx" files
     :param result_file:
@@ -141,6 +131,10 @@ def plot_from_heureka_results(result_file, sheets, params=None, ax=None, x_key='
     :param save_plot_to:
         str
         full file name to which the plot is saved
+    :param use_sidecar:
+        bool
+        If True, the raw results are read through the sidecar file next to the results file.
+        See fossagrim_io.read_raw_heureka_tables()
     :param kwargs:
         optional keywords passed on to plot function
     :return:
@@ -164,14 +158,15 @@ def plot_from_heureka_results(result_file, sheets, params=None, ax=None, x_key='
     diff = None
     width = kwargs.pop('width', 4.0)
 
-    # read the different sheets from the results Excel file
+    # read the different sheets from the results Excel file, skipping sheets that are not in the file
+    sheet_names = fio.workbook_sheet_names(result_file)
+    for sheet in sheets:
+        if sheet not in sheet_names:
+            print('Sheet {} not found in {}'.format(sheet, os.path.basename(result_file)))
+    sheets = [_x for _x in sheets if _x in sheet_names]
     data = []
     for sheet in sheets:
-        try:
-            data.append(fio.read_raw_heureka_results(result_file, sheet))
-        except KeyError as error:
-            print(error)
-            continue
+        data.append(fio.read_raw_heureka_results(result_file, sheet, use_sidecar=use_sidecar))
 
     # check if parameters are available in all sheets
     for d, sheet in zip(data, sheets):
@@ -328,6 +323,15 @@ def plot_collected_stand_data(csv_file):
     :param csv_file:
     :return:
     """
+    # Bokeh is only needed here, so it is not imported with the rest of the module
+    from bokeh.plotting import figure, show
+    from bokeh.layouts import row, column
+    from bokeh.models import ColumnDataSource, Select, CustomJS
+    from bokeh.models import HoverTool
+    from bokeh.models import DataTable, NumberFormatter, StringFormatter, TableColumn, Div
+    from bokeh.io import output_file
+
+    output_file('C:\\Users\\marte\\Documents\\plot.html')
     info_text = """
     <h1> Information</h1>
     This plot shows some modelled climate and nature benefits that can be gained by invoking a 30 year
@@ -47,7 +47,7 @@ import argparse
 import sys
 
 
-def check_hovedtallsrapport(_fplan: str, _hrapp: str, log_text: str, warn_text: str) -> tuple:
+def check_hovedtallsrapport(_fplan: str, _hrapp: str, log_text: str, warn_text: str, fplan_table=None) -> tuple:
     """
 
     :param _fplan:
@@ -57,6 +57,9 @@ def check_hovedtallsrapport(_fplan: str, _hrapp: str, log_text: str, warn_text:
     :param warn_text:
        Either string or None.
        If a string, it contains a warning message that needs to be reported
+    :param fplan_table:
+       pd.DataFrame
+       The 'Forvaltning' sheet of _fplan, if already read. Otherwise it is read from _fplan
     :return: tuple
         Tuple of information text and warning text
     """
@@ -66,7 +69,8 @@ def check_hovedtallsrapport(_fplan: str, _hrapp: str, log_text: str, warn_text:
 
     from Fossagrim.io.fossagrim_io import read_excel
 
-    fplan_table = read_excel(_fplan, 6, 'Forvaltning')
+    if fplan_table is None:
+        fplan_table = read_excel(_fplan, 6, 'Forvaltning')
     fplan_prod_areal = fplan_table['Prod.areal'][0]
     fplan_total_volume = fplan_table['Total'][0]
 
@@ -104,7 +108,7 @@ def check_hovedtallsrapport(_fplan: str, _hrapp: str, log_text: str, warn_text:
     return log_text, warn_text
 
 
-def check_forvaltningsplan(_fplan: str, log_text: str,  warn_text: str) -> tuple:
+def check_forvaltningsplan(_fplan: str, log_text: str,  warn_text: str, fplan_table=None) -> tuple:
     """
 
     :param _fplan:
@@ -112,6 +116,9 @@ def check_forvaltningsplan(_fplan: str, log_text: str,  warn_text: str) -> tuple
     :param warn_text:
        Either string or None.
        If a string, it contains a warning message that needs to be reported
+    :param fplan_table:
+       pd.DataFrame
+       The 'Forvaltning' sheet of _fplan, if already read. Otherwise it is read from _fplan
 
     :return: tuple
         Tuple of information text and warning text
@@ -122,7 +129,8 @@ def check_forvaltningsplan(_fplan: str, log_text: str,  warn_text: str) -> tuple
     from Fossagrim.io.fossagrim_io import read_excel
 
 
-    fplan_table = read_excel(_fplan, 6, 'Forvaltning')
+    if fplan_table is None:
+        fplan_table = read_excel(_fplan, 6, 'Forvaltning')
     _warn_text = ''
 
     # 3. No harvest (or more correctly - no area with MIS included) in MIS
@@ -192,7 +200,7 @@ def check_forvaltningsplan(_fplan: str, log_text: str,  warn_text: str) -> tuple
     return log_text, warn_text
 
 
-def check_sumtallsrapport(_fplan: str, _srapp: str, log_text: str, warn_text: str) -> tuple:
+def check_sumtallsrapport(_fplan: str, _srapp: str, log_text: str, warn_text: str, fplan_table=None) -> tuple:
     """
 
     :param _fplan:
@@ -202,6 +210,9 @@ def check_sumtallsrapport(_fplan: str, _srapp: str, log_text: str, warn_text: st
     :param warn_text:
        Either string or None.
        If a string, it contains a warning message that needs to be reported
+    :param fplan_table:
+       pd.DataFrame
+       The 'Forvaltning' sheet of _fplan, if already read. Otherwise it is read from _fplan
     :return: tuple
         Tuple of information text and warning text
     """
@@ -211,7 +222,8 @@ def check_sumtallsrapport(_fplan: str, _srapp: str, log_text: str, warn_text: st
 
     from Fossagrim.io.fossagrim_io import read_excel
 
-    fplan_table = read_excel(_fplan, 6, 'Forvaltning')
+    if fplan_table is None:
+        fplan_table = read_excel(_fplan, 6, 'Forvaltning')
     fplan_prod_areal = 0.
     fplan_total_volume = 0.
     fplan_nr_stands = 0
@@ -288,7 +300,7 @@ def check_sumtallsrapport(_fplan: str, _srapp: str, log_text: str, warn_text: st
     return log_text, warn_text
 
 
-def pdf_consistency(_fplan: str, _hrapp: str, _srapp: str, _project_name: str):
+def pdf_consistency(_fplan: str, _hrapp: str, _srapp: str, _project_name: str, fplan_table=None):
     """
 
     :param _fplan:
@@ -300,6 +312,9 @@ def pdf_consistency(_fplan: str, _hrapp: str, _srapp: str, _project_name: str):
     :param _project_name:
        text string that identifies this particular project forest, e.g.
            'FHF-0001-02 t06_v2'
+    :param fplan_table:
+       pd.DataFrame
+       The 'Forvaltning' sheet of _fplan, if already read. Otherwise it is read once here, and shared by all checks
 
     :return:
         None
@@ -328,11 +343,15 @@ def pdf_consistency(_fplan: str, _hrapp: str, _srapp: str, _project_name: str):
 
     warn_text = ''
 
-    log_text, warn_text = check_hovedtallsrapport(_fplan, _hrapp, log_text, warn_text)
+    if fplan_table is None:
+        from Fossagrim.io.fossagrim_io import read_excel
+        fplan_table = read_excel(_fplan, 6, 'Forvaltning')
 
-    log_text, warn_text = check_forvaltningsplan(_fplan, log_text, warn_text)
+    log_text, warn_text = check_hovedtallsrapport(_fplan, _hrapp, log_text, warn_text, fplan_table)
 
-    log_text, warn_text = check_sumtallsrapport(_fplan, _srapp, log_text, warn_text)
+    log_text, warn_text = check_forvaltningsplan(_fplan, log_text, warn_text, fplan_table)
+
+    log_text, warn_text = check_sumtallsrapport(_fplan, _srapp, log_text, warn_text, fplan_table)
 
     with open(_log_file, 'w',  encoding="utf-8") as log_file:
         log_file.write(log_text)
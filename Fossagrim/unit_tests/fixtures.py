@@ -0,0 +1,37 @@
+"""
+Test data shared by the unit tests
+"""
+import datetime
+
+import pandas as pd
+
+from Fossagrim.utils.monetization_parameters import variables_used_in_monetization
+
+
+# Project kwargs, as returned by fio.get_kwargs_from_stand(link_settings=False)
+monetization_kwargs = {
+    'Position of total area': 100., 'Position of Batch 1 total volume': 100.,
+    'Position of Batch 2 total volume': 50., 'Position of passive forest total volume': 10.,
+    'Batch 1 start date': datetime.datetime(2025, 1, 1), 'Batch 2 delay': 2, 'Root net': 0.25,
+    'Contract length': 30, 'Rent': 0.03, 'Price growth': 0.02, 'Buffer': 0.2, 'Reserve years': 10,
+    'Net price': 100, 'Gross price': 120, 'NIBOR 10yr': 0.04}
+
+
+def write_raw_heureka_results(filename, sheet_names, n_periods=8):
+    """
+    Writes a small, fake, Heureka results file, with one sheet of raw results per sheet name, laid out as
+    if the results were copied from Heureka and pasted into Excel
+    """
+    years = [0., 5., 7., 10.] + [5. * _i for _i in range(3, n_periods)]
+    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+        for _k, sheet_name in enumerate(sheet_names):
+            rows = [['Treatments', 'Year', 'yr'] + years,
+                    ['Treatments', 'Treatment', ''] + ['None', 'Thinning', 'None'] + ['None'] * (len(years) - 3)]
+            for _j, variable in enumerate(variables_used_in_monetization):
+                if variable in ['Year', 'Treatment']:
+                    continue
+                rows.append(['Results', variable, 'ton/ha'] + [_k + _j + 0.5 * _y for _y in years])
+            rows.append(['Results', 'Mean Year of Birth', 'yr'] + [2000. + _y for _y in years])
+            pd.DataFrame(rows, columns=['Category', 'Variable', 'Unit'] +
+                         ['Period {}'.format(_i) for _i in range(len(years))]).to_excel(
+                writer, sheet_name=sheet_name, index=False)
@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import scipy.interpolate as intrp
+
+import Fossagrim.utils.interpolate as fi
+from Fossagrim.utils.monetization_parameters import variables_used_in_monetization
+from Fossagrim.unit_tests.fixtures import write_raw_heureka_results
+
+
+class MyTestCase(unittest.TestCase):
+    def test_resample_heureka_tables(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'resample test.xlsx')
+            write_raw_heureka_results(f, ['P Spruce BAU', 'P Spruce PRES'], n_periods=12)
+            result = fi.resample_heureka_results(f, ['P Spruce BAU', 'P Spruce PRES'],
+                                                 read_only_these_variables=variables_used_in_monetization)
+        self.assertEqual(list(result.keys()), ['P Spruce BAU', 'P Spruce PRES'])
+        table = result['P Spruce BAU']
+        self.assertEqual(list(table['Year']), list(np.arange(56.)))
+        # the periods are kept, and the treatments and extracted volume are only given in the years of the periods
+        self.assertEqual(list(table['Soil Carbon Stock'][::5]), [0.5 * _y for _y in [0., 5.] + list(range(10, 56, 5))])
+        self.assertEqual(list(table['Treatment'][1:6]), ['None'] * 4 + ['Thinning'])
+        volume = table['Total Extracted Volume Fub (m³fub)']
+        self.assertEqual(list(volume[1:5]), [0.] * 4)
+        self.assertEqual(volume[5], 5 + 2.5)
+
+        # Cubic interpolation in the first rotation, and linear after a thinning, or a final felling with less than
+        # four periods
+        years = 5. * np.arange(9)
+        carbon = np.array([10., 30., 45., 20., 25., 28., 10., 14., 16.])
+        tables = {'x': pd.DataFrame({'Year': years, 'Carbon': carbon, 'Treatment': [
+            'None', 'None', 'None', 'Thinning', 'None', 'None', 'FinalFelling', 'None', 'None']})}
+        annual = fi.resample_heureka_tables(tables)['x']
+        expected = np.concatenate([
+            intrp.interp1d(years[:4], carbon[:4], kind='cubic')(np.arange(16.)),
+            np.interp(np.arange(16., 41.), years[3:], carbon[3:])])
+        self.assertTrue(np.allclose(annual['Carbon'], expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,15 @@
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
+from unittest import mock
+
+import pandas as pd
+
 import Fossagrim.io.fossagrim_io as fio
+from Fossagrim.utils.monetization_parameters import variables_used_in_monetization
+from Fossagrim.unit_tests.fixtures import monetization_kwargs, write_raw_heureka_results
 
 
 class MyTestCase(unittest.TestCase):
@@ -30,6 +40,456 @@ class MyTestCase(unittest.TestCase):
 
         print(list(avg_table.keys()))
 
+    def test_read_excel_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'cache test.xlsx')
+            pd.DataFrame({'Bestand ': [1, 2], 'Prod.areal': [10., 20.]}).to_excel(f, index=False)
+            fio.clear_excel_cache()
+            with mock.patch.object(fio.pd, 'ExcelFile', wraps=pd.ExcelFile) as opener:
+                table1 = fio.read_excel(f, 0, 0)
+                table2 = fio.read_excel(f, 0, 0)
+                self.assertEqual(opener.call_count, 1)
+                self.assertEqual(list(table2.keys()), ['Bestand', 'Prod.areal'])
+                # returned tables are copies, so modifying one does not modify the cache
+                table1.loc[0, 'Prod.areal'] = -1.
+                self.assertEqual(fio.read_excel(f, 0, 0)['Prod.areal'][0], 10.)
+
+                fio.clear_excel_cache(f)
+                _ = fio.read_excel(f, 0, 0)
+                self.assertEqual(opener.call_count, 2)
+                _ = fio.read_excel(f, 0, 0, use_cache=False)
+                self.assertEqual(opener.call_count, 3)
+            fio.clear_excel_cache()
+
+    def test_arrange_raw_heureka_table(self):
+        table = pd.DataFrame([
+            ['Results', 'Mean Year of Birth', 'yr', 1990., 1991., 1992., 1995.],
+            ['Treatments', 'Year', 'yr', 0., 3., 5., 10.],
+            ['Treatments', 'Treatment', '', 'None', 'Thinning', 'None', 'FinalFelling'],
+            ['Results', 'Soil Carbon Stock', 'ton C/ha', 1, 2, 3, 4]],
+            columns=['Category', 'Variable', 'Unit', 'Period 0', 'Period 1', 'Period 2', 'Period 3'])
+
+        result = fio.arrange_raw_heureka_table(table, 'test.xlsx', 'test', exact_match=True)
+        self.assertEqual(list(result.index), ['Period 0', 'Period 2', 'Period 3'])
+        self.assertEqual(list(result['Year']), [0., 5., 10.])
+        self.assertEqual(result['Soil Carbon Stock'].dtype, 'float64')
+        self.assertEqual(list(result['Treatment']), ['None', 'None', 'FinalFelling'])
+        self.assertEqual(result.attrs['Soil Carbon Stock'], 'ton C/ha')
+
+        result = fio.arrange_raw_heureka_table(table, 'test.xlsx', 'test', ['Year', 'Soil Carbon Stock'])
+        self.assertEqual(list(result.keys()), ['Year', 'Soil Carbon Stock'])
+        # Without exact match, 'Year' is found in the first row containing it, i.e. 'Mean Year of Birth'
+        self.assertEqual(list(result['Year']), [1990., 1995.])
+
+    def test_heureka_csv_writer(self):
+        keys = ['StandId', 'Year', 'Treatment', 'PlantDensity']
+        desc = ['', '', '', 'Plants/ha']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'treatment.csv')
+            with fio.HeurekaCsvWriter(f, keys, desc, buffer_size=2) as writer:
+                writer.write_row(StandId='FHF00-000-1', Year=0, Treatment='FinalFelling')
+                writer.write_row(StandId='FHF00-000-1', Year=2, Treatment='Planting', PlantDensity=2000.)
+                writer.write_table(pd.DataFrame({
+                    'StandId': ['FHF00-000-2', 'FHF00-000-3'], 'Year': [35, 40], 'PlantDensity': [1800.5, 1.234]}))
+            fio.write_csv_file(f, keys, desc, append=True, StandId='FHF00-000-4', Year=5.)
+            with open(f) as _in:
+                lines = _in.readlines()
+        self.assertEqual(lines, [
+            ';;;Plants/ha\n',
+            'StandId;Year;Treatment;PlantDensity\n',
+            'FHF00-000-1;0;FinalFelling;\n',
+            'FHF00-000-1;2;Planting;2000.00\n',
+            'FHF00-000-2;35;;1800.50\n',
+            'FHF00-000-3;40;;1.23\n',
+            'FHF00-000-4;5.00;;\n'])
+
+    def test_read_csv_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'StandData.csv')
+            with open(f, 'w') as _out:
+                _out.write(';;m2/ha;\nStandId;Year;BasalArea;Comment\n')
+                _out.write('FHF00-000-1;2023;12.5;1,5\nFHF00-000-2;2023;;\nFHF00-000-3;2024;20;nan\n')
+            data, desc = fio.read_csv_file(f)
+            self.assertEqual(desc, ['', '', 'm2/ha', ''])
+            self.assertEqual(data, {'StandId': ['FHF00-000-1', 'FHF00-000-2', 'FHF00-000-3'],
+                                    'Year': [2023, 2023, 2024],
+                                    'BasalArea': [12.5, '', 20],
+                                    'Comment': ['1,5', '', data['Comment'][2]]})
+            self.assertEqual(type(data['BasalArea'][2]), int)
+            self.assertNotEqual(data['Comment'][2], data['Comment'][2])
+
+            frame, _ = fio.read_csv_file(f, as_frame=True)
+            self.assertEqual(frame['BasalArea'].dtype, 'float64')
+            self.assertEqual(list(frame['Comment']), ['1,5', '', 'nan'])
+            self.assertEqual(list(frame['Year']), [2023, 2023, 2024])
+
+            stands = list(fio.iter_csv_stands(f, chunksize=2))
+            self.assertEqual(len(stands), 3)
+            self.assertEqual(stands[1], {'StandId': 'FHF00-000-2', 'Year': 2023, 'BasalArea': '', 'Comment': ''})
+
+    def test_arrange_export_of_stands(self):
+        from Fossagrim.utils.definitions import fossagrim_standdata_keys, m3fub_to_m3sk
+        table = pd.DataFrame({_key: [1., 2.] for _key in fossagrim_standdata_keys})
+        table['Fossagrim ID'] = ['FHF00-000-1', 'FHF00-000-2']
+        table['Bonitering\ntreslag'] = ['Gran', 'Furu']
+        table['Prod.areal'] = [12., 3.5]
+        table['Vol\n/\ndaa'] = [20., 10.]
+        table['InventoryYear'] = [2023., 2024.]
+        table['Gran'] = [3., 0.]
+        table['Total'] = [4., 2.]
+
+        stands = fio.arrange_export_of_stands(table, ['PlantDensity'], unique_id='v01')
+        self.assertEqual(list(stands['StandId']), ['FHF00-000-1', 'FHF00-000-2'])
+        self.assertEqual(list(stands['SiteIndexSpecies']), ['G', 'T'])
+        self.assertEqual(list(stands['InventoryYear']), [2023, 2024])
+        self.assertEqual(stands['InventoryYear'].dtype, 'int64')
+        self.assertEqual(list(stands['ProdArea']), [12. * 0.1, 3.5 * 0.1])
+        self.assertEqual(list(stands['V']), [200. * m3fub_to_m3sk, 100. * m3fub_to_m3sk])
+        self.assertEqual(list(stands['PropSpruce']), [0.75, 0.])
+        self.assertEqual(list(stands['TotalArea']), ['', ''])
+        self.assertNotIn('UniqueID', stands.keys())
+        one_stand = fio.arrange_export_of_one_stand(1, table, ['PlantDensity'])
+        self.assertEqual(one_stand, stands.iloc[1].to_dict())
+
+        table.loc[1, 'Bonitering\ntreslag'] = 'Eik'
+        with self.assertRaises(NotImplementedError):
+            fio.arrange_export_of_stands(table)
+
+    def test_average_over_stands_groups(self):
+        import numpy as np
+        table = pd.DataFrame({
+            'Fossagrim ID': ['1-1', '1-2', '1-3', '1-4'],
+            'Prod.areal': [10., 30., 20., 40.],
+            'Gran': [1., '2,5', 3., 4.],
+            'Middelhøyde': [10., 20., 30., 40.],
+            'SoilMoistureCode': [1, 3, 2, 2],
+            'Eier': ['A', 'B', 'C', 'D']})
+        average_over = {'Spruce': ['1-1', '1-2'], 'All': ['1-4', '1-3', '1-2', '1-1'], 'None': ['2-1']}
+        avg_table = fio.average_over_stands(average_over, table, 'Fossagrim ID', 'FHF00 ')
+        self.assertEqual(list(avg_table['Fossagrim ID']), ['FHF00 Spruce', 'FHF00 All'])
+        self.assertEqual(list(avg_table['Prod.areal']), [40., 100.])
+        self.assertEqual(list(avg_table['Gran']), [3.5, 10.5])
+        self.assertEqual(list(avg_table['Middelhøyde']), [17.5, 29.])
+        self.assertEqual(list(avg_table['SoilMoistureCode']), [3, 2])
+        self.assertEqual(list(avg_table['Eier']), ['A', 'A'])
+
+        # 'Most of' is the value closest to the area weighted average, which is not the value with the largest area
+        # in group 'All', and a missing value gives a missing sum, as in the original implementation
+        table = pd.DataFrame({
+            'Fossagrim ID': ['1-1', '1-2', '1-3', '1-4'],
+            'Prod.areal': [1., 1., 1.5, 2.],
+            'Gran': [1., '2,5', np.nan, 4.],
+            'Middelhøyde': [10., 20., 30., 40.],
+            'SoilMoistureCode': [1, 1, 3, 2],
+            'Markslag': [3, 1, 2, 3]})
+        avg_table = fio.average_over_stands(average_over, table, 'Fossagrim ID', 'FHF00 ')
+        self.assertEqual(list(avg_table['SoilMoistureCode']), [1, 2])
+        self.assertEqual(list(avg_table['Markslag']), [3, 2])
+        self.assertEqual(avg_table['Gran'][0], 3.5)
+        self.assertTrue(np.isnan(avg_table['Gran'][1]))
+        self.assertAlmostEqual(avg_table['Middelhøyde'][1], 155. / 5.5)
+
+    def test_read_raw_heureka_results_from_sheets(self):
+        sheet_names = ['FHF00-000 Spruce BAU', 'FHF00-000 Spruce PRES']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'FHF00-000 Heureka results.xlsx')
+            write_raw_heureka_results(f, sheet_names)
+            fio.clear_excel_cache()
+            with mock.patch.object(fio.pd, 'ExcelFile', wraps=pd.ExcelFile) as opener:
+                results = fio.read_raw_heureka_results_from_sheets(
+                    f, sheet_names, read_only_these_variables=variables_used_in_monetization)
+                self.assertEqual(opener.call_count, 1)
+            fio.clear_excel_cache()
+            for sheet_name in sheet_names:
+                result = fio.read_raw_heureka_results(f, sheet_name, variables_used_in_monetization)
+                pd.testing.assert_frame_equal(results[sheet_name], result)
+                self.assertEqual(results[sheet_name].attrs, result.attrs)
+                # the sub period at year 7 is removed
+                self.assertEqual(list(result['Year']), [0., 5., 10., 15., 20., 25., 30., 35.])
+            fio.clear_excel_cache()
+
+    def test_streaming_raw_heureka_results(self):
+        sheet_name = 'FHF00-000 Spruce BAU'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'FHF00-000 Heureka results.xlsx')
+            write_raw_heureka_results(f, [sheet_name])
+            fio.clear_excel_cache()
+            for variables in [None, variables_used_in_monetization, ['Soil Carbon Stock', 'Treatment']]:
+                expected = fio.read_raw_heureka_results(f, sheet_name, variables, exact_match=True)
+                result = fio.read_raw_heureka_results(f, sheet_name, variables, streaming=True)
+                pd.testing.assert_frame_equal(result, expected)
+                self.assertEqual(result.attrs, expected.attrs)
+            results = fio.read_raw_heureka_results_from_sheets(f, [sheet_name], streaming=True)
+            pd.testing.assert_frame_equal(results[sheet_name], fio.read_raw_heureka_results(f, sheet_name))
+            # reading stops once the requested variables are found
+            table = fio.stream_raw_heureka_table(f, sheet_name, ['Treatment'])
+            self.assertEqual(list(table['Variable']), ['Year', 'Treatment'])
+            fio.clear_excel_cache()
+
+    def test_rearrange_raw_heureka_results(self):
+        import openpyxl
+        sheet_names = ['FHF00-000 Spruce BAU', 'FHF00-000 Pine BAU']
+        combine_sheets = {'FHF00-000 Combined BAU': ['FHF00-000 Spruce BAU', 0.25, 'FHF00-000 Pine BAU', 0.75]}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'FHF00-000 Heureka results.xlsx')
+            m = os.path.join(tmp_dir, 'FHF00-000 Monetization.xlsx')
+            write_raw_heureka_results(f, sheet_names)
+            fio.clear_excel_cache()
+            self.assertTrue(fio.rearrange_raw_heureka_results(f, sheet_names, combine_sheets, monetization_file=m))
+            result = fio.read_rearranged_heureka_results(f)
+            self.assertEqual(list(result.keys()), sheet_names + ['FHF00-000 Combined BAU'])
+            spruce = fio.read_raw_heureka_results(f, sheet_names[0], variables_used_in_monetization)
+            pine = fio.read_raw_heureka_results(f, sheet_names[1], variables_used_in_monetization)
+            self.assertEqual(list(result['FHF00-000 Combined BAU']['Soil Carbon Stock'].astype(float)),
+                             list(0.25 * spruce['Soil Carbon Stock'] + 0.75 * pine['Soil Carbon Stock']))
+            wb = openpyxl.load_workbook(m)
+            self.assertEqual(wb.sheetnames, ['Rearranged results', 'Parameters', 'Monetization'])
+            self.assertEqual(wb['Rearranged results']['A1'].value, 'FHF00-000 Combined BAU')
+
+            # Overwriting removes the old results in the sheet
+            fio.rearrange_raw_heureka_results(f, sheet_names, None, overwrite=True)
+            wb = openpyxl.load_workbook(f)
+            self.assertEqual(wb.sheetnames[-1], 'Rearranged results')
+            self.assertEqual(wb['Rearranged results'].max_column, 2 * (len(spruce.keys()) + 2) - 1)
+            fio.clear_excel_cache()
+
+    def test_build_monetization_file(self):
+        import openpyxl
+        sheet_names = ['FHF00-000 Spruce BAU', 'FHF00-000 Pine BAU']
+        combine_sheets = {'FHF00-000 Combined BAU': ['FHF00-000 Spruce BAU', 0.25, 'FHF00-000 Pine BAU', 0.75]}
+        kwargs = dict(monetization_kwargs, **{'Position of total area': 1234.})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'FHF00-000 Heureka results.xlsx')
+            write_raw_heureka_results(f, sheet_names)
+            fio.clear_excel_cache()
+            m1 = os.path.join(tmp_dir, 'FHF00-000 Monetization modified.xlsx')
+            fio.rearrange_raw_heureka_results(f, sheet_names, combine_sheets, monetization_file=m1)
+            fio.modify_monetization_file(m1, **kwargs)
+            m2 = os.path.join(tmp_dir, 'FHF00-000 Monetization built.xlsx')
+            fio.rearrange_raw_heureka_results(f, sheet_names, combine_sheets, monetization_file=m2,
+                                              monetization_kwargs=kwargs)
+
+            wb1 = openpyxl.load_workbook(m1)
+            wb2 = openpyxl.load_workbook(m2)
+            self.assertEqual(wb1.sheetnames, wb2.sheetnames)
+            self.assertEqual(sorted(wb1.defined_names.keys()), sorted(wb2.defined_names.keys()))
+            for sheet_name in wb1.sheetnames:
+                ws1 = wb1[sheet_name]
+                ws2 = wb2[sheet_name]
+                self.assertEqual(sorted(str(_r) for _r in ws1.merged_cells.ranges),
+                                 sorted(str(_r) for _r in ws2.merged_cells.ranges))
+                for row in ws1.iter_rows():
+                    for cell in row:
+                        self.assertEqual(cell.value or None, ws2[cell.coordinate].value or None, cell.coordinate)
+                        self.assertEqual(cell.number_format, ws2[cell.coordinate].number_format, cell.coordinate)
+            self.assertEqual(wb2['Monetization']['F1'].value, 123.4)
+            self.assertEqual(wb2['Monetization']['H1'].fill.fgColor.rgb[-6:], 'FFD85B')
+            fio.clear_excel_cache()
+
+    def test_results_sidecar(self):
+        sheet_names = ['FHF00-000 Spruce BAU', 'FHF00-000 Spruce PRES']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'FHF00-000 Heureka results.xlsx')
+            write_raw_heureka_results(f, sheet_names)
+            fio.clear_excel_cache()
+            expected = fio.read_raw_heureka_results(f, sheet_names[0])
+
+            result = fio.read_raw_heureka_results(f, sheet_names[0], use_sidecar=True)
+            self.assertTrue(os.path.isfile(fio.results_sidecar_file(f)))
+            pd.testing.assert_frame_equal(result, expected)
+            self.assertEqual(result.attrs, expected.attrs)
+
+            # A valid sidecar file is read without parsing the results file
+            fio.clear_excel_cache()
+            with mock.patch.object(fio.pd, 'ExcelFile', wraps=pd.ExcelFile) as opener:
+                result = fio.read_raw_heureka_results(f, sheet_names[0], use_sidecar=True)
+                self.assertEqual(opener.call_count, 0)
+                # Sheets that are missing in the sidecar file are added to it
+                _ = fio.read_raw_heureka_results_from_sheets(f, sheet_names, use_sidecar=True)
+                self.assertEqual(opener.call_count, 1)
+            pd.testing.assert_frame_equal(result, expected)
+
+            # Modifying the results file rebuilds the sidecar file
+            write_raw_heureka_results(f, sheet_names, n_periods=10)
+            result = fio.read_raw_heureka_results(f, sheet_names[0], use_sidecar=True)
+            self.assertEqual(len(result['Year']), 10)
+            fio.clear_excel_cache()
+
+    def test_get_nature_and_climate_effects(self):
+        import numpy as np
+        stand_ids = ['FHF00-000 Stand-1', 'FHF00-000 Stand-2']
+        sheet_names = ['{} {}'.format(_x, _case) for _x in stand_ids for _case in ['BAU', 'PRES']]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'FHF00-000 Heureka results.xlsx')
+            write_raw_heureka_results(f, sheet_names + ['FHF00-000 Stand-3 BAU'], n_periods=10)
+            fio.clear_excel_cache()
+            expected = np.array([fio.get_nature_and_climate_effect(f, _x) for _x in stand_ids], dtype=float)
+
+            result = fio.get_nature_and_climate_effects(f)
+            self.assertEqual(list(result.index), stand_ids)
+            np.testing.assert_array_equal(result.to_numpy(), expected)
+
+            # Stand ids are also looked for without the 'Avg Stand-' prefix, and unknown stands give NaN
+            result = fio.get_nature_and_climate_effects(
+                f, ['Avg Stand-FHF00-000 Stand-2', 'FHF00-000 Stand-3', 'FHF00-000 Stand-1'], average_years=20)
+            np.testing.assert_array_equal(result.to_numpy()[0], result.to_numpy()[2])
+            self.assertTrue(np.all(np.isnan(result.to_numpy()[1])))
+            self.assertEqual(result['Recreation effect'].iloc[0], 4.)
+            fio.clear_excel_cache()
+
+    def test_integrated_effects(self):
+        import numpy as np
+        stand_ids = ['FHF00-000 Stand-1', 'FHF00-000 Stand-2']
+        sheet_names = ['{} {}'.format(_x, _case) for _x in stand_ids for _case in ['BAU', 'PRES']]
+        windows = [10, 30, 50]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'FHF00-000 Heureka results.xlsx')
+            write_raw_heureka_results(f, sheet_names, n_periods=10)
+            fio.clear_excel_cache()
+
+            result = fio.integrated_effects(f, windows)
+            cube = result.to_numpy().reshape(len(stand_ids), len(windows), len(fio.nature_and_climate_effects))
+            for _k, window in enumerate(windows):
+                expected = fio.get_nature_and_climate_effects(f, average_years=window).to_numpy()
+                np.testing.assert_allclose(cube[:, _k], expected)
+                np.testing.assert_allclose(result[window].to_numpy(), expected)
+
+            # The recreation difference is constant, so its trapezoidal integral grows linearly with the window
+            result = fio.integrated_effects(f, [0, 12.5, 30], metrics=['Recreation effect'], integration='trapezoid')
+            difference = cube[0, 0, 2] / 2.
+            np.testing.assert_allclose(result.to_numpy()[0], [0., 12.5 * difference, 30. * difference])
+            with self.assertRaises(ValueError):
+                fio.integrated_effects(f, integration='simpson')
+            fio.clear_excel_cache()
+
+    def test_update_all_stand_data(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for tag in ['FHF00-001', 'FHF00-002']:
+                project_dir = os.path.join(tmp_dir, tag)
+                os.makedirs(project_dir)
+                stand_ids = ['{} Stand-{}'.format(tag, _i) for _i in range(2)]
+                write_raw_heureka_results(os.path.join(project_dir, '{} Heureka results.xlsx'.format(tag)),
+                                          ['{} {}'.format(_x, _case) for _x in stand_ids for _case in ['PRES', 'BAU']])
+                with open(os.path.join(project_dir, '{} Averaged stand data.csv'.format(tag)), 'w') as f:
+                    f.write('Description\nStandId\n')
+                    for stand_id in stand_ids:
+                        f.write(';'.join([stand_id] + ['1'] * 109) + '\n')
+            out_file = os.path.join(tmp_dir, 'All stand data.csv')
+            fio.clear_excel_cache()
+
+            processed = fio.update_all_stand_data(out_file, base_dir=tmp_dir, n_processes=2)
+            self.assertEqual(len(processed), 2)
+            with open(out_file, 'r') as f:
+                expected = f.readlines()
+            self.assertEqual(len(expected), 6)
+            self.assertEqual(expected[2].split(';')[101:104], ['0.0', '-12.0', '-6.0'])
+
+            # Nothing is processed when nothing has changed, and the output is the same
+            self.assertEqual(fio.update_all_stand_data(out_file, base_dir=tmp_dir), [])
+            with open(out_file, 'r') as f:
+                self.assertEqual(f.readlines(), expected)
+
+            # Only the changed project is processed
+            result_file = os.path.join(tmp_dir, 'FHF00-002', 'FHF00-002 Heureka results.xlsx')
+            write_raw_heureka_results(result_file, ['FHF00-002 Stand-0 PRES', 'FHF00-002 Stand-0 BAU'])
+            processed = fio.update_all_stand_data(out_file, base_dir=tmp_dir)
+            self.assertEqual([os.path.basename(_x) for _x in processed], ['FHF00-002 Averaged stand data.csv'])
+            with open(out_file, 'r') as f:
+                result = f.readlines()
+            self.assertEqual(result[:5], expected[:5])
+            self.assertEqual(result[5].split(';')[101:104], ['', '', ''])
+
+            # A corrupt workbook is skipped, and the lines of its last successful run are kept
+            with open(result_file, 'w') as f:
+                f.write('Not a workbook')
+            self.assertEqual(fio.update_all_stand_data(out_file, base_dir=tmp_dir), [])
+            with open(out_file, 'r') as f:
+                self.assertEqual(f.readlines(), result)
+
+            # Changing the integration window processes the projects again
+            processed = fio.update_all_stand_data(out_file, base_dir=tmp_dir, average_years=10)
+            self.assertEqual([os.path.basename(_x) for _x in processed], ['FHF00-001 Averaged stand data.csv'])
+            with open(out_file, 'r') as f:
+                self.assertEqual(f.readlines()[2].split(';')[101:104], ['0.0', '-4.0', '-2.0'])
+            fio.clear_excel_cache()
+
+    def test_heureka_sheet_index(self):
+        sheet_names = ['FHF0 Stand-1 PRES', 'FHF0 Stand-1 BAU', 'Avg Stand-FHF0 Stand-2 PRES',
+                       'Avg Stand-FHF0 Stand-2 BAU', 'FHF0 Stand-3 BAU',
+                       'FHF0 Combined Stands Sp PRES', 'FHF0 Combined Stands Sp BAU',
+                       'Rearranged results']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f = os.path.join(tmp_dir, 'FHF00-000 Heureka results.xlsx')
+            write_raw_heureka_results(f, sheet_names)
+            self.assertEqual(fio.workbook_sheet_names(f), sheet_names)
+
+            index = fio.HeurekaSheetIndex(f)
+            self.assertTrue('Rearranged results' in index)
+            self.assertEqual(index.find('Avg Stand-FHF0 Stand-1', 'PRES'), 'FHF0 Stand-1 PRES')
+            self.assertEqual(index.find(' FHF0  stand-2', 'bau'), 'Avg Stand-FHF0 Stand-2 BAU')
+            self.assertIsNone(index.find('FHF0 Stand-3', 'PRES'))
+            self.assertIsNone(index.find_pair('FHF0 Stand-3'))
+            self.assertEqual(index.stand_ids(combined=False), ['FHF0 Stand-1', 'Avg Stand-FHF0 Stand-2'])
+            self.assertEqual(index.find_pair('FHF0 Combined Stands Sp'),
+                             ('FHF0 Combined Stands Sp PRES',
+                              'FHF0 Combined Stands Sp BAU'))
+
+            # A stand without results is found missing without parsing the workbook
+            with mock.patch.object(fio.pd, 'ExcelFile', wraps=pd.ExcelFile) as opener:
+                self.assertEqual(fio.get_nature_and_climate_effect(f, 'FHF0 Stand-3'), (None, None, None))
+                self.assertEqual(opener.call_count, 0)
+
+    def test_traverse_directory(self):
+        from Fossagrim.io.traverse_and_collect import TraverseDirectory
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for sub_dir, tag, with_results in [('B', 'FHF00-002', True), ('A', 'FHF00-001', True),
+                                               (os.path.join('A', 'Old'), 'FHF00-000', True),
+                                               ('C', 'FHF00-003', False)]:
+                os.makedirs(os.path.join(tmp_dir, sub_dir), exist_ok=True)
+                with open(os.path.join(tmp_dir, sub_dir, '{} Averaged stand data.csv'.format(tag)), 'w') as f:
+                    f.write(tag)
+                if with_results:
+                    with open(os.path.join(tmp_dir, sub_dir, '{} Heureka results.xlsx'.format(tag)), 'w') as f:
+                        f.write(tag)
+
+            # A link back up the tree is not followed
+            try:
+                os.symlink(tmp_dir, os.path.join(tmp_dir, 'A', 'Up'), target_is_directory=True)
+            except (OSError, NotImplementedError):
+                # e.g. on Windows without the privilege to create links
+                pass
+
+            pairs = list(TraverseDirectory(tmp_dir, n_threads=2))
+            self.assertEqual([os.path.relpath(str(_x), tmp_dir) for _x, _ in pairs],
+                             [os.path.join('A', 'FHF00-001 Averaged stand data.csv'),
+                              os.path.join('A', 'Old', 'FHF00-000 Averaged stand data.csv'),
+                              os.path.join('B', 'FHF00-002 Averaged stand data.csv')])
+            self.assertTrue(all(os.path.isfile(_y) for _, _y in pairs))
+
+            def loader(_input_file, _output_file):
+                with open(_output_file, 'r') as _f:
+                    return _f.read()
+
+            loaded = [_z for _, _, _z in TraverseDirectory(tmp_dir, loader=loader, prefetch=2)]
+            self.assertEqual(loaded, ['FHF00-001', 'FHF00-000', 'FHF00-002'])
+            with TraverseDirectory(tmp_dir, loader=loader, prefetch=2) as files:
+                self.assertEqual(next(files)[2], 'FHF00-001')
+
+    def test_deferred_imports(self):
+        # Import fossagrim_io in a fresh interpreter, and check that plotting, Bokeh and the monetization
+        # templates are left for first use
+        root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(fio.__file__))))
+        code = ("import sys; import Fossagrim.io.fossagrim_io; "
+                "import Fossagrim.utils.monetization_parameters as mp; "
+                "print(','.join(sorted(sys.modules))); print('calculation_part1' in vars(mp))")
+        result = subprocess.run([sys.executable, '-c', code], cwd=root_dir, capture_output=True, text=True,
+                                check=True)
+        modules, templates_built = result.stdout.split()
+        modules = modules.split(',')
+        for module in ['matplotlib.pyplot', 'bokeh', 'Fossagrim.plotting.misc_plots']:
+            self.assertNotIn(module, modules)
+        self.assertEqual(templates_built, 'False')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from Fossagrim.utils import monetization_model as mm
+from Fossagrim.unit_tests.fixtures import monetization_kwargs
+
+
+class MyTestCase(unittest.TestCase):
+    def test_evaluate_monetization(self):
+        kwargs = dict(monetization_kwargs)
+        # No harvest, constant base case and a project case that grows 5 ton C / ha / 5 yr, gives a constant
+        # climate benefit of 44/12 * 5 / 5 * 10 ha ton CO2 / yr
+        base_case = pd.DataFrame({mm.volume_key: [0.] * 30, mm.carbon_stock_key: [10.] * 30})
+        project_case = pd.DataFrame({mm.carbon_stock_key: [10. + 5. * _i for _i in range(30)]})
+        periods, annual, cells = mm.evaluate_monetization(base_case, project_case, **kwargs)
+        self.assertEqual(periods.shape, (mm.n_periods, 23))
+        self.assertEqual(annual.shape[0], mm.n_years)
+        self.assertEqual(periods['B'][0], 2025.)
+        np.testing.assert_allclose(annual['AC'], 44. / 12. * 10.)
+        np.testing.assert_allclose(annual['AD'], np.cumsum(annual['AC']))
+        np.testing.assert_allclose(annual['AQ'][:30], np.cumsum(annual['AP'])[:30])
+        self.assertEqual(annual['AQ'][30], 0.)
+        self.assertAlmostEqual(cells['BQ7'], 25. + 12.5 / 1.04)
+
+        # Parameters given as formulas follow the parameter they depend on
+        self.assertAlmostEqual(mm.model_parameters(SFsawn=1.)['SFpp'], 0.87)
+
+        # Series and parameters with leading dimensions are evaluated in one go
+        volume = np.array([[1., 2., 3.], [4., 5., 6.]])
+        stock = np.array([[10., 12., 14.], [20., 22., 24.]])
+        parameters = mm.model_parameters(hsawn=np.array([[35.], [35.]]))
+        batch, _, _ = mm.evaluate_monetization_arrays(
+            volume, stock, stock + 1., mm.model_constants(**kwargs), parameters=parameters)
+        single, _, _ = mm.evaluate_monetization_arrays(volume[1], stock[1], stock[1] + 1., mm.model_constants(**kwargs))
+        np.testing.assert_allclose(batch['U'][1, 1], single['U'])
+
+    def test_sweep_monetization(self):
+        kwargs = dict(monetization_kwargs)
+        base_case = pd.DataFrame({mm.volume_key: np.linspace(5., 40., 30), mm.carbon_stock_key: np.linspace(20., 120., 30)})
+        project_case = pd.DataFrame({mm.carbon_stock_key: np.linspace(20., 200., 30)})
+        grid = {'hsawn': [30., 35., 40.], 'SFsawn': [0.5, 0.6], 'Rent': [0.03, 0.04], 'Reserve years': [5, 10]}
+        result = mm.sweep_monetization(base_case, project_case, grid, chunksize=5, **kwargs)
+        self.assertEqual(len(result), 24)
+        self.assertEqual(list(result.columns[:4]), list(grid.keys()))
+
+        # Each row equals a single evaluation with the same parameters
+        row = result.iloc[17]
+        kwargs.update({'Rent': row['Rent'], 'Reserve years': row['Reserve years']})
+        periods, annual, cells = mm.evaluate_monetization(
+            base_case, project_case, parameters=mm.model_parameters(hsawn=row['hsawn'], SFsawn=row['SFsawn']),
+            **kwargs)
+        summary = mm.monetization_summary(periods, annual, cells)
+        for key, value in summary.items():
+            self.assertAlmostEqual(float(value), row[key], msg=key)
+
+    def test_monte_carlo_monetization(self):
+        kwargs = dict(monetization_kwargs)
+        base_case = pd.DataFrame({mm.volume_key: np.linspace(5., 40., 30), mm.carbon_stock_key: np.linspace(20., 120., 30)})
+        project_case = pd.DataFrame({mm.carbon_stock_key: np.linspace(20., 200., 30)})
+        _, expected, _ = mm.evaluate_monetization(base_case, project_case, **kwargs)
+
+        # Without uncertainty, all percentiles equal the deterministic result
+        annual, accumulated, offsets = mm.monte_carlo_monetization(
+            base_case, project_case, n_draws=10, uncertainty={}, percentiles=[5, 95], **kwargs)
+        self.assertEqual(list(accumulated.columns), ['P5', 'P95'])
+        self.assertEqual(accumulated.index[0], 2025)
+        np.testing.assert_allclose(accumulated['P95'], expected['AD'], rtol=1e-6)
+        np.testing.assert_allclose(offsets['P5'], expected['BG'], rtol=1e-6, atol=1e-9)
+
+        # The bands are ordered, and do not depend on the number of processes
+        annual, accumulated, _ = mm.monte_carlo_monetization(
+            base_case, project_case, n_draws=200, chunksize=50, seed=1, **kwargs)
+        self.assertTrue(np.all(annual['P5'] <= annual['P50']) and np.all(annual['P50'] <= annual['P95']))
+        _, in_pool, _ = mm.monte_carlo_monetization(
+            base_case, project_case, n_draws=200, chunksize=50, seed=1, n_processes=2, **kwargs)
+        pd.testing.assert_frame_equal(in_pool, accumulated)
+
+    def test_portfolio_prices(self):
+        kwargs = dict(monetization_kwargs, **{'Root net': 250.})
+        base_case = pd.DataFrame({mm.volume_key: np.linspace(5., 40., 30), mm.carbon_stock_key: np.linspace(20., 120., 30)})
+        projects = {}
+        for i in range(3):
+            _kwargs = dict(kwargs)
+            _kwargs.update({'NIBOR 10yr': 0.03 + 0.01 * i, 'Contract length': 20 + 5 * i})
+            projects['FHF00-00{}'.format(i)] = (
+                base_case, pd.DataFrame({mm.carbon_stock_key: np.linspace(20., 200. + 20. * i, 30)}), _kwargs)
+        result = mm.portfolio_prices(projects)
+        self.assertEqual(list(result.index), list(projects.keys()))
+
+        # Each project gives the same numbers as when evaluated on its own
+        base_case, project_case, _kwargs = projects['FHF00-001']
+        periods, annual, cells = mm.evaluate_monetization(base_case, project_case, **_kwargs)
+        self.assertAlmostEqual(result['Break-even net price']['FHF00-001'], cells['BP4'])
+        self.assertAlmostEqual(result['Project case NPV']['FHF00-001'], cells['BR7'])
+        # The NPV of the change in cash flow is zero at the IRR
+        cash_flow = (annual['BR'] - annual['BQ']).to_numpy()[:30]
+        irr = result['IRR']['FHF00-001']
+        self.assertAlmostEqual(np.sum(cash_flow / (1. + irr) ** np.arange(30)) / cells['BQ7'], 0.)
+
+        # Selling at the break-even net price gives the base case NPV (when the first 30 years hold the same offsets
+        # as the first 43 years, i.e. when the contract is short enough)
+        result = mm.portfolio_prices(projects, net_price=list(result['Break-even net price']))
+        self.assertAlmostEqual(result['NPV gain']['FHF00-000'] / result['Base case NPV']['FHF00-000'], 0.)
+
+
+if __name__ == '__main__':
+    unittest.main()
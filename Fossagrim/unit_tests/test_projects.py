@@ -1,6 +1,62 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
+
+import openpyxl
+import pandas as pd
+
 import Fossagrim.io.fossagrim_io as fio
 import Fossagrim.utils.projects_new as fproj
+from Fossagrim.unit_tests.fixtures import monetization_kwargs, write_raw_heureka_results
+
+
+def write_project_files(tmp_dir, project_names=None, monetization_settings=None):
+    """
+    Writes a small project settings file, with one inactive project and the given (active) projects, and a stand
+    file (Forvaltningsplan) for each active project. Returns the settings file and the stand file of the first project
+
+    With monetization_settings, e.g. fixtures.monetization_kwargs, the settings needed by fio.get_kwargs_from_stand()
+    are added, and the values of the 'Position of ...' settings are written in the first row of the stand file
+    """
+    if project_names is None:
+        project_names = ['FHF00-001 Test']
+    settings_file = os.path.join(tmp_dir, 'ProjectForestsSettings.xlsx')
+    settings = {
+        'Project name': ['FHF00-000 Old '] + ['{} '.format(_x) for _x in project_names],
+        'Status': ['Inactive'] + ['Active'] * len(project_names),
+        'Project folder': [tmp_dir] * (len(project_names) + 1),
+        'Stand id key': ['Fossagrim ID'] * (len(project_names) + 1),
+        'Stands file': ['Old.xlsx'] + ['{} Forvaltningsplan.xlsx'.format(_x[:9]) for _x in project_names],
+        'Results file': ['Old results.xlsx'] + ['{} Heureka results.xlsx'.format(_x[:9]) for _x in project_names],
+        'Hovedtallsrapport': [None] + ['hrapp.pdf'] * len(project_names),
+        'Sumtallsrapport': [None] + ['srapp.pdf'] * len(project_names)
+    }
+    positions = {}
+    if monetization_settings is not None:
+        settings['Position of fractions when combined'] = ['A2, B2'] * (len(project_names) + 1)
+        for _key, value in monetization_settings.items():
+            if 'Position of' in _key:
+                _pos = '{}1'.format('ABCDEF'[len(positions)])
+                positions[_pos] = value
+                value = _pos
+            settings[_key] = [value] * (len(project_names) + 1)
+        positions.update({'A2': 0.8, 'B2': 0.2})
+    pd.DataFrame(settings).to_excel(settings_file, sheet_name='Settings', startrow=1, index=False)
+    stand_files = []
+    for project_name in project_names:
+        stand_files.append(os.path.join(tmp_dir, '{} Forvaltningsplan.xlsx'.format(project_name[:9])))
+        with pd.ExcelWriter(stand_files[-1], engine='openpyxl') as writer:
+            pd.DataFrame({
+                'Fossagrim ID': ['1-1', '1-2', '1-3', '1-4'], 'Bonitering\ntreslag': ['Gran', 'Furu', 'G', 'F'],
+                'Volum status': [1, 1, 1, 0], 'Prod.areal': [30., '10,0', 10., 5.]
+            }).to_excel(writer, sheet_name='data', startrow=7, index=False)
+            pd.DataFrame({'Bestand': [0, 1, 2], 'Prod.areal ': [55., 30., 25.]}).to_excel(
+                writer, sheet_name='Forvaltning', startrow=6, index=False)
+            for _pos, value in positions.items():
+                writer.sheets['data'][_pos] = value
+    fio.clear_excel_cache()
+    return settings_file, stand_files[0]
 
 
 class MyTestCase(unittest.TestCase):
@@ -23,6 +79,168 @@ class MyTestCase(unittest.TestCase):
         print(kwargs)
         self.assertEqual(True, True)  # add assertion here
 
+    def test_project(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            settings_file, stand_file = write_project_files(tmp_dir)
+            fio.clear_excel_cache()
+
+            with mock.patch.object(fio.pd, 'ExcelFile', wraps=pd.ExcelFile) as opener:
+                project = fproj.Project('FHF00-001 Test', settings_file)
+                self.assertEqual(project.stand_file, stand_file)
+                self.assertEqual(project.hrapp, 'hrapp.pdf')
+                self.assertEqual(project.average_over, {'Spruce': ['1-1', '1-3'], 'Pine': ['1-2']})
+                self.assertEqual(project.result_sheets, ['FHF00-001 Test Spruce BAU', 'FHF00-001 Test Spruce PRES',
+                                                         'FHF00-001 Test Pine BAU', 'FHF00-001 Test Pine PRES'])
+                self.assertEqual(project.combine_sheets['FHF00-001 Test Combined Stands Spruce-and-Pine PRES'],
+                                 ['FHF00-001 Test Spruce PRES', 0.8, 'FHF00-001 Test Pine PRES', 0.2])
+                self.assertEqual(len(project.settings_tuple()), 13)
+
+                # All stages get the tables of the project, so each file is only read once
+                with mock.patch('Fossagrim.plotting.misc_plots.qc_stand_data') as qc_stand_data, \
+                        mock.patch('Fossagrim.qc_input_pdfs.pdf_consistency') as pdf_consistency, \
+                        mock.patch.object(fio, 'export_fossagrim_stand_to_heureka') as export:
+                    project.arrange_import()
+                self.assertEqual(list(qc_stand_data.call_args[0][0]['Fossagrim ID']), ['1-1', '1-2', '1-3', '1-4'])
+                self.assertEqual(list(pdf_consistency.call_args[1]['fplan_table']['Prod.areal']), [55., 30., 25.])
+                self.assertEqual(len(export.call_args[1]['table']), 4)
+                # the settings file and the stand file
+                self.assertEqual(opener.call_count, 2)
+
+            with self.assertRaises(IOError):
+                fproj.Project('FHF00-000 Old', settings_file)
+            fio.clear_excel_cache()
+
+    def test_run_projects(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            settings_file, _ = write_project_files(tmp_dir, ['FHF00-001 Test', 'FHF00-002 Test'])
+            # The stand file of the second project is missing
+            os.remove(os.path.join(tmp_dir, 'FHF00-002 Forvaltningsplan.xlsx'))
+
+            with mock.patch.object(fproj.Project, 'arrange_import') as arrange_import:
+                summary = fproj.run_projects(settings_file)
+            self.assertEqual(list(summary.index), ['FHF00-001 Test', 'FHF00-002 Test'])
+            self.assertEqual(list(summary['Status']), ['Done', 'Failed'])
+            self.assertEqual(summary['Stage']['FHF00-002 Test'], 'results file')
+            self.assertIn('FileNotFoundError', summary['Error']['FHF00-002 Test'])
+            self.assertEqual(arrange_import.call_count, 1)
+
+            # The existing results file is kept, or overwritten, without asking
+            result_file = os.path.join(tmp_dir, 'FHF00-001 Heureka results.xlsx')
+            self.assertEqual(fio.workbook_sheet_names(result_file)[0], 'FHF00-001 Test Spruce BAU')
+            project = fproj.Project('FHF00-001 Test', settings_file)
+            with mock.patch('builtins.input') as prompt:
+                self.assertFalse(project.create_result_file(overwrite='never'))
+                self.assertTrue(project.create_result_file(overwrite='always'))
+            self.assertEqual(prompt.call_count, 0)
+            with self.assertRaises(ValueError):
+                fproj.run_projects(settings_file, _overwrite='ask')
+
+            # Existing rearranged results are only rewritten with _overwrite='always'
+            write_raw_heureka_results(result_file, project.result_sheets)
+            fproj.run_projects(settings_file, _fix_import=False, _project_names=['FHF00-001 Test'])
+            self.assertTrue(os.path.isfile(project.monetization_file))
+            for overwrite, first_cell in [('never', 'Stale'), ('always', 'FHF00-001 Test Spruce BAU')]:
+                wb = openpyxl.load_workbook(result_file)
+                wb['Rearranged results']['A1'] = 'Stale'
+                wb.save(result_file)
+                fio.clear_excel_cache()
+                summary = fproj.run_projects(settings_file, _fix_import=False, _overwrite=overwrite,
+                                             _project_names=['FHF00-001 Test'])
+                self.assertEqual(list(summary['Status']), ['Done'])
+                wb = openpyxl.load_workbook(result_file, read_only=True)
+                self.assertEqual(wb['Rearranged results']['A1'].value, first_cell)
+                wb.close()
+            fio.clear_excel_cache()
+
+    def test_pipeline(self):
+        from Fossagrim.utils.pipeline import Pipeline
+        calls = []
+
+        def copy_upper(in_file, out_file, suffix=''):
+            calls.append(os.path.basename(out_file))
+            with open(in_file, 'r') as f:
+                text = f.read()
+            with open(out_file, 'w') as f:
+                f.write(text.upper() + suffix)
+
+        def fail(*_args):
+            calls.append('fail')
+            raise ValueError('No results')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            a, b, c, d = [os.path.join(tmp_dir, '{}.txt'.format(_x)) for _x in 'abcd']
+            with open(a, 'w') as f:
+                f.write('a')
+
+            def pipeline(suffix=''):
+                _pipeline = Pipeline(os.path.join(tmp_dir, 'pipeline.json'))
+                _pipeline.add('b', copy_upper, inputs=[a], outputs=[b], args=(a, b), kwargs={'suffix': suffix})
+                _pipeline.add('c', copy_upper, inputs=[b], outputs=[c], args=(b, c))
+                _pipeline.add('d', fail, inputs=[d], outputs=[d])
+                _pipeline.add('e', copy_upper, inputs=[d], args=(d, d))
+                return _pipeline
+
+            status = pipeline().run()
+            self.assertEqual(status, {'b': 'run', 'c': 'run', 'd': 'missing input', 'e': 'blocked'})
+            self.assertEqual(pipeline().run()['b'], 'skipped')
+            self.assertEqual(calls, ['b.txt', 'c.txt'])
+
+            # A new parameter runs the stage again, but 'c' is skipped, since its input is unchanged
+            calls.clear()
+            self.assertEqual(pipeline('').run(force=['b'])['c'], 'skipped')
+            self.assertEqual(pipeline('!').run()['c'], 'run')
+            self.assertEqual(calls, ['b.txt', 'b.txt', 'c.txt'])
+            with open(c, 'r') as f:
+                self.assertEqual(f.read(), 'A!')
+
+            # A failing stage blocks the stages that depend on it, and is tried again on the next run
+            with open(d, 'w') as f:
+                f.write('d')
+            calls.clear()
+            self.assertEqual(pipeline('!').run(), {'b': 'skipped', 'c': 'skipped', 'd': 'failed', 'e': 'blocked'})
+            self.assertEqual(pipeline('!').run()['d'], 'failed')
+            self.assertEqual(calls, ['fail', 'fail'])
+
+            with self.assertRaises(ValueError):
+                pipeline().add('f', copy_upper, inputs=[c], outputs=[a])
+
+    def test_project_pipeline(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            settings_file, _ = write_project_files(tmp_dir, monetization_settings=monetization_kwargs)
+            project = fproj.Project('FHF00-001 Test', settings_file)
+            write_raw_heureka_results(project.result_file, project.result_sheets)
+
+            def export(*_args, **_kwargs):
+                with open(project.csv_stand_file, 'w') as f:
+                    f.write('stands')
+
+            def run():
+                with mock.patch('Fossagrim.plotting.misc_plots.qc_stand_data'), \
+                        mock.patch('Fossagrim.qc_input_pdfs.pdf_consistency'), \
+                        mock.patch.object(fio, 'export_fossagrim_stand_to_heureka', side_effect=export), \
+                        mock.patch.object(fio, 'qc_plots'):
+                    return fproj.Project('FHF00-001 Test', settings_file).pipeline().run()
+
+            status = run()
+            self.assertEqual(status['rearrange results'], 'run')
+            self.assertEqual(status['qc plots'], 'run')
+
+            # A changed project setting rebuilds the monetization file, but leaves the stand export alone
+            wb = openpyxl.load_workbook(settings_file)
+            rent_col = [_c.value for _c in wb['Settings'][2]].index('Rent') + 1
+            wb['Settings'].cell(4, rent_col).value = 0.05
+            wb.save(settings_file)
+            fio.clear_excel_cache()
+            status = run()
+            self.assertEqual(status['export stands'], 'skipped')
+            self.assertEqual(status['rearrange results'], 'run')
+            self.assertEqual(status['qc plots'], 'run')
+            wb = openpyxl.load_workbook(project.monetization_file)
+            self.assertEqual(wb['Monetization']['AO4'].value, 0.05)
+            wb.close()
+            self.assertEqual(run()['rearrange results'], 'skipped')
+            fio.clear_excel_cache()
+
 
 if __name__ == '__main__':
     unittest.main()
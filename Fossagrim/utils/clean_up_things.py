@@ -68,8 +68,7 @@ def merge_treatment_and_stand():
                 new_name = orig_name.replace('.csv', '_BACKUP.csv')
                 shutil.copy(orig_name, new_name)
                 print('write header lines to {}'.format(os.path.basename(orig_name)))
-                fio.write_csv_file(orig_name, heureka_standdata_keys, heureka_standdata_desc)
-                with open(orig_name, 'a') as oid:
+                with fio.HeurekaCsvWriter(orig_name, heureka_standdata_keys, heureka_standdata_desc) as oid:
                     print(' Open {} for appending'.format(os.path.basename(orig_name)))
                     with open(new_name, 'r') as fid:
                         print('  Open {} for reading'.format(os.path.basename(new_name)))
@@ -88,7 +87,7 @@ def merge_treatment_and_stand():
                                     new_line[99] = str(treatment[0])
                                     new_line[100] = str(treatment[2])
                                     print('    - Add treatment to {} {}'.format(stand_id, ws) )
-                                    oid.write(';'.join(new_line))
+                                    oid.write_line(';'.join(new_line))
 
 
 def collect_carbon_effect_for_test_simulations(stand_file, result_file, out_file, postfix=None):
@@ -111,19 +110,13 @@ def collect_carbon_effect_for_test_simulations(stand_file, result_file, out_file
         String that is added to each stand ID to separate it from other earlier stand ID's
     :return:
     """
-    # test if output file exists
-    if os.path.isfile(out_file):
-        append = True
-    else:
-        append = False
-        # create header lines of out file
-        fio.write_csv_file(out_file, heureka_standdata_keys, heureka_standdata_desc)
-    append = True
+    # test if output file exists, if not, the header lines of out file are created
+    append = os.path.isfile(out_file)
 
     fig, ax = plt.subplots()
 
     # Open output csv file for append
-    with open(out_file, 'a') as _out:
+    with fio.HeurekaCsvWriter(out_file, heureka_standdata_keys, heureka_standdata_desc, append=append) as _out:
         # Open stand file to read each stand
         with open(stand_file, 'r') as _in:
             for i, line in enumerate(_in.readlines()):
@@ -139,7 +132,7 @@ def collect_carbon_effect_for_test_simulations(stand_file, result_file, out_file
                     print('  Carbon effect: {:.2f}'.format(carbon_effect))
 
                 split_line[101] = str(carbon_effect)
-                _out.write(';'.join(split_line))
+                _out.write_line(';'.join(split_line))
 
 
 def test_rename_avg_stands():
@@ -2,18 +2,236 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import scipy.interpolate as intrp
-from copy import deepcopy
 
-def five_to_one(years, data, verbose=True):
+# Heureka variables that are events in the year of a treatment, e.g. the harvested volume, and which are not
+# interpolated, but kept in the year of the treatment, and zero in the other years
+event_variables = ['Total Extracted Volume Fub (m³fub)']
+# Heureka variables that restart from zero after a final felling, and are interpolated linearly
+age_variables = ['Mean Age (all trees, always basal area weighted) Before']
+
+# Interpolation weights of each segment shape, see _segment_weights()
+_weights_cache = {}
+
+
+def _segment_weights(offsets, kind, step):
+    """
+    Returns the matrix W that resamples the values y of a segment, given at the years offsets (relative to the start
+    of the segment), to every step year, as W @ y. Both cubic and linear interpolation are linear in y, so W is found
+    by interpolating the identity matrix, once for each segment shape
+    """
+    key = (offsets, kind, step)
+    if key not in _weights_cache:
+        x = np.array(offsets)
+        x_new = step * np.arange(int(round(x[-1] / step)) + 1)
+        _weights_cache[key] = intrp.interp1d(x, np.eye(len(x)), kind=kind, axis=0)(x_new)
+    return _weights_cache[key]
+
+
+def _rotation_segments(treatments):
+    """
+    Splits the periods at every final felling and thinning. Returns the (first, last) period of each segment, where
+    the last period of one segment is the first of the next, and the interpolation kind of each segment: cubic in the
+    first segment and after a final felling, and linear after a thinning (or when there are less than four periods)
+    """
+    treatments = np.asarray(treatments, dtype=str)
+    is_split = (np.char.find(treatments, 'Final') >= 0) | (np.char.find(treatments, 'Thinning') >= 0)
+    bounds = np.unique(np.concatenate([[0], np.flatnonzero(is_split), [len(treatments) - 1]]))
+    segments = list(zip(bounds[:-1], bounds[1:]))
+    kinds = []
+    for k, (first, last) in enumerate(segments):
+        cubic = (k == 0 or 'Final' in treatments[first]) and last - first >= 3
+        kinds.append('cubic' if cubic else 'linear')
+    return segments, kinds
+
+
+def resample_heureka_tables(tables, step=1., year_key=None, treatment_key=None, event_keys=None, age_keys=None):
+    """
+    Resamples Heureka results, with one line per 5 year period, to one line per year (or per step years), following
+    the rotations, so that the cubic interpolation doesn't go haywire when the Total Carbon suddenly drops.
+
+    Each table is split into segments at the final fellings and thinnings. Segments are interpolated with cubic
+    splines in the first rotation and after a final felling, and linearly after a thinning. Age variables are
+    interpolated linearly, and restart from zero after a final felling. Event variables (e.g. extracted volume) and the
+    treatments are only given in the year of the period they belong to.
+
+    All segments of all tables and all variables with the same shape are interpolated together in one matrix product,
+    so a whole portfolio of result sheets is resampled in one call. E.g.
+    > tables = fio.read_raw_heureka_results_from_sheets(result_file, sheet_names)
+    > annual_tables = resample_heureka_tables(tables)
+
+    :param tables:
+        dict
+        Dictionary with sheet name as key, and the DataFrame returned by fio.read_raw_heureka_results() as value
+    :param step:
+        float
+        Time step of the resampled tables in years
+    :param year_key:
+        str
+        Name of the year column, default 'Year'. The years must be multiples of step from the first year
+    :param treatment_key:
+        str
+        Name of the treatment column, default 'Treatment'
+    :param event_keys:
+        list
+        Names of event variables, default event_variables
+    :param age_keys:
+        list
+        Names of age variables, default age_variables
+    :return:
+        dict
+        Dictionary with sheet name as key, and the resampled DataFrame as value, with the same columns and attrs
+    """
+    if year_key is None:
+        year_key = 'Year'
+    if treatment_key is None:
+        treatment_key = 'Treatment'
+    if event_keys is None:
+        event_keys = event_variables
+    if age_keys is None:
+        age_keys = age_variables
+
+    results = {}
+    # (segment offsets, kind) -> list of (values of the segment, output array, first output row, output columns)
+    jobs = {}
+    for name, table in tables.items():
+        # All numeric columns are resampled into one block, the other columns (e.g. treatments and ids) are only
+        # given in the years of the periods
+        columns = {_key: table[_key].to_numpy() for _key in table.columns}
+        numeric_keys = [_key for _key, _values in columns.items()
+                        if _values.dtype.kind in 'iuf' and _key != treatment_key]
+        values = np.empty((len(table), len(numeric_keys)))
+        for j, key in enumerate(numeric_keys):
+            values[:, j] = columns[key]
+
+        years = columns[year_key].astype(float)
+        rows = np.rint((years - years[0]) / step).astype(int)
+        if np.any(np.abs(rows * step - (years - years[0])) > 1.E-6) or np.any(np.diff(rows) <= 0):
+            raise ValueError('The years of {} are not increasing multiples of {} years'.format(name, step))
+        n_rows = rows[-1] + 1
+        if treatment_key in columns:
+            treatments = columns[treatment_key].astype(str)
+        else:
+            treatments = np.full(len(years), 'None')
+
+        out = np.empty((n_rows, len(numeric_keys)))
+        out[0] = values[0]
+        smooth_cols = []
+        linear_cols = []
+        for j, key in enumerate(numeric_keys):
+            if key == year_key:
+                out[:, j] = years[0] + step * np.arange(n_rows)
+            elif key in event_keys:
+                out[:, j] = 0.
+                out[rows, j] = values[:, j]
+            elif key in age_keys:
+                linear_cols.append(j)
+            else:
+                smooth_cols.append(j)
+        smooth_cols = np.array(smooth_cols, dtype=int)
+        linear_cols = np.array(linear_cols, dtype=int)
+
+        # The first year of each segment is already given, by the first period or by the segment before it
+        segments, kinds = _rotation_segments(treatments)
+        for (first, last), kind in zip(segments, kinds):
+            offsets = tuple(years[first:last + 1] - years[first])
+            if len(smooth_cols) > 0:
+                jobs.setdefault((offsets, kind), []).append(
+                    (values[first:last + 1, smooth_cols], out, rows[first], smooth_cols))
+            if len(linear_cols) > 0:
+                age = values[first:last + 1, linear_cols]
+                if 'Final' in treatments[first]:
+                    age[0] = 0.
+                jobs.setdefault((offsets, 'linear'), []).append((age, out, rows[first], linear_cols))
+        results[name] = (table, columns, numeric_keys, out, rows)
+
+    for (offsets, kind), segment_jobs in jobs.items():
+        weights = _segment_weights(offsets, kind, step)
+        resampled = weights @ np.concatenate([_x[0] for _x in segment_jobs], axis=1)
+        col = 0
+        for segment_values, out, first_row, out_cols in segment_jobs:
+            width = segment_values.shape[1]
+            out[first_row + 1:first_row + resampled.shape[0], out_cols] = resampled[1:, col:col + width]
+            col += width
+
+    output = {}
+    for name, (table, columns, numeric_keys, out, rows) in results.items():
+        data = {}
+        for key, values in columns.items():
+            if key in numeric_keys:
+                data[key] = out[:, numeric_keys.index(key)]
+                continue
+            data[key] = np.full(len(out), 'None' if key == treatment_key else None, dtype=object)
+            data[key][rows] = values
+        result = pd.DataFrame(data, copy=False)
+        result.attrs = dict(table.attrs)
+        output[name] = result
+    return output
+
+
+def resample_heureka_results(filename, sheet_names, read_only_these_variables=None, step=1., **_kwargs):
+    """
+    Reads the raw Heureka results of the given sheets, in one pass over the workbook, and resamples all of them to
+    one line per year, see resample_heureka_tables()
+
+    :param filename:
+        str
+        Name of file with Heureka results
+    :param sheet_names:
+        list
+    :param read_only_these_variables:
+        list
+        See fio.read_raw_heureka_results()
+    :param _kwargs:
+        Keyword arguments passed on to fio.read_raw_heureka_results_from_sheets(), e.g. use_sidecar
+    :return:
+        dict
+        Dictionary with sheet name as key, and the resampled DataFrame as value
+    """
+    import Fossagrim.io.fossagrim_io as fio
+    tables = fio.read_raw_heureka_results_from_sheets(
+        filename, sheet_names, read_only_these_variables=read_only_these_variables, **_kwargs)
+    return resample_heureka_tables(tables, step=step)
+
+
+def five_to_one(years, data, verbose=True, treatments=None):
     """
     Tries to interpolate data from Heureka, which has a time step of five years, to use a one year time step
 
     :param years:
+        array-like
+        Years of the five year periods
     :param data:
+        array-like or DataFrame
+        Values of one variable, or of several variables (one per column), in each period
     :param verbose:
+        bool
+        Plots the data and the interpolated values
+    :param treatments:
+        list
+        Treatment in each period. If given, the data is interpolated following the rotations, see
+        resample_heureka_tables()
     :return:
+        np.ndarray, np.ndarray
+        The one year time steps, and the interpolated data
     """
-    pass
+    values = np.asarray(data, dtype=float)
+    table = pd.DataFrame(values.reshape(len(values), -1))
+    value_keys = list(table.columns)
+    table.insert(0, 'Year', np.asarray(years, dtype=float))
+    if treatments is not None:
+        table['Treatment'] = treatments
+    result = resample_heureka_tables({'data': table})['data']
+    one_years = result['Year'].to_numpy()
+    resampled = result[value_keys].to_numpy().reshape((len(one_years),) + values.shape[1:])
+
+    if verbose:
+        fig, ax = plt.subplots()
+        ax.plot(years, values, 'o')
+        ax.plot(one_years, resampled, 'r-')
+        ax.set_xlabel('Years')
+        plt.show()
+
+    return one_years, resampled
 
 
 def rotation_period_interpolation(filename, scenario):
@@ -62,85 +280,13 @@ def rotation_period_interpolation(filename, scenario):
         ax_a = None
         ax_b = None
 
-    # Find number of Final Fellings, and their indexes
-    treatment_indexes = []
-    treatment_type = []
-    for i, treatment in enumerate(table['Treatment']):
-        if ('Final' in treatment) or ('Thinning' in treatment):
-            treatment_indexes.append(i)
-            treatment_type.append(treatment)
-    treatment_indexes.append(n-1)
-    treatment_type.append('None')
-    if treatment_indexes[0] != 0:
-        treatment_indexes.insert(0, 0)
-        treatment_type.insert(0, 'None')
-
-    output_age = np.array([])
-    output_carbon = np.array([])
-    output_biomass = np.array([])
-    output_treatment = []
-
-    last_index = 0
-    counter = 0
-    last_max_age = None
-    # Split the data in to rotation periods
-    for this_i in treatment_indexes:
-        if this_i == 0:
-            continue
-        counter += 1
-
-        # the "this_i+1" ensures that the first value of the next rotation period is included in the
-        # interpolation. The append function below avoids that value to the appended twice
-        this_age = deepcopy(table['Age'][last_index:this_i+1])
-        if 'Final' in treatment_type[counter-1]:
-            this_age.iloc[0] = 0.
-            kind = 'cubic'
-        else:
-            kind = 'linear'
-        this_carbon = table['Total carbon'][last_index:this_i+1]
-        this_biomass = table['Extracted biomass'][last_index:this_i+1]
-        this_treatment = table['Treatment'][last_index:this_i+1]
-
-        n_periods = len(this_age)
-        five_years = np.linspace(0, (n_periods-1) * 5, n_periods)
-        one_years = np.linspace(0, int(five_years[-1]), int(five_years[-1]) + 1)
-
-        resampled_biomass = np.zeros(len(one_years))
-        resampled_treatment = [''] * len(one_years)
-        # find out which years we have extracted biomass, and insert those into the resampled biomass
-        for k, bio in enumerate(this_biomass):
-            if bio != 0.:
-                year = five_years[k]
-                resampled_biomass[np.argmin(np.sqrt((one_years-year)**2))] = bio
-        # find out which years we have done some treatment, and insert those into the resampled treatment
-        for k, treat in enumerate(this_treatment):
-            if treat != 'None':
-                year = five_years[k]
-                # print(year, treat)
-                resampled_treatment[np.argmin(np.sqrt((one_years-year)**2))] = treat
-
-        if counter == 1:
-            output_carbon = np.append(output_carbon, intrp.interp1d(five_years, this_carbon, kind='cubic')(one_years))
-            new_age = intrp.interp1d(five_years, this_age)(one_years)
-            new_age[0] = table['Age'].iloc[0]  # inherent max age from last rotation period
-            output_age = np.append(output_age, new_age)
-            output_biomass = np.append(output_biomass, resampled_biomass)
-            output_treatment += resampled_treatment
-        else:
-            try:
-                output_carbon = np.append(output_carbon[:-1],
-                                      intrp.interp1d(five_years, this_carbon, kind=kind)(one_years))
-            except ValueError:
-                output_carbon = np.append(output_carbon[:-1],
-                                          intrp.interp1d(five_years, this_carbon, kind='linear')(one_years))
-            new_age = intrp.interp1d(five_years, this_age)(one_years)
-            new_age[0] = last_max_age  # inherent max age from last rotation period
-            output_age = np.append(output_age[:-1], new_age)
-            output_biomass = np.append(output_biomass[:-1], resampled_biomass)
-            output_treatment += resampled_treatment[1:]
-
-        last_max_age = output_age[-1]
-        last_index = this_i
+    table.insert(0, 'Year', yrs_5)
+    resampled = resample_heureka_tables(
+        {scenario: table}, event_keys=['Extracted biomass'], age_keys=['Age'])[scenario]
+    output_age = resampled['Age'].to_numpy()
+    output_carbon = resampled['Total carbon'].to_numpy()
+    output_biomass = resampled['Extracted biomass'].to_numpy()
+    output_treatment = ['' if _x == 'None' else _x for _x in resampled['Treatment']]
 
     if verbose:
         ax_c.plot(yrs_1, output_carbon, 'r-')
@@ -0,0 +1,677 @@
+"""
+NumPy implementation of the Monetization sheet, so that a project can be evaluated without recalculating the
+monetization file in Excel.
+
+The columns of the Monetization sheet, as defined by the formula templates in monetization_parameters.py, are
+computed as arrays with time along the last axis. All inputs (Heureka series, project constants and model
+parameters) may carry extra leading dimensions, which are broadcast against each other, so that many scenarios can
+be evaluated in one call.
+
+The returned columns are keyed by the column letter used in the Monetization sheet, e.g. 'AC' is the annual climate
+benefit and 'AD' the accumulated climate benefit.
+"""
+import re
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from Fossagrim.utils.monetization_parameters import parameters as parameter_table
+from Fossagrim.utils.monetization_parameters import monetization_constants, parameter_to_float
+
+volume_key = 'Total Extracted Volume Fub (m³fub)'
+carbon_stock_key = 'Total Carbon Stock (dead wood, soil, trees, stumps and roots)'
+
+n_periods = 41  # Number of 5 year periods in the Monetization sheet (rows 8 to 48)
+n_years = 103  # Number of years in the resampled part of the Monetization sheet (rows 8 to 110)
+n_sum_years = 71  # Number of years included in the totals of the buffer and sales columns (rows 8 to 78)
+period_length = 5.  # A5 in the Monetization sheet
+long_contract = 100.  # AT4 in the Monetization sheet
+
+# Cells of the Monetization sheet that are set from the project kwargs, see monetization_constants()
+constant_cells = ['F1', 'AF3', 'AG3', 'AI3', 'AF5', 'AG6', 'AF8', 'AN4', 'AO4', 'AP4', 'AX4', 'AY4', 'BH8', 'BI8',
+                  'BP3']
+
+
+def model_parameters(**_kwargs):
+    """
+    Returns the model parameters of the Parameters sheet (hpap, hsawn, SFsawn, ...) as a dictionary of floats.
+    Parameters given as formulas, like SFpp = 0.87 * SFsawn, are evaluated after the given overrides are applied, so
+    that they follow any modified parameter they depend on.
+
+    :param _kwargs:
+        Parameter values that override the default values, e.g. hsawn=40.
+        Values can be floats or numpy arrays
+    :return:
+        dict
+    """
+    names = list(parameter_table[0])
+    unknown = [_key for _key in _kwargs if _key not in names]
+    if len(unknown) > 0:
+        raise ValueError('Unknown model parameters: {}'.format(', '.join(unknown)))
+
+    result = {}
+    formulas = {}
+    for name, value in zip(parameter_table[0], parameter_table[1]):
+        if name in _kwargs:
+            result[name] = _kwargs[name]
+        elif isinstance(value, str) and value.startswith('='):
+            formulas[name] = value
+        else:
+            result[name] = parameter_to_float(value)
+
+    for name, formula in formulas.items():
+        # Formulas are on the form '=<factor>*B<row>', where row 2 holds the first parameter
+        match = re.match(r'^=([0-9.]+)\*B([0-9]+)$', formula.replace(' ', ''))
+        if match is None:
+            raise ValueError('Can not evaluate formula {} of parameter {}'.format(formula, name))
+        result[name] = float(match.group(1)) * result[names[int(match.group(2)) - 2]]
+    return {name: result[name] for name in names}
+
+
+def model_constants(**_kwargs):
+    """
+    Returns the project constants of the Monetization sheet as numbers, with cell position as key.
+    The start date (AF5) is returned as the start year.
+
+    :param _kwargs:
+        Dictionary of kwargs as returned by get_kwargs_from_stand(), where the values that are given as links to the
+        project settings file must have been replaced by their numerical values
+    :return:
+        dict
+    """
+    not_numbers = [_key for _key, _value in _kwargs.items() if isinstance(_value, str) or _value is None]
+    if len(not_numbers) > 0:
+        raise ValueError('The monetization model needs numerical values for: {}'.format(', '.join(not_numbers)))
+    constants = monetization_constants(**_kwargs)
+    if isinstance(constants['AF5'], datetime.date):
+        constants['AF5'] = float(constants['AF5'].year)
+    return constants
+
+
+def _as_array(x):
+    # Constants and parameters are broadcast against the time axis, which is the last axis
+    return np.asarray(x, dtype=float)[..., np.newaxis]
+
+
+def _previous(x):
+    # Value of the row above, where the row above the first row is blank
+    result = np.zeros_like(x)
+    result[..., 1:] = x[..., :-1]
+    return result
+
+
+def _fit_periods(x):
+    # The Monetization sheet has room for n_periods periods, and blank cells below the data are read as zero
+    x = np.asarray(x, dtype=float)
+    if x.shape[-1] >= n_periods:
+        return x[..., :n_periods]
+    pad = [(0, 0)] * (x.ndim - 1) + [(0, n_periods - x.shape[-1])]
+    return np.pad(x, pad)
+
+
+def _total(x):
+    return np.sum(x, axis=-1, keepdims=True)
+
+
+def _npv(rate, values):
+    # Same as NPV() in Excel, where the first value is discounted one period
+    return _total(values * (1. + rate) ** -np.arange(1, values.shape[-1] + 1))
+
+
+def evaluate_monetization_arrays(volume, base_stock, project_stock, constants, parameters=None, measure=None):
+    """
+    Evaluates the Monetization sheet
+
+    :param volume:
+        np.ndarray
+        Total extracted volume [m3 fub / ha] of the base case, per 5 year period, time along the last axis
+    :param base_stock:
+        np.ndarray
+        Total carbon stock [ton C / ha] of the base case, per 5 year period
+    :param project_stock:
+        np.ndarray
+        Total carbon stock [ton C / ha] of the project case, per 5 year period
+    :param constants:
+        dict
+        Project constants with cell position as key, as returned by model_constants()
+    :param parameters:
+        dict
+        Model parameters, as returned by model_parameters(). Default parameters are used if None
+    :param measure:
+        str
+        'C' or 'CO2', measure used in the Monetization sheet. Default is 'CO2'
+    :return:
+        dict, dict, dict
+        Columns of the 5 year calculation part (A to W), columns of the annual part (Y to BT) and the single cell
+        values, all with the Monetization sheet column letter / cell position as key
+    """
+    if parameters is None:
+        parameters = model_parameters()
+    if measure is None:
+        measure = 'CO2'
+    if measure not in ['C', 'CO2']:
+        raise ValueError('Measure must be C or CO2, not {}'.format(measure))
+    prm = {_key: _as_array(_value) for _key, _value in parameters.items()}
+    cst = {_key: _as_array(constants[_key]) for _key in constant_cells}
+    g2 = 1. if measure == 'C' else 44. / 12.
+
+    volume = _fit_periods(volume)
+    base_stock = _fit_periods(base_stock)
+    project_stock = _fit_periods(project_stock)
+    shape = np.broadcast_shapes(
+        volume.shape, base_stock.shape, project_stock.shape,
+        *[_x.shape for _x in prm.values()], *[_x.shape for _x in cst.values()])
+
+    # 5 year calculation part
+    p = {}
+    p['A'] = period_length * np.arange(n_periods)
+    p['B'] = cst['AF5'] + p['A']
+    p['C'] = np.broadcast_to(volume, shape)
+    p['D'] = p['C'] * g2 * prm['k']
+    p['E'] = p['D'] * prm['p']
+    p['H'] = base_stock * g2 * np.ones(shape)
+    active = p['H'] > 0.
+    decay = 0.5 ** (period_length / prm['hsawn'])
+    product = np.zeros(shape)
+    previous = np.zeros(shape[:-1])
+    for _i in range(n_periods):
+        previous = np.where(active[..., _i], p['E'][..., _i] + previous * decay[..., 0], 0.)
+        product[..., _i] = previous
+    p['I'] = product
+    p['F'] = np.where(active, p['I'] - _previous(p['I']), 0.)
+    p['G'] = p['D'] * (prm['p'] * prm['SFsawn'] + prm['pp'] * prm['SFpp'] + prm['pf'] * prm['SFfuel']) + \
+        (p['E'] - p['F']) * prm['psfuel'] * prm['SFfuel']
+    p['J'] = np.where(active, np.cumsum(p['G'], axis=-1), 0.)
+    p['K'] = np.where(active, p['H'] + _previous(p['I']) + _previous(p['J']), 0.)
+    for _key, _from in zip(['L', 'M', 'N', 'O'], ['H', 'I', 'J', 'K']):
+        p[_key] = p[_from] * cst['F1']
+    p['P'] = project_stock * g2 * np.ones(shape)
+    p['Q'] = p['P'] * cst['F1']
+    p['R'] = p['P'] - p['K']
+    p['S'] = np.where(active, p['R'] - _previous(p['R']), 0.)
+    p['T'] = p['S'] / period_length
+    p['U'] = p['Q'] - p['O']
+    p['V'] = np.where(active, p['U'] - _previous(p['U']), 0.)
+    p['W'] = p['V'] / period_length
+
+    # Resampled section
+    t = np.arange(n_years, dtype=float)
+    annual_shape = shape[:-1] + (n_years,)
+    a = {}
+    a['Y'] = t
+    a['Z'] = cst['AF5'] + t
+    a['AA'] = p['W'][..., 1 + np.arange(n_years) // 5]
+    # Running average over 5 years, where the window is cut at the ends of the table
+    padded = np.zeros(annual_shape[:-1] + (n_years + 4,))
+    padded[..., 2:-2] = a['AA']
+    window_sum = sum(padded[..., _i:_i + n_years] for _i in range(5))
+    window_count = np.minimum(t + 2., n_years - 1.) - np.maximum(t - 2., 0.) + 1.
+    average = window_sum / window_count
+    a['AB'] = average.copy()
+    a['AB'][..., 0] += average[..., 2] - average[..., 4]
+    a['AB'][..., 1] += average[..., 2] - average[..., 3]
+    a['AC'] = a['AB'] * (44. / 12. if measure == 'C' else 1.)
+    a['AD'] = np.cumsum(a['AC'], axis=-1)
+
+    # Money value and CBO flows
+    s = {'B5': cst['AF5']}
+    s['AH3'] = cst['AF3'] + cst['AG3']
+    s['AK3'] = cst['AF3'] / cst['AI3']
+    s['AL3'] = cst['AG3'] / cst['AI3']
+    s['AM3'] = s['AK3'] + s['AL3']
+    s['AF9'] = cst['AF3'] * cst['AF8']
+    s['AG9'] = cst['AG3'] * cst['AF8']
+    s['AH9'] = s['AH3'] * cst['AF8']
+    a['AJ'] = t
+    a['AK'] = np.where(t < cst['AN4'], a['AC'] * s['AK3'], 0.)
+    a['AL'] = np.where(t < cst['AN4'], a['AC'] * s['AL3'], 0.)
+    a['AM'] = a['AK'] + a['AL']
+
+    # Project benefits
+    s['AQ4'] = cst['AO4'] - cst['AP4']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _tau, _n, _farmed, _accum, _contract in [('AN', 'AO', 'AP', 'AQ', cst['AN4']),
+                                                      ('AT', 'AU', None, None, long_contract)]:
+            a[_tau] = np.maximum(_contract - t, 0.) * np.ones(annual_shape)
+            a[_n] = np.where(a[_tau] > 0., 1. / (1. - np.exp(-s['AQ4'] * a[_tau])), 0.)
+            if _farmed is not None:
+                a[_farmed] = np.where(a[_n] != 0., a['AM'] / a[_n], 0.)
+                a[_accum] = np.where(a[_tau] > 0., np.cumsum(a[_farmed], axis=-1), 0.)
+        a['AR'] = np.where(a['AO'] != 0., a['AC'] / a['AO'], 0.)
+        a['AS'] = np.where(a['AN'] > 0., np.cumsum(a['AR'], axis=-1), 0.)
+        a['AV'] = np.where(a['AU'] != 0., a['AC'] / a['AU'], 0.)
+    a['AW'] = np.cumsum(a['AV'], axis=-1)
+
+    # Buffer
+    a['AX'] = np.where(t < cst['AY4'], a['AP'] * cst['AX4'], 0.)
+    a['AY'] = np.where(a['AX'] > 0., np.cumsum(a['AX'], axis=-1), 0.)
+    a['AZ'] = a['AP'] - a['AX']
+    s['AZ4'] = cst['AN4'] - cst['AY4'] - 1.
+    head = slice(0, n_sum_years)
+    s['BA4'] = _total(a['AX'][..., head]) + _total(np.where(t[head] >= cst['AY4'] + 1., a['AP'][..., head], 0.))
+    s['BB4'] = _total(np.where(a['AN'][..., head] <= s['AZ4'], a['AN'][..., head], 0.))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s['BC4'] = s['BA4'] / s['BB4']
+    a['BA'] = np.where(a['AN'] <= s['AZ4'], a['AN'] * s['BC4'] - a['AZ'], 0.)
+    a['BB'] = np.where(a['AN'] > 0., np.cumsum(a['AZ'], axis=-1), 0.)
+    a['BC'] = np.where(a['BA'] > 0., np.cumsum(a['BA'], axis=-1), 0.)
+
+    # Fossagrim values
+    a['BD'] = t + 1.
+    a['BE'] = a['AP']
+    a['BF'] = np.where(a['AX'] != 0., -a['AX'], a['BA'])
+    a['BG'] = a['AP'] - a['AX'] + a['BA']
+    s['BM2'] = (cst['BI8'] - cst['BH8']) / cst['BH8']
+    selling = np.ones(annual_shape)
+    selling[..., 1:] = np.cumprod(a['BG'][..., 1:] > 0., axis=-1)
+    a['BH'] = cst['BH8'] * selling
+    a['BI'] = a['BH'] * (1. + s['BM2'])
+    a['BI'][..., 0] = cst['BI8'][..., 0]
+    a['BJ'] = a['BI'] - a['BH']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a['BK'] = np.where(a['BI'] != 0., a['BJ'] / a['BI'], 0.)
+    a['BL'] = a['BI'] * a['BG']
+    a['BM'] = a['BG'] * a['BJ']
+    a['BN'] = np.where(a['AN'] > 0., np.cumsum(a['BM'], axis=-1), 0.)
+    s['BH2'] = s['AH9'] / _total(a['BG'][..., head])
+
+    # Forest owner values
+    a['BO'] = t + 1.
+    a['BQ'] = np.where(t + 1. == cst['AG6'], s['AG9'], 0.) * np.ones(annual_shape)
+    a['BQ'][..., 0] = s['AF9'][..., 0]
+    a['BR'] = a['BL'] - a['BM']
+    a['BS'] = np.where(a['AO'] > 0., np.cumsum(a['BR'], axis=-1), 0.)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a['BT'] = np.cumsum(a['BR'], axis=-1) / _total(a['BR'][..., head])
+    rate = cst['BP3']
+    s['BQ7'] = a['BQ'][..., :1] + _npv(rate, a['BQ'][..., 1:30])
+    s['BR7'] = a['BR'][..., :1] + _npv(rate, a['BR'][..., 1:30])
+    s['BP4'] = s['BQ7'] / (a['BG'][..., :1] + _npv(rate, a['BG'][..., 1:43]))
+    s['BP5'] = cst['BH8']
+
+    # Single cells are returned without the time axis
+    s = {_key: np.asarray(_value)[..., 0] for _key, _value in s.items()}
+    s['G2'] = g2
+    p = {_key: np.broadcast_to(_value, shape) for _key, _value in p.items()}
+    a = {_key: np.broadcast_to(_value, annual_shape) for _key, _value in a.items()}
+    return p, a, s
+
+
+def _series(table, key):
+    if key not in table:
+        raise ValueError('{} is missing in the Heureka results'.format(key))
+    return pd.to_numeric(pd.Series(table[key]), errors='coerce').fillna(0.).to_numpy(dtype=float)
+
+
+def evaluate_monetization(base_case, project_case, measure=None, parameters=None, **_kwargs):
+    """
+    Evaluates the Monetization sheet of one project directly from the Heureka results
+
+    :param base_case:
+        pd.DataFrame
+        Heureka results of the base case (BAU) model, with one column per variable, as returned by
+        read_rearranged_heureka_results()
+    :param project_case:
+        pd.DataFrame
+        Heureka results of the project case (PRES) model
+    :param measure:
+        str
+        'C' or 'CO2', measure used in the Monetization sheet. Default is 'CO2'
+    :param parameters:
+        dict
+        Model parameters, as returned by model_parameters(). Default parameters are used if None
+    :param _kwargs:
+        Dictionary of kwargs as returned by get_kwargs_from_stand(), with numerical values
+    :return:
+        pd.DataFrame, pd.DataFrame, dict
+        The 5 year calculation part, the annual part and the single cell values of the Monetization sheet, with the
+        sheet column letter / cell position as keys
+    """
+    periods, annual, cells = evaluate_monetization_arrays(
+        _series(base_case, volume_key),
+        _series(base_case, carbon_stock_key),
+        _series(project_case, carbon_stock_key),
+        model_constants(**_kwargs), parameters=parameters, measure=measure)
+    cells = {_key: float(_value) for _key, _value in cells.items()}
+    return pd.DataFrame(periods), pd.DataFrame(annual), cells
+
+
+def monetization_summary(periods, annual, cells):
+    """
+    Returns the key climate benefit and revenue figures of evaluated Monetization sheet(s)
+
+    :param periods:
+        dict
+        Columns of the 5 year calculation part, as returned by evaluate_monetization_arrays()
+    :param annual:
+        dict or pd.DataFrame
+        Columns of the annual part
+    :param cells:
+        dict
+        Single cell values
+    :return:
+        dict
+        Summary values, with the leading (scenario) dimensions of the input
+    """
+    annual = {_key: np.asarray(annual[_key]) for _key in ['AD', 'AP', 'AX', 'BA', 'BL', 'BM', 'BR']}
+    return {
+        'Accumulated climate benefit': annual['AD'][..., -1],
+        'Farmed offsets': np.sum(annual['AP'], axis=-1),
+        'Buffer reserved': np.sum(annual['AX'], axis=-1),
+        'Buffer released': np.sum(annual['BA'], axis=-1),
+        'Gross sales': np.sum(annual['BL'], axis=-1),
+        'Fossagrim revenue': np.sum(annual['BM'], axis=-1),
+        'Forest owner revenue': np.sum(annual['BR'], axis=-1),
+        'Forest owner NPV': cells['BR7'],
+        'Min. net price': cells['BP4'],
+        'Ref price': cells['BH2']
+    }
+
+
+def sweep_monetization(base_case, project_case, grid, measure=None, chunksize=2000, **_kwargs):
+    """
+    Evaluates the Monetization sheet for all combinations of the given parameter values
+
+    :param base_case:
+        pd.DataFrame
+        Heureka results of the base case (BAU) model, as returned by read_rearranged_heureka_results()
+    :param project_case:
+        pd.DataFrame
+        Heureka results of the project case (PRES) model
+    :param grid:
+        dict
+        Values to sweep, with the parameter name as key and a list of values as value. Parameter names are model
+        parameters (hpap, hsawn, SFsawn, ...) or project kwargs (e.g. 'Rent', 'Price growth', 'Buffer',
+        'Reserve years'). E.g.
+        {'hsawn': [30, 35, 40], 'SFsawn': np.linspace(0.4, 0.8, 21), 'Rent': [0.03, 0.04]}
+    :param measure:
+        str
+        'C' or 'CO2', measure used in the Monetization sheet. Default is 'CO2'
+    :param chunksize:
+        int
+        Number of scenarios evaluated at once, limits the memory usage
+    :param _kwargs:
+        Dictionary of kwargs as returned by get_kwargs_from_stand(), with numerical values
+    :return:
+        pd.DataFrame
+        One row per combination, with the swept parameter values followed by the summary values of
+        monetization_summary()
+    """
+    parameter_names = list(parameter_table[0])
+    unknown = [_key for _key in grid if _key not in parameter_names and _key not in _kwargs]
+    if len(unknown) > 0:
+        raise ValueError('Unknown sweep parameters: {}'.format(', '.join(unknown)))
+    if 'Batch 1 start date' in grid:
+        raise ValueError('Batch 1 start date can not be swept')
+
+    names = list(grid.keys())
+    mesh = np.meshgrid(*[np.asarray(grid[_key], dtype=float) for _key in names], indexing='ij')
+    scenarios = {_key: _x.ravel() for _key, _x in zip(names, mesh)}
+    n_scenarios = mesh[0].size if len(mesh) > 0 else 1
+
+    volume = _series(base_case, volume_key)
+    base_stock = _series(base_case, carbon_stock_key)
+    project_stock = _series(project_case, carbon_stock_key)
+
+    summaries = []
+    for start in range(0, n_scenarios, chunksize):
+        chunk = {_key: _x[start:start + chunksize] for _key, _x in scenarios.items()}
+        parameters = model_parameters(**{_key: _x for _key, _x in chunk.items() if _key in parameter_names})
+        kwargs = dict(_kwargs)
+        kwargs.update({_key: _x for _key, _x in chunk.items() if _key not in parameter_names})
+        periods, annual, cells = evaluate_monetization_arrays(
+            volume, base_stock, project_stock, model_constants(**kwargs), parameters=parameters, measure=measure)
+        summary = monetization_summary(periods, annual, cells)
+        n_chunk = min(chunksize, n_scenarios - start)
+        summaries.append({_key: np.broadcast_to(_x, (n_chunk,)) for _key, _x in summary.items()})
+
+    result = pd.DataFrame(scenarios, index=range(n_scenarios))
+    for _key in summaries[0]:
+        result[_key] = np.concatenate([_x[_key] for _x in summaries])
+    return result
+
+
+# Default relative standard deviations used by monte_carlo_monetization()
+default_uncertainty = {
+    'SFsawn': 0.2,  # SFpp and SFfuel follow SFsawn, unless they are given their own uncertainty
+    'hsawn': 0.2,
+    'Buffer': 0.2,
+    'base_stock': 0.05,  # Drawn independently for each 5 year period
+    'project_stock': 0.05
+}
+
+
+def _monte_carlo_chunk(n_draws, seed, volume, base_stock, project_stock, uncertainty, measure, _kwargs):
+    # Evaluates n_draws random scenarios, and returns the annual and the accumulated climate benefit and the offsets
+    # for sale as float32
+    rng = np.random.default_rng(seed)
+    parameter_names = list(parameter_table[0])
+
+    def factor(_shape, _sd):
+        return np.maximum(1. + _sd * rng.standard_normal(_shape), 0.)
+
+    base_stock = base_stock * factor((n_draws, base_stock.shape[-1]), uncertainty.get('base_stock', 0.))
+    project_stock = project_stock * factor((n_draws, project_stock.shape[-1]), uncertainty.get('project_stock', 0.))
+    defaults = model_parameters()
+    overrides = {}
+    kwargs = dict(_kwargs)
+    for _key, _sd in uncertainty.items():
+        if _key in parameter_names:
+            overrides[_key] = defaults[_key] * factor(n_draws, _sd)
+        elif _key == 'Buffer':
+            kwargs[_key] = np.minimum(_kwargs[_key] * factor(n_draws, _sd), 1.)
+        elif _key not in ['base_stock', 'project_stock']:
+            kwargs[_key] = _kwargs[_key] * factor(n_draws, _sd)
+    _, annual, _ = evaluate_monetization_arrays(
+        volume, base_stock, project_stock, model_constants(**kwargs), parameters=model_parameters(**overrides),
+        measure=measure)
+    return tuple(annual[_key].astype(np.float32) for _key in ['AC', 'AD', 'BG'])
+
+
+class _HistogramPercentiles:
+    # Percentiles of many draws of a (rows, columns) array, from fixed-bin histograms of each row and column, so the
+    # memory doesn't grow with the number of draws. The bins span the range of the first draws, widened by half that
+    # range on both sides. Later draws outside the bins are counted in the first or last bin, and the exact minimum
+    # and maximum of all draws are kept, so a row and column with only one value gives that value exactly
+    def __init__(self, n_bins):
+        self.n_bins = n_bins
+        self.low = None
+
+    def add(self, draws):
+        draws = np.asarray(draws, dtype=float)
+        if self.low is None:
+            span = np.max(draws, axis=0) - np.min(draws, axis=0)
+            span = np.where(span > 0., span, np.maximum(np.abs(draws[0]), 1.))
+            self.low = np.min(draws, axis=0) - 0.5 * span
+            self.width = 2. * span / self.n_bins
+            self.counts = np.zeros(draws.shape[1:] + (self.n_bins,), dtype=np.int64)
+            self.minimum = np.min(draws, axis=0)
+            self.maximum = np.max(draws, axis=0)
+        else:
+            self.minimum = np.minimum(self.minimum, np.min(draws, axis=0))
+            self.maximum = np.maximum(self.maximum, np.max(draws, axis=0))
+        bins = np.clip(np.floor((draws - self.low) / self.width), 0, self.n_bins - 1).astype(np.int64)
+        offsets = np.arange(bins[0].size).reshape(bins.shape[1:]) * self.n_bins
+        self.counts += np.bincount((bins + offsets).ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+
+    def percentiles(self, percentiles):
+        # Linear interpolation within the bin that holds the rank, as np.percentile() does between draws
+        cumulative = np.cumsum(self.counts, axis=-1)
+        n_draws = cumulative[..., -1:]
+        result = []
+        for percentile in percentiles:
+            rank = percentile / 100. * (n_draws - 1)
+            index = np.minimum(np.sum(cumulative <= rank, axis=-1, keepdims=True), self.n_bins - 1)
+            before = np.take_along_axis(cumulative, index, axis=-1) - np.take_along_axis(self.counts, index, axis=-1)
+            fraction = (rank - before + 0.5) / np.maximum(np.take_along_axis(self.counts, index, axis=-1), 1)
+            value = self.low + (index[..., 0] + np.clip(fraction[..., 0], 0., 1.)) * self.width
+            result.append(np.clip(value, self.minimum, self.maximum))
+        return result
+
+
+def monte_carlo_monetization(base_case, project_case, n_draws=10000, uncertainty=None, percentiles=None,
+                             chunksize=5000, n_processes=None, seed=None, measure=None, n_bins=2000, **_kwargs):
+    """
+    Evaluates the climate benefit of the Monetization sheet for random draws of the model parameters and the carbon
+    stock series, and returns percentile bands of the annual and the accumulated climate benefit, and of the offsets
+    for sale (project benefit less buffer reserved plus buffer released), which is where the buffer share matters.
+
+    Each draw multiplies the uncertain values with a factor 1 + sd * N(0, 1), cut at zero. The carbon stock of the
+    base case and the project case are perturbed independently for each 5 year period.
+
+    :param base_case:
+        pd.DataFrame
+        Heureka results of the base case (BAU) model, as returned by read_rearranged_heureka_results()
+    :param project_case:
+        pd.DataFrame
+        Heureka results of the project case (PRES) model
+    :param n_draws:
+        int
+        Number of random draws
+    :param uncertainty:
+        dict
+        Relative standard deviation, with model parameter name, project kwarg name, 'base_stock' or 'project_stock'
+        as key. Default is default_uncertainty
+    :param percentiles:
+        list
+        Percentiles of the returned bands. Default is [5, 25, 50, 75, 95]
+    :param chunksize:
+        int
+        Number of draws evaluated at once. Each chunk is reduced to histograms as soon as it is evaluated, so the
+        memory usage is set by chunksize and n_bins, and doesn't grow with n_draws
+    :param n_processes:
+        int
+        If given, the chunks are evaluated in a pool of this many processes
+    :param seed:
+        int
+        Seed of the random draws. For a given seed and chunksize, the result does not depend on n_processes
+    :param measure:
+        str
+        'C' or 'CO2', measure used in the Monetization sheet. Default is 'CO2'
+    :param n_bins:
+        int
+        Number of histogram bins of each year and series. The bins span twice the range of the first chunk, so the
+        percentiles are accurate to about 1 / n_bins of that range
+    :param _kwargs:
+        Dictionary of kwargs as returned by get_kwargs_from_stand(), with numerical values
+    :return:
+        pd.DataFrame, pd.DataFrame, pd.DataFrame
+        Percentile bands of the annual climate benefit, the accumulated climate benefit and the offsets for sale,
+        with the year as index and one column per percentile
+    """
+    if uncertainty is None:
+        uncertainty = default_uncertainty
+    if percentiles is None:
+        percentiles = [5, 25, 50, 75, 95]
+    parameter_names = list(parameter_table[0])
+    unknown = [_key for _key in uncertainty
+               if _key not in parameter_names + ['base_stock', 'project_stock'] and _key not in _kwargs]
+    if len(unknown) > 0:
+        raise ValueError('Unknown uncertain parameters: {}'.format(', '.join(unknown)))
+
+    volume = _series(base_case, volume_key)
+    base_stock = _series(base_case, carbon_stock_key)
+    project_stock = _series(project_case, carbon_stock_key)
+    sizes = [min(chunksize, n_draws - _start) for _start in range(0, n_draws, chunksize)]
+    # Each chunk has its own random stream, so the draws do not depend on where the chunk is evaluated
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(_n, _seed, volume, base_stock, project_stock, uncertainty, measure, _kwargs)
+            for _n, _seed in zip(sizes, seeds)]
+
+    histograms = _HistogramPercentiles(n_bins)
+    if n_processes is None:
+        for job in jobs:
+            histograms.add(np.stack(_monte_carlo_chunk(*job), axis=1))
+    else:
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            for chunk in executor.map(_monte_carlo_chunk, *zip(*jobs)):
+                histograms.add(np.stack(chunk, axis=1))
+
+    year = model_constants(**_kwargs)['AF5'] + np.arange(n_years)
+    bands = histograms.percentiles(percentiles)
+    result = []
+    for _i in range(3):
+        result.append(pd.DataFrame(
+            {'P{}'.format(_p): _band[_i] for _p, _band in zip(percentiles, bands)},
+            index=pd.Index(year, name='Year')))
+    return result[0], result[1], result[2]
+
+
+def _irr(cash_flows, low=-0.99, high=10., n_iterations=100):
+    # Internal rate of return of each row of cash_flows, where the first value is not discounted (like IRR() in
+    # Excel). Solved by bisection for all rows at once, and NaN where there is no sign change in [low, high]
+    exponents = np.arange(cash_flows.shape[-1])
+
+    def npv(_rate):
+        return np.sum(cash_flows * (1. + _rate[..., np.newaxis]) ** -exponents, axis=-1)
+
+    low = np.full(cash_flows.shape[:-1], low)
+    high = np.full(cash_flows.shape[:-1], high)
+    f_low = npv(low)
+    valid = np.sign(f_low) != np.sign(npv(high))
+    for _ in range(n_iterations):
+        middle = 0.5 * (low + high)
+        f_middle = npv(middle)
+        same_sign = np.sign(f_middle) == np.sign(f_low)
+        low = np.where(same_sign, middle, low)
+        f_low = np.where(same_sign, f_middle, f_low)
+        high = np.where(same_sign, high, middle)
+    return np.where(valid, 0.5 * (low + high), np.nan)
+
+
+def portfolio_prices(projects, rate=None, net_price=None, measure=None):
+    """
+    Evaluates the forest owner values of the Monetization sheet for several projects at once, and returns the
+    break-even net price, the NPV of the base and project case revenues and the IRR of the project for each project.
+
+    :param projects:
+        dict
+        Project name as key, and (base_case, project_case, kwargs) as value, where base_case and project_case are the
+        Heureka results of the BAU and PRES models, as returned by read_rearranged_heureka_results(), and kwargs is
+        the dictionary returned by get_kwargs_from_stand(..., link_settings=False)
+    :param rate:
+        float or list
+        If given, replaces the 'NIBOR 10yr' of all projects, e.g. to re-price after an interest rate change.
+        A list gives one rate per project
+    :param net_price:
+        float or list
+        If given, replaces the 'Net price' of all projects. A list gives one price per project
+    :param measure:
+        str
+        'C' or 'CO2', measure used in the Monetization sheet. Default is 'CO2'
+    :return:
+        pd.DataFrame
+        One row per project
+    """
+    names = list(projects.keys())
+    constants = []
+    for _i, name in enumerate(names):
+        _kwargs = dict(projects[name][2])
+        if rate is not None:
+            _kwargs['NIBOR 10yr'] = float(np.broadcast_to(rate, (len(names),))[_i])
+        if net_price is not None:
+            _kwargs['Net price'] = float(np.broadcast_to(net_price, (len(names),))[_i])
+        constants.append(model_constants(**_kwargs))
+    constants = {_key: np.array([_c[_key] for _c in constants], dtype=float) for _key in constant_cells}
+
+    volume = np.stack([_fit_periods(_series(projects[_n][0], volume_key)) for _n in names])
+    base_stock = np.stack([_fit_periods(_series(projects[_n][0], carbon_stock_key)) for _n in names])
+    project_stock = np.stack([_fit_periods(_series(projects[_n][1], carbon_stock_key)) for _n in names])
+    _, annual, cells = evaluate_monetization_arrays(
+        volume, base_stock, project_stock, constants, measure=measure)
+
+    # The project replaces the root net of the harvests (BQ) with the revenue of the sold offsets (BR)
+    cash_flow = annual['BR'][..., :30] - annual['BQ'][..., :30]
+    return pd.DataFrame({
+        'NIBOR 10yr': constants['BP3'],
+        'Contract length': constants['AN4'],
+        'Root net total': cells['AH9'],
+        'Offsets': np.sum(annual['BG'][..., :n_sum_years], axis=-1),
+        'Net price': constants['BH8'],
+        'Break-even net price': cells['BP4'],
+        'Base case NPV': cells['BQ7'],
+        'Project case NPV': cells['BR7'],
+        'NPV gain': cells['BR7'] - cells['BQ7'],
+        'IRR': _irr(cash_flow)
+    }, index=pd.Index(names, name='Project name'))
@@ -0,0 +1,151 @@
+"""
+Make-style runner for the stages of the project workflow, e.g.
+
+    Forvaltningsplan xlsx -> Averaged stand data CSV (+ QC plots, PDF QC log)
+    Heureka results xlsx -> Rearranged results -> monetization file -> QC plots
+
+Each stage is a plain function call with the files it reads, the files it writes, and the parameters that affect its
+result. After a stage has run, the SHA1 of its input files and a hash of its parameters are stored in a state file,
+and on the next run the stage is skipped when they are unchanged and its output files exist. The dependencies between
+the stages follow from the files: a stage that reads the output of an earlier stage is run again when that output
+changes, and is not run at all when the earlier stage fails.
+"""
+import os
+import json
+import hashlib
+
+from Fossagrim.io.fossagrim_io import file_fingerprint
+
+
+def params_hash(params):
+    """
+    Returns a SHA1 of the parameters, which must be serializable to JSON, or have a meaningful str(), like dates
+    """
+    text = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class Pipeline:
+    """
+    Stages are run in the order they are added, so a stage must be added after the stages that write its input files.
+    E.g.
+    > pipeline = Pipeline('FHF23-007 pipeline.json')
+    > pipeline.add('export', fio.export_fossagrim_stand_to_heureka, inputs=[stand_file], outputs=[csv_stand_file],
+    >              args=(stand_file, csv_stand_file), kwargs={'average_over': average_over})
+    > status = pipeline.run()
+
+    :param state_file:
+        str
+        JSON file where the fingerprints of the last successful run of each stage are stored
+    """
+    # Status of each stage after run()
+    statuses = ['run', 'skipped', 'failed', 'blocked', 'missing input']
+
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self.stages = []
+
+    def add(self, name, function, inputs=None, outputs=None, params=None, args=None, kwargs=None):
+        """
+        Adds a stage, which is run as function(*args, **kwargs)
+
+        :param name:
+            str
+            Unique name of the stage
+        :param inputs:
+            list
+            Files the stage reads
+        :param outputs:
+            list
+            Files the stage writes. A file can be both input and output, e.g. a workbook the stage adds a sheet to
+        :param params:
+            dict
+            Parameters that affect the result of the stage. Default is kwargs
+        """
+        if name in [_stage['name'] for _stage in self.stages]:
+            raise ValueError('Stage {} is already added'.format(name))
+        inputs = [str(_x) for _x in (inputs or [])]
+        outputs = [str(_x) for _x in (outputs or [])]
+        later_inputs = [_x for _stage in self.stages for _x in _stage['inputs'] if _x in outputs and _x not in inputs]
+        if len(later_inputs) > 0:
+            raise ValueError('Stage {} writes {}, which is read by an earlier stage'.format(name, later_inputs[0]))
+        kwargs = {} if kwargs is None else kwargs
+        self.stages.append({
+            'name': name, 'function': function, 'inputs': inputs, 'outputs': outputs,
+            'params': kwargs if params is None else params, 'args': tuple(args or ()), 'kwargs': kwargs})
+
+    def _read_state(self):
+        if not os.path.isfile(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as err_msg:
+            print('WARNING, could not read {}: {}'.format(os.path.basename(self.state_file), err_msg))
+            return {}
+
+    def _write_state(self, state):
+        # write to a temporary file first, so an interrupted write can't leave a corrupt state file
+        tmp_file = '{}.tmp'.format(self.state_file)
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_file, self.state_file)
+
+    def run(self, force=None, verbose=False):
+        """
+        Runs the stages that are out of date
+
+        :param force:
+            list
+            Names of stages that are run even if they are up to date. The stages that depend on them are only run if
+            their output changes
+        :param verbose:
+            bool
+        :return:
+            dict
+            Status of each stage, see Pipeline.statuses
+        """
+        force = [] if force is None else force
+        state = self._read_state()
+        status = {}
+        # Output files of stages that failed, or were not run because their input was missing
+        bad_files = set()
+        for stage in self.stages:
+            name = stage['name']
+            if any(_x in bad_files for _x in stage['inputs']):
+                status[name] = 'blocked'
+            elif not all(os.path.isfile(_x) for _x in stage['inputs']):
+                status[name] = 'missing input'
+            else:
+                previous = state.get(name, {})
+                fingerprints = {_x: file_fingerprint(_x, previous.get('inputs', {}).get(_x))
+                                for _x in stage['inputs']}
+                up_to_date = (
+                    name not in force
+                    and previous.get('params') == params_hash(stage['params'])
+                    and sorted(previous.get('inputs', {})) == sorted(fingerprints)
+                    and all(previous['inputs'][_x]['sha1'] == fingerprints[_x]['sha1'] for _x in fingerprints)
+                    and all(os.path.isfile(_x) for _x in stage['outputs']))
+                if up_to_date:
+                    status[name] = 'skipped'
+                else:
+                    if verbose:
+                        print('Running {}'.format(name))
+                    try:
+                        stage['function'](*stage['args'], **stage['kwargs'])
+                    except Exception as error:
+                        print('WARNING {} failed: {}: {}'.format(name, type(error).__name__, error))
+                        status[name] = 'failed'
+                        _ = state.pop(name, None)
+                    else:
+                        status[name] = 'run'
+                        # Inputs that are also outputs have changed, so all inputs are fingerprinted after the run
+                        state[name] = {
+                            'inputs': {_x: file_fingerprint(_x, fingerprints[_x]) for _x in stage['inputs']},
+                            'params': params_hash(stage['params'])}
+                    self._write_state(state)
+            if status[name] in ['failed', 'blocked', 'missing input']:
+                bad_files.update(stage['outputs'])
+            if verbose:
+                print('{}: {}'.format(name, status[name]))
+        return status
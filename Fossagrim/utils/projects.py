@@ -3,7 +3,6 @@ import numpy as np
 import pandas as pd
 import openpyxl
 # from copy import deepcopy
-import Fossagrim.plotting.misc_plots as fpp
 import Fossagrim.io.fossagrim_io as fio
 
 methods = ['BAU', 'PRES']  # "Business as usual" and "Preservation"
@@ -12,6 +11,8 @@ methods = ['BAU', 'PRES']  # "Business as usual" and "Preservation"
 def arrange_import(_stand_file, _csv_stand_file, _csv_treatment_file, _average_over, _stand_id_key, _project_tag,
                    _verbose=False, **_kwargs):
 
+    import Fossagrim.plotting.misc_plots as fpp
+
     # QC input table
     table = fio.read_excel(_stand_file, 7, 0)
     fpp.qc_stand_data(
@@ -42,13 +43,14 @@ def arrange_import(_stand_file, _csv_stand_file, _csv_treatment_file, _average_o
 
 def arrange_results(_result_file, _sheet_names, _combine_sheets, _monetization_file, _verbose=False, **_kwargs):
     # sheet names in the resulting Excel file
+    # The monetization file is built, including the monetization calculations, in one pass
     write_monetization_file = \
         fio.rearrange_raw_heureka_results(
-            _result_file, _sheet_names, _combine_sheets, monetization_file=_monetization_file, verbose=_verbose)
+            _result_file, _sheet_names, _combine_sheets, monetization_file=_monetization_file, verbose=_verbose,
+            monetization_kwargs=_kwargs)
 
     if write_monetization_file:
-        print('Try to modify Monetization file')
-        fio.modify_monetization_file(_monetization_file, **_kwargs)
+        print('Monetization file {} written'.format(os.path.basename(_monetization_file)))
 
 
 def project_settings(_project_tag, _project_settings_file):
@@ -1,10 +1,12 @@
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import openpyxl
 # from copy import deepcopy
-import Fossagrim.plotting.misc_plots as fpp
 import Fossagrim.io.fossagrim_io as fio
+import Fossagrim.utils.monetization_model as fmm
 
 methods = ['BAU', 'PRES']  # "Business as usual" and "Preservation"
 
@@ -14,8 +16,13 @@ def arrange_import(_stand_file, _csv_stand_file, _csv_treatment_file, _average_o
                    _verbose=False, **_kwargs):
     from Fossagrim.qc_input_pdfs import pdf_consistency
 
-    # QC input table
+    import Fossagrim.plotting.misc_plots as fpp
+
+    # The stand file is read once, and the same table is used by the QC and the export below.
+    # See Project.arrange_import(), which also shares the 'Forvaltning' sheet with the pdf QC
     table = fio.read_excel(_stand_file, 7, 'data')
+
+    # QC input table
     fpp.qc_stand_data(
         table,
         os.path.basename(_stand_file),
@@ -34,7 +41,8 @@ def arrange_import(_stand_file, _csv_stand_file, _csv_treatment_file, _average_o
         stand_id_key=_stand_id_key,
         average_name='{} '.format(_project_tag),
         sheet_name='data',
-        verbose=_verbose
+        verbose=_verbose,
+        table=table
     )
 
     # # The treatment is now added to the csv stand file instead, among the UserDefinedVariables,
@@ -49,15 +57,287 @@ def arrange_import(_stand_file, _csv_stand_file, _csv_treatment_file, _average_o
     # )
 
 
-def arrange_results(_result_file, _sheet_names, _combine_sheets, _monetization_file, _verbose=False, **_kwargs):
+def arrange_results(_result_file, _sheet_names, _combine_sheets, _monetization_file, _verbose=False, _overwrite='ask',
+                    **_kwargs):
     # sheet names in the resulting Excel file
+    # The monetization file is built, including the monetization calculations, in one pass. Without kwargs, only the
+    # rearranged results are written to it
     write_monetization_file = \
         fio.rearrange_raw_heureka_results(
-            _result_file, _sheet_names, _combine_sheets, monetization_file=_monetization_file, verbose=_verbose)
+            _result_file, _sheet_names, _combine_sheets, monetization_file=_monetization_file, verbose=_verbose,
+            overwrite=(_overwrite == 'always'), monetization_kwargs=_kwargs or None,
+            overwrite_monetization_file=_overwrite)
 
     if write_monetization_file:
-        print('Try to modify Monetization file')
-        fio.modify_monetization_file(_monetization_file, **_kwargs)
+        print('Monetization file {} written'.format(os.path.basename(_monetization_file)))
+
+
+class Project:
+    """
+    One project in the project settings file, with everything the import, QC, export and result stages need.
+
+    The settings row is looked up once, and the 'data' and 'Forvaltning' sheets of the stand file (Forvaltningsplan)
+    are read together, in one pass over the workbook, the first time any of them are needed. The stages are then
+    given these tables instead of reading the files again, so a full project import reads each input file once. E.g.
+    > project = Project('FHF23-007 Gudmund Aaker', project_settings_file)
+    > project.create_result_file()
+    > project.arrange_import(verbose=True)
+
+    :param project_name:
+        str
+        Name that identifies the project, e.g. "FHF23-007 Gudmund Aaker"
+    :param project_settings_file:
+        str
+        Full path name of the project settings Excel sheet.
+    :param settings_table:
+        pd.DataFrame
+        The 'Settings' sheet of the project settings file, if already read, e.g. when handling several projects.
+        Otherwise it is read here
+    """
+    # Header row of the sheets read from the stand file
+    stand_sheets = {'data': 7, 'Forvaltning': 6}
+
+    def __init__(self, project_name, project_settings_file, settings_table=None):
+        if settings_table is None:
+            settings_table = fio.read_excel(project_settings_file, 1, 'Settings')
+        self.project_name = project_name
+        self.project_settings_file = project_settings_file
+
+        i = None
+        for _i, p_name in enumerate(settings_table['Project name']):
+            if not isinstance(p_name, str):
+                continue
+            if settings_table['Status'][_i] not in ['Active', 'Prospective']:
+                continue
+            if project_name == p_name.strip():
+                i = _i
+                break
+        if i is None:
+            raise IOError('Project name {} not found in {}'.format(
+                project_name, os.path.basename(project_settings_file)
+            ))
+
+        # The settings row of this project
+        self.settings = settings_table.iloc[i].copy()
+        self.hrapp = None
+        self.srapp = None
+        if isinstance(self.settings['Hovedtallsrapport'], str) and isinstance(self.settings['Sumtallsrapport'], str):
+            self.hrapp = self.settings['Hovedtallsrapport']
+            self.srapp = self.settings['Sumtallsrapport']
+
+        self.project_folder = self.settings['Project folder']
+        self.qc_folder = os.path.join(self.project_folder, 'QC_plots')
+        self.stand_id_key = self.settings['Stand id key']
+        self.stand_file = os.path.join(self.project_folder, self.settings['Stands file'])
+        self.result_file = os.path.join(self.project_folder, self.settings['Results file'])
+        self.csv_stand_file = os.path.join(self.project_folder, '{} Averaged stand data.csv'.format(project_name))
+        self.csv_treatment_file = os.path.join(self.project_folder, '{} Averaged treatment.csv'.format(project_name))
+        if isinstance(self.settings.get('Monetization file', None), str):
+            self.monetization_file = os.path.join(self.project_folder, self.settings['Monetization file'])
+        else:
+            self.monetization_file = os.path.join(self.project_folder, '{} Monetization.xlsx'.format(project_name))
+
+        self._stand_tables = None
+        self._active_forests = None
+
+    def _read_stand_file(self):
+        if self._stand_tables is None:
+            self._stand_tables = fio.read_excel_sheets(self.stand_file, self.stand_sheets)
+            if self._stand_tables is None:
+                raise IOError('Stand file {} could not be read'.format(os.path.basename(self.stand_file)))
+        return self._stand_tables
+
+    @property
+    def stand_table(self):
+        """
+        Copy of the 'data' sheet of the stand file, as read by fio.read_excel(stand_file, 7, 'data')
+        """
+        return self._read_stand_file()['data'].copy()
+
+    @property
+    def forvaltning_table(self):
+        """
+        Copy of the 'Forvaltning' sheet of the stand file, as read by fio.read_excel(stand_file, 6, 'Forvaltning')
+        """
+        return self._read_stand_file()['Forvaltning'].copy()
+
+    @property
+    def active_forests(self):
+        """
+        Active stands, their productive areas, and area fractions of each wood species,
+        see fio.get_active_forests_from_stand()
+        """
+        if self._active_forests is None:
+            self._active_forests = fio.get_active_forests_from_stand(
+                self.stand_file, stand_id_key=self.stand_id_key, sheet_name='data',
+                table=self._read_stand_file()['data'])
+        return self._active_forests
+
+    @property
+    def average_over(self):
+        return self.active_forests[0]
+
+    @property
+    def result_sheets(self):
+        # Excel can only handle sheet names that are shorter than 31 characters, and the longest string
+        # we add is "Spruce PRES", which is 11 characters long.
+        if len(self.project_name) >= 20:
+            tmp_project_name = self.project_name[:10]
+        else:
+            tmp_project_name = self.project_name
+        return ['{} {} {}'.format(tmp_project_name, _x, _y) for _x, _y in
+                zip(np.repeat(list(self.average_over.keys()), 2), methods * len(self.average_over))]
+
+    @property
+    def combine_sheets(self):
+        # With the new set-up (reading active productive area and fractions directly from Bestandsutvalg file)
+        _active_prod_areas_fract = self.active_forests[2]
+        combine_fractions = list(_active_prod_areas_fract.values())
+        forest_types = list(_active_prod_areas_fract.keys())
+
+        if len(combine_fractions) < 2:
+            # only one forest type to "combine", so no combination of forest types necessary,
+            # and the 'combine_fraction' is overridden using a factor of 1
+            _combine_fractions = [1.]
+        else:
+            _combine_fractions = combine_fractions
+
+        _result_sheets = self.result_sheets
+        _combine_sheets = {}
+        for j, method in enumerate(methods):
+            _this_list = []
+            for k, c_frac in enumerate(_combine_fractions):
+                _this_list.append(_result_sheets[j + 2 * k])
+                _this_list.append(c_frac)
+            _combine_sheets['{} Combined Stands {} {}'.format(
+                self.project_name, '-and-'.join(forest_types), method)] = _this_list
+        return _combine_sheets
+
+    def settings_tuple(self):
+        """
+        Returns the project settings in the same order as project_settings()
+        """
+        return (self.project_folder, self.stand_file, self.average_over, self.stand_id_key, self.result_file,
+                self.result_sheets, self.combine_sheets, None, self.csv_stand_file, self.csv_treatment_file,
+                self.hrapp, self.srapp, {})
+
+    def create_result_file(self, overwrite='ask'):
+        """
+        Creates the QC folder, and the empty results file with one sheet per result sheet, which the Heureka
+        results are pasted into
+
+        :param overwrite:
+            str
+            Policy used when the results file already exists, 'ask', 'never' or 'always', see fio.allow_overwrite()
+        :return:
+            bool
+            True if the results file was written
+        """
+        # Create empty QC folder if it doesn't exist from before
+        if not os.path.exists(self.qc_folder):
+            os.makedirs(self.qc_folder)
+
+        # Create empty results file
+        create_results_file = fio.allow_overwrite(self.result_file, overwrite)
+
+        if create_results_file:
+            writer = pd.ExcelWriter(self.result_file, engine='xlsxwriter')
+            wb = writer.book
+            for _sheet in self.result_sheets:
+                _ = wb.add_worksheet(_sheet)
+            writer.close()
+        return create_results_file
+
+    def qc_stand_data(self):
+        """
+        QC plots of the stand data, see misc_plots.qc_stand_data()
+        """
+        import Fossagrim.plotting.misc_plots as fpp
+        fpp.qc_stand_data(
+            self.stand_table,
+            os.path.basename(self.stand_file),
+            os.path.join(os.path.dirname(self.stand_file), 'QC_plots')
+        )
+
+    def check_pdfs(self):
+        """
+        QC of the stand file against the Hovedtallsrapport and Sumtallsrapport, see qc_input_pdfs.pdf_consistency()
+        """
+        from Fossagrim.qc_input_pdfs import pdf_consistency
+        pdf_consistency(self.stand_file, self.hrapp, self.srapp, self.project_name,
+                        fplan_table=self.forvaltning_table)
+
+    def export_stands(self, verbose=False):
+        """
+        Writes the averaged stands to the csv file that is imported in Heureka
+        """
+        fio.export_fossagrim_stand_to_heureka(
+            self.stand_file,
+            self.csv_stand_file,
+            average_over=self.average_over,
+            stand_id_key=self.stand_id_key,
+            average_name='{} '.format(self.project_name),
+            sheet_name='data',
+            verbose=verbose,
+            table=self.stand_table
+        )
+
+    def arrange_import(self, verbose=False):
+        """
+        QC of the stand file (and the pdf reports if given), and export of the averaged stands to Heureka,
+        see arrange_import()
+        """
+        self.qc_stand_data()
+        if self.hrapp is not None and self.srapp is not None:
+            self.check_pdfs()
+        self.export_stands(verbose=verbose)
+
+    def arrange_results(self, verbose=False, overwrite='ask', **_kwargs):
+        """
+        Rearranges the Heureka results, and writes the monetization file, see arrange_results()
+        """
+        arrange_results(self.result_file, self.result_sheets, self.combine_sheets, self.monetization_file,
+                        _verbose=verbose, _overwrite=overwrite, **_kwargs)
+
+    def pipeline(self, verbose=False):
+        """
+        Returns the workflow of the project as a Pipeline, which only runs the stages whose input files or
+        parameters have changed since the last run, see Fossagrim.utils.pipeline. The fingerprints are stored in
+        "<project name> pipeline.json" in the project folder. E.g.
+        > status = Project(project_name, project_settings_file).pipeline().run()
+
+        Stages that depend on the Heureka results report 'missing input' until the results file exists, and the
+        stages after the rearrangement fail until the Heureka results are pasted into it.
+        The monetization file is built in the rearrangement stage with the values, not links, of the project
+        settings, so that it is rebuilt from the Heureka results when one of them changes.
+        """
+        from Fossagrim.utils.pipeline import Pipeline
+        pipeline = Pipeline(os.path.join(self.project_folder, '{} pipeline.json'.format(self.project_name)))
+        qc_log_file = os.path.join(os.path.dirname(self.stand_file), 'qc_log {}.txt'.format(self.project_name))
+
+        pipeline.add('qc stand data', self.qc_stand_data, inputs=[self.stand_file])
+        if self.hrapp is not None and self.srapp is not None:
+            pipeline.add('check pdfs', self.check_pdfs, inputs=[self.stand_file, self.hrapp, self.srapp],
+                         outputs=[qc_log_file])
+        pipeline.add('export stands', self.export_stands, inputs=[self.stand_file], outputs=[self.csv_stand_file],
+                     params={'average_over': self.average_over, 'stand_id_key': self.stand_id_key,
+                             'project_name': self.project_name},
+                     kwargs={'verbose': verbose})
+
+        result_sheets, combine_sheets = self.result_sheets, self.combine_sheets
+        monetization_kwargs, _ = fio.get_kwargs_from_stand(self.stand_file, self.project_settings_file,
+                                                           self.project_name, link_settings=False)
+        # The whole monetization file is rebuilt from the results, so that it never is modified twice
+        pipeline.add('rearrange results', fio.rearrange_raw_heureka_results,
+                     inputs=[self.result_file], outputs=[self.result_file, self.monetization_file],
+                     params={'sheet_names': result_sheets, 'combine_sheets': combine_sheets,
+                             'monetization_kwargs': monetization_kwargs},
+                     args=(self.result_file, result_sheets, combine_sheets),
+                     kwargs={'monetization_file': self.monetization_file, 'verbose': verbose, 'overwrite': True,
+                             'monetization_kwargs': monetization_kwargs, 'overwrite_monetization_file': 'always'})
+        pipeline.add('qc plots', fio.qc_plots, inputs=[self.monetization_file],
+                     args=(self.monetization_file, self.project_name))
+        return pipeline
 
 
 def project_settings(_project_name, _project_settings_file, _fix_import: bool = True, _verbose: bool = False):
@@ -83,28 +363,7 @@ def project_settings(_project_name, _project_settings_file, _fix_import: bool =
         avoiding the possibility of overwriting the results file.
     :return:
     """
-    p_tabl = fio.read_excel(_project_settings_file, 1, 'Settings')
-
-    i = None
-    tag_found = False
-    _hrapp = None
-    _srapp = None
-    for i, p_name in enumerate(p_tabl['Project name']):
-        if not isinstance(p_name, str):
-            continue
-        if p_tabl['Status'][i] not in ['Active', 'Prospective']:
-            continue
-        if _project_name == p_name.strip():
-            tag_found = True
-            if isinstance(p_tabl['Hovedtallsrapport'][i], str) and isinstance(p_tabl['Sumtallsrapport'][i], str):
-                _hrapp = p_tabl['Hovedtallsrapport'][i]
-                _srapp = p_tabl['Sumtallsrapport'][i]
-            break
-
-    if not tag_found:
-        raise IOError('Project name {} not found in {}'.format(
-            _project_name, os.path.basename(_project_settings_file)
-        ))
+    project = Project(_project_name, _project_settings_file)
 
     if _verbose:
         if _fix_import:
@@ -113,95 +372,160 @@ def project_settings(_project_name, _project_settings_file, _fix_import: bool =
             ))
             print('Using project folder {},\n with stand ID key {},\n and stand file {},\n '
                   'to create the empty results file {}'.format(
-                p_tabl['Project folder'][i],
-                p_tabl['Stand id key'][i],
-                p_tabl['Stands file'][i],
-                p_tabl['Results file'][i]))
-            if _hrapp is not None:
+                project.project_folder,
+                project.stand_id_key,
+                project.settings['Stands file'],
+                project.settings['Results file']))
+            if project.hrapp is not None:
                 print(" AND Hovedtallsrapport: '{}' and Sumtallsrapport: '{}' to QC the input".format(
-                    os.path.basename(_hrapp), os.path.basename(_srapp)))
-
-    _project_folder = p_tabl['Project folder'][i]
-    _qc_folder = os.path.join(_project_folder, 'QC_plots')
-    _stand_id_key = p_tabl['Stand id key'][i]
-    _stand_file = os.path.join(_project_folder, p_tabl['Stands file'][i])
-    _result_file = os.path.join(_project_folder, p_tabl['Results file'][i])
-    # _monetization_file = os.path.join(_project_folder, p_tabl['Monetization file'][i])  # not calculated in Python
-    _csv_stand_file = os.path.join(_project_folder, '{} Averaged stand data.csv'.format(_project_name))
-    _csv_treatment_file = os.path.join(_project_folder, '{} Averaged treatment.csv'.format(_project_name))
-
-    _average_over, _active_prod_areas, _active_prod_areas_fract = fio.get_active_forests_from_stand(
-        _stand_file, stand_id_key=_stand_id_key, sheet_name='data')
-
-    # Excel can only handle sheet names that are shorter than 31 characters, and the longest string
-    # we add is "Spruce PRES", which is 11 characters long.
-    if len(_project_name) >= 20:
-        tmp_project_name = _project_name[:10]
-    else:
-        tmp_project_name = _project_name
-    _result_sheets = \
-        ['{} {} {}'.format(tmp_project_name, _x, _y) for _x, _y in
-         zip(np.repeat(list(_average_over.keys()), 2), methods * len(_average_over))]
-         # zip(np.repeat(list(_average_over.keys()), max(2, len(_average_over))), methods * len(_average_over))]
+                    os.path.basename(project.hrapp), os.path.basename(project.srapp)))
 
     # We could extract the combine fractions directly from the stand file (Bestandsutvalg,
-    # through "fio.get_active_forests_from_stand()" above) because it should
+    # through "Project.active_forests" above) because it should
     # contain the areas/volumes of each of the different wood species
+    _, _active_prod_areas, _active_prod_areas_fract = project.active_forests
     for key, value in _active_prod_areas.items():
         print('{} stands have a total area of {} daa, which corresponds to a fraction of {:.3} of the total area'.format(
             key, sum(value), _active_prod_areas_fract[key]))
 
-    _combine_sheets = {}
-    # _kwargs, combine_fractions = fio.get_kwargs_from_stand(_stand_file, _project_settings_file, _project_tag)
-    # forest_types = [_x.strip() for _x in p_tabl['Forest types'][i].split(',')] # From OLD projects.py
+    if _fix_import:
+        project.create_result_file()
 
-    # With the new set-up (reading active productive area and fractions directly from Bestandsutvalg file)
-    combine_fractions = list(_active_prod_areas_fract.values())
-    forest_types = list(_active_prod_areas_fract.keys())
+    return project.settings_tuple()
 
-    if len(combine_fractions) < 2:
-        # only one forest type to "combine", so no combination of forest types necessary,
-        # and the 'combine_fraction' is overridden using a factor of 1
-        _combine_fractions = [1.]
-    else:
-        _combine_fractions = combine_fractions
-
-    for j, method in enumerate(methods):
-        _this_list = []
-        for k, c_frac in enumerate(_combine_fractions):
-            _this_list.append(_result_sheets[j + 2 * k])
-            _this_list.append(c_frac)
-        _combine_sheets['{} Combined Stands {} {}'.format(_project_name, '-and-'.join(forest_types), method)] = \
-            _this_list
-
-    if not _fix_import:
-        return (_project_folder, _stand_file, _average_over, _stand_id_key, _result_file, _result_sheets,
-                _combine_sheets, None, _csv_stand_file, _csv_treatment_file, _hrapp, _srapp,  {})
-
-    # Create empty QC folder if it doesn't exist from before
-    if not os.path.exists(_qc_folder):
-        os.makedirs(_qc_folder)
-
-    # Create empty results file
-    create_results_file = False
-    if os.path.isfile(_result_file):
-        print("WARNING result file {} already exists.".format(
-            os.path.split(_result_file)[-1]))
-        _ans = input("Do you want to overwrite? Y/[N]:")
-        if _ans.upper() == 'Y':
-            create_results_file = True
-    else:
-        create_results_file = True
 
-    if create_results_file:
-        writer = pd.ExcelWriter(_result_file, engine='xlsxwriter')
-        wb = writer.book
-        for _sheet in _result_sheets:
-            _ = wb.add_worksheet(_sheet)
-        writer.close()
+def portfolio_prices(_project_settings_file, _rate=None, _net_price=None, _verbose=False):
+    """
+    Calculates the break-even net price, NPV and IRR of all active and prospective projects in the project settings
+    file, directly from their rearranged Heureka results, without opening the monetization files
 
-    return _project_folder, _stand_file, _average_over, _stand_id_key, _result_file, _result_sheets, _combine_sheets, \
-        None, _csv_stand_file, _csv_treatment_file, _hrapp, _srapp, {}
+    :param _project_settings_file:
+        str
+        Full path name of the project settings Excel sheet.
+    :param _rate:
+        float
+        If given, replaces the 'NIBOR 10yr' of all projects
+    :param _net_price:
+        float
+        If given, replaces the 'Net price' of all projects
+    :return:
+        pd.DataFrame
+        Portfolio table with one row per project, see monetization_model.portfolio_prices()
+    """
+    p_tabl = fio.read_excel(_project_settings_file, 1, 'Settings')
+
+    projects = {}
+    for i, p_name in enumerate(p_tabl['Project name']):
+        if not isinstance(p_name, str):
+            continue
+        if p_tabl['Status'][i] not in ['Active', 'Prospective']:
+            continue
+        _project_name = p_name.strip()
+        try:
+            _project = Project(_project_name, _project_settings_file, settings_table=p_tabl)
+            _results = fio.read_rearranged_heureka_results(_project.result_file)
+            _base_case, _project_case = [_results[_x] for _x in _project.combine_sheets.keys()]
+            _kwargs, _ = fio.get_kwargs_from_stand(_project.stand_file, _project_settings_file, _project_name,
+                                                   link_settings=False)
+        except (IOError, KeyError, ValueError) as error:
+            print('WARNING {} is not included in the portfolio: {}'.format(_project_name, error))
+            continue
+        projects[_project_name] = (_base_case, _project_case, _kwargs)
+
+    return fmm.portfolio_prices(projects, rate=_rate, net_price=_net_price)
+
+
+def _run_project(_project_name, _project_settings_file, _settings_table, _fix_import, _overwrite, _verbose):
+    # Runs the import, or the result arrangement, of one project, and reports how it went instead of raising,
+    # so that one failing project doesn't stop the others in run_projects()
+    start = time.perf_counter()
+    stage = 'settings'
+    try:
+        project = Project(_project_name, _project_settings_file, settings_table=_settings_table)
+        if _fix_import:
+            stage = 'results file'
+            project.create_result_file(overwrite=_overwrite)
+            stage = 'import'
+            project.arrange_import(verbose=_verbose)
+        else:
+            stage = 'results'
+            project.arrange_results(verbose=_verbose, overwrite=_overwrite)
+    except Exception as error:
+        return {'Project name': _project_name, 'Status': 'Failed', 'Stage': stage,
+                'Seconds': time.perf_counter() - start, 'Error': '{}: {}'.format(type(error).__name__, error)}
+    return {'Project name': _project_name, 'Status': 'Done', 'Stage': stage,
+            'Seconds': time.perf_counter() - start, 'Error': ''}
+
+
+def run_projects(_project_settings_file, _fix_import: bool = True, _overwrite='never', _n_processes=None,
+                 _project_names=None, _report_file=None, _verbose: bool = False):
+    """
+    Runs the import (or the result arrangement) of all active and prospective projects in the project settings file.
+    The settings file is read once, and the projects are run in a pool of processes. A project that fails is
+    reported in the summary, and does not stop the others.
+
+    :param _project_settings_file:
+        str
+        Full path name of the project settings Excel sheet.
+    :param _fix_import:
+        Bool
+        If True, the results files are created and the stands are exported to Heureka, see Project.arrange_import()
+        If False, the Heureka results are rearranged, see Project.arrange_results()
+    :param _overwrite:
+        str
+        Policy used for existing results and monetization files, 'never' or 'always'. See fio.allow_overwrite()
+    :param _n_processes:
+        int
+        Maximum number of processes used. If None, the projects are run one by one in this process
+    :param _project_names:
+        list
+        If given, only these projects are run
+    :param _report_file:
+        str
+        If given, the summary is also written to this Excel file
+    :return:
+        pd.DataFrame
+        Summary with one row per project, with columns 'Status' ('Done' or 'Failed'), 'Stage' (the last stage that
+        was started), 'Seconds' and 'Error'
+    """
+    if _overwrite not in ['never', 'always']:
+        raise ValueError("Use the overwrite policy 'never' or 'always' when running several projects")
+    p_tabl = fio.read_excel(_project_settings_file, 1, 'Settings')
+
+    project_names = []
+    for i, p_name in enumerate(p_tabl['Project name']):
+        if not isinstance(p_name, str):
+            continue
+        if p_tabl['Status'][i] not in ['Active', 'Prospective']:
+            continue
+        if _project_names is not None and p_name.strip() not in _project_names:
+            continue
+        project_names.append(p_name.strip())
+
+    args = [(_name, _project_settings_file, p_tabl, _fix_import, _overwrite, _verbose) for _name in project_names]
+    if _n_processes is None or len(project_names) < 2:
+        results = [_run_project(*_x) for _x in args]
+    else:
+        results = []
+        with ProcessPoolExecutor(max_workers=_n_processes) as executor:
+            futures = [executor.submit(_run_project, *_x) for _x in args]
+            for _name, future in zip(project_names, futures):
+                try:
+                    results.append(future.result())
+                except Exception as error:
+                    # e.g. a worker process that died
+                    results.append({'Project name': _name, 'Status': 'Failed', 'Stage': '', 'Seconds': 0.,
+                                    'Error': '{}: {}'.format(type(error).__name__, error)})
+
+    summary = pd.DataFrame(results, columns=['Project name', 'Status', 'Stage', 'Seconds', 'Error'])
+    summary = summary.set_index('Project name')
+    n_failed = int(np.sum(summary['Status'] == 'Failed'))
+    print('{} of {} projects done, {} failed'.format(len(summary) - n_failed, len(summary), n_failed))
+    for _name in summary.index[summary['Status'] == 'Failed']:
+        print('WARNING {} failed in {}: {}'.format(_name, summary['Stage'][_name], summary['Error'][_name]))
+    if _report_file is not None:
+        summary.to_excel(_report_file)
+    return summary
 
 
 if __name__ == '__main__':
@@ -214,14 +538,16 @@ if __name__ == '__main__':
 
     verbose = True
 
-    project_folder, stand_file, average_over, stand_id_key, result_file, result_sheets, combine_sheets, \
-        monetization_file, csv_stand_file, csv_treatment_file, hrapp, srapp, kwargs = \
-        project_settings(project_name, project_settings_file, fix_import, verbose)
+    # Set to True to run all active and prospective projects in the project settings file, instead of project_name
+    run_all = False
 
-    if fix_import:
-        arrange_import(stand_file, csv_stand_file, csv_treatment_file, average_over, stand_id_key, project_name,
-                       hrapp, srapp,
-                       _verbose=verbose, **kwargs)
-    elif not fix_import:
-        arrange_results(result_file, result_sheets, combine_sheets, monetization_file, _verbose=verbose,  **kwargs)
+    if run_all:
+        run_projects(project_settings_file, fix_import, _overwrite='never', _n_processes=4, _verbose=verbose)
+    else:
+        project = Project(project_name, project_settings_file)
 
+        if fix_import:
+            project.create_result_file()
+            project.arrange_import(verbose=verbose)
+        elif not fix_import:
+            project.arrange_results(verbose=verbose)